@@ -0,0 +1,147 @@
+"""
+Utilidades comunes de los benchmarks.
+
+Los datos que genera la aplicación (almacén de audio, cachés) se escriben en
+un directorio temporal para no mezclar resultados entre ejecuciones.
+"""
+import io
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+import pytest
+
+# Debe definirse antes de importar src.app, que lee la configuración al importarse
+os.environ.setdefault("PHANTOMWORDS_DATA_DIR", tempfile.mkdtemp(prefix="phantomwords-bench-"))
+
+MB = 1024 * 1024
+
+# Tamaños de las cargas sintéticas
+UPLOAD_SIZES_MB = (1, 5, 30)
+
+
+def make_wav_bytes(size, sample_rate=24000, seed=0):
+    """
+    Genera un WAV mono de 16 bits con ruido de aproximadamente ``size`` bytes.
+
+    Parámetros:
+    size (int): Tamaño deseado del archivo en bytes
+    sample_rate (int): Frecuencia de muestreo en Hz
+    seed (int): Semilla del ruido (semillas distintas dan hashes distintos)
+
+    Retorna:
+    bytes: Contenido del archivo WAV
+    """
+    frames = max((size - 44) // 2, 1)
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(frames) * 3000).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def make_m4a_bytes(seconds=2.0, seed=0):
+    """
+    Genera un contenedor M4A con cabeceras válidas y datos de audio vacíos.
+
+    El probe lo acepta, pero soundfile no puede decodificarlo, igual que un
+    M4A real.
+
+    Parámetros:
+    seconds (float): Duración declarada en la caja 'mvhd'
+    seed (int): Cambia los datos para obtener hashes distintos
+
+    Retorna:
+    bytes: Contenido del archivo
+    """
+    def box(box_type, body):
+        return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+    mvhd = bytes(12) + struct.pack('>II', 1000, int(seconds * 1000)) + bytes(80)
+    ftyp = box(b'ftyp', b'M4A ' + bytes(4) + b'M4A isom')
+    return ftyp + box(b'moov', box(b'mvhd', mvhd)) + box(b'mdat', seed.to_bytes(4, 'big') + bytes(4096))
+
+
+def peak_memory(func, *args, **kwargs):
+    """
+    Ejecuta ``func`` una vez bajo tracemalloc y devuelve el pico de memoria.
+
+    Retorna:
+    int: Bytes asignados en el pico de la ejecución
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_callback(func, *args, triggered_prop=None):
+    """
+    Llama a la función de un callback de Dash fuera del servidor.
+
+    Parámetros:
+    func (callable): Función decorada con @callback
+    *args: Valores de los Inputs y States
+    triggered_prop (str o None): Propiedad que disparó el callback, p. ej. 'delay-slider.value'
+    o, con ids de patrón, '{"index":1,"type":"upload-ref"}.data'
+
+    Retorna:
+    Lo que devuelva la función del callback
+    """
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    triggered = [{'prop_id': triggered_prop, 'value': None}] if triggered_prop else []
+    context_value.set(AttributeDict(triggered_inputs=triggered))
+    return func(*args)
+
+
+def wait_for_job(queue, job_id, timeout=30):
+    """
+    Espera a que un trabajo de la cola deje de estar activo.
+
+    Parámetros:
+    queue (src.jobs.JobQueue): Cola donde se encoló el trabajo
+    job_id (str): Id del trabajo
+    timeout (float): Segundos máximos de espera
+
+    Retorna:
+    dict: Estado final del trabajo
+    """
+    from src.jobs import ACTIVE_STATES
+
+    deadline = time.monotonic() + timeout
+    status = queue.status(job_id)
+    while status['status'] in ACTIVE_STATES and time.monotonic() < deadline:
+        time.sleep(0.05)
+        status = queue.status(job_id)
+    return status
+
+
+@pytest.fixture(scope="session")
+def dash_app():
+    from src.app import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(dash_app):
+    return dash_app.server.test_client()
+
+
+@pytest.fixture(scope="session")
+def speech_track():
+    """Clip incluido decodificado a mono, como lo usa el renderizador."""
+    from src.audio_io import load_audio
+    from src.config import BUNDLED_AUDIO_DIR
+    return load_audio(os.path.join(BUNDLED_AUDIO_DIR, "Lo_ves,_Ana.mp3"))
@@ -0,0 +1,21 @@
+"""
+Benchmarks del análisis por bandas de Bark.
+
+El pico de memoria del análisis no debe crecer con el tamaño del archivo,
+porque la señal se procesa por bloques de tamaño fijo.
+"""
+import pytest
+
+from benchmarks.conftest import MB, UPLOAD_SIZES_MB, make_wav_bytes, peak_memory
+from src.analysis import analyze_bark_bands
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_analyze_bark_bands(benchmark, tmp_path, size_mb):
+    path = tmp_path / 'bench.wav'
+    path.write_bytes(make_wav_bytes(size_mb * MB))
+    peak = peak_memory(analyze_bark_bands, str(path))
+    benchmark.extra_info['peak_bytes'] = peak
+    result = benchmark.pedantic(analyze_bark_bands, args=(str(path),), rounds=3)
+    assert result['energy_db'].shape[0] == 24
+    assert peak < 32 * MB
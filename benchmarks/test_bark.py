@@ -0,0 +1,47 @@
+"""
+Benchmarks de la escala de Bark y de la figura de ejemplo.
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.conftest import peak_memory
+from src.bark import bark_scale, generate_bark_scale_figure, load_bark_data
+
+
+@pytest.mark.parametrize("n_points", [1000, 1_000_000])
+def test_bark_scale(benchmark, n_points):
+    frequencies = np.logspace(np.log10(20), np.log10(20000), n_points)
+    benchmark.extra_info['peak_bytes'] = peak_memory(bark_scale, frequencies)
+    benchmark(bark_scale, frequencies)
+
+
+def test_generate_bark_scale_figure(benchmark):
+    benchmark.extra_info['peak_bytes'] = peak_memory(generate_bark_scale_figure)
+    benchmark(generate_bark_scale_figure)
+
+
+def test_load_cached_bark_data(benchmark):
+    # Lo que paga el primer acceso al diseño: leer el JSON precalculado
+    def load():
+        load_bark_data.cache_clear()
+        return load_bark_data()
+
+    benchmark.extra_info['peak_bytes'] = peak_memory(load)
+    benchmark(load)
+
+
+def test_bark_data_is_replaced_atomically(tmp_path, monkeypatch):
+    path = tmp_path / 'bark_scale.json'
+    path.write_text('{"key": "desactualizado"}', encoding='utf-8')
+    monkeypatch.setattr('src.bark.BARK_CACHE_PATH', str(path))
+    load_bark_data.cache_clear()
+    try:
+        data = load_bark_data()
+    finally:
+        load_bark_data.cache_clear()
+    # El archivo se escribe en un temporal y se renombra: no quedan restos
+    assert os.listdir(tmp_path) == ['bark_scale.json']
+    assert json.loads(path.read_text(encoding='utf-8'))['key'] == data['key']
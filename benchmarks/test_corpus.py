@@ -0,0 +1,26 @@
+"""
+Benchmarks de la generación del corpus de frases.
+
+Con el motor sin conexión se mide una regeneración completa, y se comprueba
+que las frases que darían el mismo nombre de archivo no se pisan.
+"""
+import os
+
+from src.audios.creacion_audios import MANIFEST_NAME, ToneEngine, build_corpus, phrase_filenames
+
+PHRASES = ["¿Lo ves?", "Lo ves", "lo ves", "uno/dos", "Hola mundo"]
+
+
+def test_build_corpus(benchmark, tmp_path):
+    output_dir = str(tmp_path)
+    summary = benchmark(build_corpus, PHRASES, output_dir, ToneEngine(), force=True)
+    assert summary == {"generated": len(PHRASES), "skipped": 0, "failed": 0}
+
+    names = phrase_filenames(PHRASES, ToneEngine.extension)
+    assert len(set(name.lower() for name in names.values())) == len(PHRASES)
+    assert names["Hola mundo"] == "Hola_mundo.wav"
+    assert sorted(os.listdir(output_dir)) == sorted(list(names.values()) + [MANIFEST_NAME])
+
+    # Los nombres no dependen del orden, así que una segunda ejecución no regenera nada
+    summary = build_corpus(PHRASES[::-1], output_dir, ToneEngine())
+    assert summary == {"generated": 0, "skipped": len(PHRASES), "failed": 0}
@@ -0,0 +1,44 @@
+"""
+Presupuesto de tiempo de arranque del panel.
+
+Cada reinicio de un proceso del servidor paga la importación de ``src.app``;
+estas pruebas la ejecutan en un intérprete nuevo (importación en frío) y
+comprueban que no se construya el diseño ni la figura de Bark al importar.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Segundos permitidos para importar src.app en frío (ajustable para máquinas lentas)
+IMPORT_BUDGET_SECONDS = float(os.environ.get("PHANTOMWORDS_IMPORT_BUDGET_S", "2.0"))
+
+
+def run_fresh(code, data_dir):
+    env = dict(os.environ, PHANTOMWORDS_DATA_DIR=str(data_dir))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_cold_import_within_budget(tmp_path):
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        "import src.app\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    # La mejor de tres ejecuciones descarta ruido de la máquina
+    elapsed = min(float(run_fresh(code, tmp_path)) for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_SECONDS, f"Importar src.app tardó {elapsed:.2f} s"
+
+
+def test_import_does_not_build_layout(tmp_path):
+    code = (
+        "import src.app, src.bark\n"
+        "print(src.app.serve_layout.cache_info().currsize, src.bark.load_bark_data.cache_info().currsize)\n"
+    )
+    assert run_fresh(code, tmp_path) == "0 0"
@@ -0,0 +1,88 @@
+"""
+Benchmarks de la cola de trabajos.
+
+Encolar un trabajo y consultar su estado son lo único que hacen los callbacks,
+así que deben costar milisegundos aunque el trabajo tarde segundos.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from benchmarks.conftest import wait_for_job
+from src.jobs import CANCELLED, DONE, JOB_RETENTION_SECONDS, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=2)
+    release = threading.Event()
+
+    def wait_for_release(params, report):
+        while not release.wait(0.01):
+            report(0.5)
+        return params
+
+    queue.register('wait', wait_for_release)
+    queue.register('echo', lambda params, report: params)
+    yield queue
+    release.set()
+
+
+def test_submit_and_status(benchmark, queue):
+    job_id = benchmark(queue.submit, 'wait', {'n': 1})
+    # Los envíos repetidos de un trabajo activo devuelven el mismo id
+    assert queue.submit('wait', {'n': 1}) == job_id
+    assert queue.status(job_id)['status'] in ('queued', 'running')
+
+
+def test_status_poll(benchmark, queue):
+    job_id = queue.submit('echo', {'n': 2})
+    status = benchmark(queue.status, job_id)
+    assert status['id'] == job_id
+
+
+def test_cancel_running_job(queue):
+    job_id = queue.submit('wait', {'n': 3})
+    assert queue.cancel(job_id)
+    assert queue.status(job_id)['status'] == CANCELLED
+    assert queue.status(queue.submit('echo', {'n': 4}))['status'] in ('queued', 'running', DONE)
+
+
+def test_heartbeat_keeps_silent_job_alive(queue, monkeypatch):
+    monkeypatch.setattr('src.jobs.HEARTBEAT_SECONDS', 0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def silent(params, report):
+        # Un paso largo que no llama a report
+        started.set()
+        release.wait(5)
+        return params
+
+    queue.register('silent', silent)
+    job_id = queue.submit('silent', {'n': 5})
+    assert started.wait(5)
+
+    def updated():
+        with sqlite3.connect(queue.db_path) as conn:
+            return conn.execute("SELECT updated FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    first = updated()
+    time.sleep(0.3)
+    assert updated() > first
+    release.set()
+    assert wait_for_job(queue, job_id)['status'] == DONE
+
+
+def test_finished_jobs_are_deleted(queue):
+    old_id = queue.submit('echo', {'n': 6})
+    assert wait_for_job(queue, old_id)['status'] == DONE
+    recent_id = queue.submit('echo', {'n': 7})
+    assert wait_for_job(queue, recent_id)['status'] == DONE
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time() - JOB_RETENTION_SECONDS - 1, old_id))
+
+    queue.submit('echo', {'n': 8})
+    assert queue.status(old_id) is None
+    assert queue.status(recent_id)['status'] == DONE
@@ -0,0 +1,28 @@
+"""
+Pruebas del service worker que guarda el panel y el audio sin conexión.
+
+El worker se sirve desde la raíz para que su alcance cubra toda la aplicación,
+con la versión de la caché ya sustituida y sin caché HTTP, de modo que el
+navegador detecte cada despliegue nuevo.
+"""
+from src.config import SW_AUDIO_CACHE_MAX_BYTES
+
+
+def test_service_worker_route(client):
+    response = client.get('/service-worker.js')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/javascript'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['Service-Worker-Allowed'] == '/'
+
+    source = response.get_data(as_text=True)
+    assert '__CACHE_VERSION__' not in source and '__AUDIO_CACHE_MAX_BYTES__' not in source
+    assert f"Number('{SW_AUDIO_CACHE_MAX_BYTES}')" in source
+    # Sin cambios en los recursos la versión no cambia, y la caché del panel se conserva
+    assert client.get('/service-worker.js').get_data(as_text=True) == source
+
+
+def test_worker_not_loaded_as_asset(client):
+    page = client.get('/').get_data(as_text=True)
+    assert 'offline.js' in page
+    assert 'service-worker.js' not in page
@@ -0,0 +1,43 @@
+"""
+Benchmarks de la inspección de cabeceras de audio.
+
+El coste de probe debe ser constante: se miden data URIs en base64 y archivos
+en disco de 1, 5 y 30 MB y se registra el pico de memoria, que no debe crecer
+con el tamaño del archivo.
+"""
+import base64
+import time
+
+import pytest
+
+from benchmarks.conftest import MB, UPLOAD_SIZES_MB, make_wav_bytes, peak_memory
+from src.probe import ProbeError, decoded_size, probe_data_uri, probe_file
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_probe_data_uri(benchmark, size_mb):
+    data = make_wav_bytes(size_mb * MB)
+    contents = 'data:audio/wav;base64,' + base64.b64encode(data).decode('ascii')
+    benchmark.extra_info['peak_bytes'] = peak_memory(probe_data_uri, contents)
+    info = benchmark(probe_data_uri, contents)
+    assert decoded_size(contents) == info['size'] == len(data)
+    assert info['format'] == 'wav' and info['sample_rate'] == 24000 and info['channels'] == 1
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_probe_file(benchmark, tmp_path, size_mb):
+    path = tmp_path / 'bench.wav'
+    path.write_bytes(make_wav_bytes(size_mb * MB))
+    benchmark.extra_info['peak_bytes'] = peak_memory(probe_file, str(path))
+    info = benchmark(probe_file, str(path))
+    assert info['duration'] == pytest.approx((size_mb * MB - 44) // 2 / 24000, abs=1e-3)
+
+
+def test_probe_rejects_empty_riff_chunks(tmp_path):
+    # Cabecera RIFF/WAVE seguida solo de ceros: se rechaza sin recorrer el archivo
+    path = tmp_path / 'zeros.wav'
+    path.write_bytes(b'RIFF' + (30 * MB).to_bytes(4, 'little') + b'WAVE' + bytes(30 * MB))
+    start = time.perf_counter()
+    with pytest.raises(ProbeError):
+        probe_file(str(path))
+    assert time.perf_counter() - start < 0.1
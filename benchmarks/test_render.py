@@ -0,0 +1,124 @@
+"""
+Benchmarks del renderizado del estímulo en el servidor.
+"""
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from benchmarks.conftest import MB, peak_memory
+from src.audio_io import _DecodedCache
+from src.renderer import (
+    StimulusTooLong, apply_speed, assemble_mix, parse_render_params, render_mix, render_stimulus, render_to_cache,
+)
+
+
+@pytest.mark.parametrize("speed", [0.5, 1.3, 2.0])
+def test_apply_speed(benchmark, speech_track, speed):
+    samples, _ = speech_track
+    benchmark(apply_speed, samples, speed)
+
+
+@pytest.mark.parametrize("loops", [1, 10, 100])
+def test_render_dual(benchmark, speech_track, loops):
+    samples, sample_rate = speech_track
+    kwargs = dict(delay_ms=200, loops=loops, speed1=1.1, track2=samples, speed2=0.8)
+    benchmark.extra_info['peak_bytes'] = peak_memory(render_stimulus, samples, sample_rate, **kwargs)
+    benchmark(render_stimulus, samples, sample_rate, **kwargs)
+
+
+@pytest.mark.parametrize("n_tracks", [1, 4, 8])
+def test_render_mix(benchmark, speech_track, n_tracks):
+    samples, sample_rate = speech_track
+    tracks = [samples] * n_tracks
+    voices = [
+        {'track': i, 'delay_ms': 50 * i, 'speed': 1.0 + 0.1 * i, 'pan': -1 + 2 * i / max(n_tracks - 1, 1)}
+        for i in range(n_tracks)
+    ]
+    benchmark.extra_info['peak_bytes'] = peak_memory(render_mix, tracks, sample_rate, voices, loops=10)
+    benchmark(render_mix, tracks, sample_rate, voices, loops=10)
+
+
+def test_assemble_mix_peak_memory(speech_track):
+    samples, _ = speech_track
+    voices = [(samples, 1200 * i, -1 + 2 * i / 7) for i in range(8)]
+    out_bytes = assemble_mix(voices, 40).nbytes
+    # Una matriz (voces × muestras) ocuparía cuatro veces la salida estéreo
+    assert peak_memory(assemble_mix, voices, 40) < out_bytes + 8 * MB
+
+
+def test_decoded_cache_is_bounded():
+    cache = _DecodedCache(max_bytes=3 * MB)
+    track = (np.zeros(MB // 4, dtype=np.float32), 24000)
+    for i in range(5):
+        cache.put(i, track)
+    assert cache.get(0) is None and cache.get(4) is track
+    assert cache._size == 3 * MB
+
+    # Una señal mayor que el límite no desaloja a las demás
+    cache.put('large', (np.zeros(MB, dtype=np.float32), 24000))
+    assert cache.get('large') is None and cache.get(4) is track
+
+
+def test_render_mix_matches_dual(speech_track):
+    samples, sample_rate = speech_track
+    dual = render_stimulus(samples, sample_rate, delay_ms=200, loops=3, speed1=1.1, track2=samples, speed2=0.8)
+    voices = [
+        {'track': 0, 'delay_ms': 200, 'speed': 1.1, 'pan': -1.0},
+        {'track': 1, 'delay_ms': 200, 'speed': 0.8, 'pan': 1.0},
+    ]
+    mix = render_mix([samples, samples], sample_rate, voices, loops=3)
+    assert mix.shape == dual.shape
+    assert np.allclose(mix, dual)
+
+
+def test_render_endpoint_cached(benchmark, client, dash_app):
+    from src.app import clip_library
+
+    entries = clip_library.index()
+    url = f"/render/stimulus.wav?track1={entries[0]['id']}&track2={entries[1]['id']}&delay=200&loops=10"
+    assert client.get(url).status_code == 200
+    benchmark(client.get, url)
+
+
+def test_render_endpoint_multi(client, dash_app):
+    from src.app import clip_library
+
+    ids = [entry['id'] for entry in clip_library.index()[:2]] * 2
+    url = f"/render/stimulus.wav?mode=multi&tracks={','.join(ids)}&delays=0,50,100,150&pans=-1,1,-0.5,0.5&loops=2"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'estimulo_4pistas_x2.wav' in response.headers['Content-Disposition']
+
+
+def test_render_rejects_long_stimulus(dash_app):
+    from src.app import audio_store, clip_library, render_cache
+
+    entry = clip_library.index()[0]
+    single = parse_render_params(MultiDict({'track1': entry['id'], 'loops': '100', 'speed1': '0.5'}))
+    multi = parse_render_params(MultiDict({'mode': 'multi', 'tracks': ','.join([entry['id']] * 8), 'loops': '100'}))
+    # La duración se calcula antes de decodificar: no se reserva la matriz de la mezcla
+    for params in (single, multi):
+        with pytest.raises(StimulusTooLong):
+            render_to_cache(audio_store, render_cache, params, max_seconds=60)
+    assert render_to_cache(audio_store, render_cache, single, max_seconds=600) is not None
+
+
+def test_render_rejects_non_finite_params(client, dash_app):
+    from src.app import clip_library
+
+    entry = clip_library.index()[0]
+    # Sin validar, NaN pasaría por min/max y llegaría al remuestreo y a la clave de la caché
+    assert parse_render_params(MultiDict({'track1': entry['id'], 'speed1': 'nan'}))['speed1'] == 1.0
+    for query in ('speed1=nan', 'speed1=inf', 'speed2=-inf&track2=' + entry['id']):
+        response = client.get(f"/render/stimulus.wav?track1={entry['id']}&{query}")
+        assert response.status_code == 400
+
+
+def test_render_multi_rejects_non_finite_params(client, dash_app):
+    from src.app import clip_library
+
+    tracks = ','.join(entry['id'] for entry in clip_library.index()[:2])
+    params = parse_render_params(MultiDict({'mode': 'multi', 'tracks': tracks, 'delays': 'nan,inf', 'pans': 'nan'}))
+    assert [voice['delay_ms'] for voice in params['voices']] == [0, 0] and params['voices'][0]['pan'] == 0.0
+    for query in ('delays=nan', 'speeds=1,inf', 'pans=-inf'):
+        assert client.get(f"/render/stimulus.wav?mode=multi&tracks={tracks}&{query}").status_code == 400
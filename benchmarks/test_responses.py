@@ -0,0 +1,118 @@
+"""
+Benchmarks del registro de respuestas de los participantes.
+
+Registrar una respuesta solo la encola, así que muchos participantes
+simultáneos no esperan a un commit cada uno; el hilo escritor las guarda por
+lotes. La exportación agrega las respuestas de forma vectorizada.
+"""
+import io
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.conftest import run_callback
+from src.responses import ResponseLog, aggregate_responses, response_row
+
+PARTICIPANTS = 100
+RESPONSES_PER_PARTICIPANT = 20
+
+STIMULUS = {
+    'track_mode': 'dual', 'tracks': ['a', 'b'], 'delay_ms': 200, 'loops': 10, 'speeds': [1.0, 1.0],
+    'swap_channels': True, 'preserve_pitch': False,
+    'voices': [{'track': 1, 'speed': 1.0, 'delay_ms': 200, 'pan': 1}, {'track': 2, 'speed': 1.0, 'delay_ms': 200, 'pan': -1}],
+}
+
+
+@pytest.fixture
+def response_log(tmp_path):
+    return ResponseLog(str(tmp_path / "responses.sqlite3"))
+
+
+def test_concurrent_participants(benchmark, response_log):
+    bursts = []
+
+    def burst():
+        bursts.append(1)
+        def participant(i):
+            for j in range(RESPONSES_PER_PARTICIPANT):
+                response_log.record(f"palabra {j % 5}", STIMULUS, f"p{i}")
+
+        threads = [threading.Thread(target=participant, args=(i,)) for i in range(PARTICIPANTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert response_log.flush(timeout=30)
+
+    benchmark.pedantic(burst, rounds=3, iterations=1)
+    # Con --benchmark-disable la ráfaga se ejecuta una sola vez
+    assert response_log.count() == len(bursts) * PARTICIPANTS * RESPONSES_PER_PARTICIPANT
+
+
+def test_record_only_enqueues(benchmark, response_log):
+    benchmark(response_log.record, "palabra", STIMULUS, "p1")
+    assert response_log.flush(timeout=30)
+
+
+def test_aggregate_responses(benchmark):
+    rng = np.random.default_rng(0)
+    n = 100_000
+    words = np.array([f"palabra {i}" for i in range(50)])
+    delays = rng.choice([100, 200, 300], n)
+    rows = [
+        response_row(word, {**STIMULUS, 'delay_ms': int(delay)}, f"p{participant}", created=float(i))
+        for i, (word, delay, participant) in enumerate(zip(rng.choice(words, n), delays, rng.integers(0, 500, n)))
+    ]
+    columns = ['created', 'participant', 'word', 'track_mode', 'tracks', 'delay_ms', 'loops',
+               'speeds', 'swap_channels', 'preserve_pitch', 'voices', 'stimulus']
+    frame = pd.DataFrame(rows, columns=columns)
+    frame.insert(0, 'id', np.arange(n))
+
+    aggregated = benchmark(aggregate_responses, frame)
+    assert aggregated['responses'].sum() == n
+    shares = aggregated.groupby('delay_ms')['share'].sum()
+    assert np.allclose(shares, 1.0)
+
+
+def test_submit_and_export(client, dash_app):
+    from src.app import response_log, submit_response
+
+    status, cleared = run_callback(submit_response, 1, None, "  Hola  Mundo ", "p-export", STIMULUS,
+                                   triggered_prop='submit-response.n_clicks')
+    assert cleared == ""
+    error, _ = run_callback(submit_response, 2, None, "hola", "p-export", None,
+                            triggered_prop='submit-response.n_clicks')
+    assert "Error" in error.children
+
+    response = client.get("/responses/export.csv")
+    assert response.status_code == 200
+    exported = pd.read_csv(io.StringIO(response.get_data(as_text=True)))
+    row = exported[exported['word'] == "hola mundo"]
+    assert len(row) == 1 and row['responses'].iloc[0] >= 1
+    assert response_log.count() >= 1
+
+
+def test_export_does_not_wait_forever(response_log):
+    from flask import Flask
+
+    from src.responses import create_responses_blueprint
+
+    server = Flask(__name__)
+    server.register_blueprint(create_responses_blueprint(response_log, flush_timeout=0.2))
+    response_log.record("palabra", STIMULUS, "p1")
+    assert response_log.flush(timeout=30)
+
+    # Con la base de datos bloqueada el escritor no puede avanzar
+    lock = sqlite3.connect(response_log.db_path, isolation_level=None)
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        response_log.record("palabra", STIMULUS, "p2")
+        response = server.test_client().get("/responses/export.csv")
+        assert response.status_code == 503
+    finally:
+        lock.execute("ROLLBACK")
+        lock.close()
+    assert response_log.flush(timeout=30) and response_log.count() == 2
@@ -0,0 +1,97 @@
+"""
+Benchmarks del índice de similitud por huellas en bandas de Bark.
+
+Una consulta recorre todas las huellas con un solo producto matriz-vector,
+así que decenas de miles de clips se comparan en milisegundos.
+"""
+import shutil
+
+import numpy as np
+import pytest
+
+from benchmarks.conftest import run_callback, wait_for_job
+from src.config import BUNDLED_AUDIO_DIR
+from src.similarity import SimilarityIndex, bark_fingerprint, top_k
+
+CORPUS_SIZES = (1_000, 50_000)
+
+
+def random_fingerprints(n, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = np.sqrt(rng.dirichlet(np.ones(24), n)).astype(np.float32)
+    return np.ascontiguousarray(matrix)
+
+
+@pytest.mark.parametrize("n_clips", CORPUS_SIZES)
+def test_top_k(benchmark, n_clips):
+    matrix = random_fingerprints(n_clips)
+    query = matrix[7]
+    indices, similarities = benchmark(top_k, matrix, query, 10)
+
+    expected = np.argsort(-(matrix @ query), kind='stable')[:10]
+    assert indices[0] == 7 and np.isclose(similarities[0], 1.0, atol=1e-5)
+    assert np.allclose(similarities, (matrix @ query)[expected])
+    assert np.all(np.diff(similarities) <= 0)
+
+
+def test_top_k_batch(benchmark):
+    matrix = random_fingerprints(50_000)
+    queries = matrix[:100]
+    exclude = np.zeros((100, len(matrix)), dtype=bool)
+    exclude[np.arange(100), np.arange(100)] = True
+    indices, _ = benchmark(top_k, matrix, queries, 5, exclude)
+    assert indices.shape == (100, 5)
+    assert not np.any(indices == np.arange(100)[:, None])
+
+
+def test_build_and_query(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "similarity"))
+    assert index.build([BUNDLED_AUDIO_DIR], workers=1)['analyzed'] == 6
+
+    # Un índice nuevo sobre el mismo directorio reutiliza todas las huellas
+    reopened = SimilarityIndex(index.index_dir)
+    assert reopened.build([BUNDLED_AUDIO_DIR], workers=1) == {'clips': 6, 'analyzed': 0}
+
+    matrix, clips = reopened.load()
+    assert matrix.dtype == np.float32 and matrix.flags['C_CONTIGUOUS']
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-5)
+
+    path = clips[0]['path']
+    results = reopened.query(bark_fingerprint(path), k=3)
+    assert results[0]['path'] == path and results[0]['similarity'] > 0.999
+    others = reopened.query(bark_fingerprint(path), k=10, exclude_sha256=clips[0]['sha256'])
+    assert len(others) == 5 and path not in {result['path'] for result in others}
+
+
+def test_index_reloads_after_rebuild(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "similarity"))
+    index.build([BUNDLED_AUDIO_DIR], workers=1)
+    # Otro proceso (el CLI) reconstruye el índice con menos clips
+    reader = SimilarityIndex(index.index_dir)
+    assert len(reader.load()[1]) == 6
+    subset = tmp_path / "subset"
+    subset.mkdir()
+    shutil.copy(reader.load()[1][0]['path'], subset)
+    SimilarityIndex(index.index_dir).build([str(subset)], workers=1)
+    assert len(reader.load()[1]) == 1
+
+
+def test_find_similar_clips_callback(dash_app):
+    from src.app import clip_library, find_similar_clips, job_queue, similarity_index
+
+    entry = clip_library.index()[0]
+    args = (find_similar_clips, 1, None, [entry, None], 'single', None)
+    if similarity_index.load() is None:
+        # Sin índice el callback solo encola su construcción y sondea el trabajo
+        message, job_id, interval_disabled = run_callback(*args, None, triggered_prop='similar-button.n_clicks')
+        assert isinstance(message, str) and not interval_disabled
+        wait_for_job(job_queue, job_id)
+        sections, job_id, interval_disabled = run_callback(*args, job_id,
+                                                           triggered_prop='similar-interval.n_intervals')
+    else:
+        sections, job_id, interval_disabled = run_callback(*args, None, triggered_prop='similar-button.n_clicks')
+    assert job_id is None and interval_disabled
+    assert len(sections) == 1
+    rows = sections[0].children[1].children[1].children
+    assert 0 < len(rows) <= 5
+    assert entry['filename'].replace('_', ' ')[:-4] not in {row.children[0].children for row in rows}
@@ -0,0 +1,83 @@
+"""
+Benchmarks del cambio de velocidad que conserva el tono.
+
+El vocoder de fase debe mantener la frecuencia de un tono puro y la longitud
+que da ``playbackRate``, y una variante ya calculada debe servirse desde la
+caché sin repetir el procesamiento.
+"""
+import os
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from benchmarks.conftest import MB, make_m4a_bytes, peak_memory
+from src.renderer import parse_render_params, render_to_cache
+from src.timestretch import time_stretch
+
+
+@pytest.mark.parametrize("speed", [0.5, 1.3, 2.0])
+def test_time_stretch(benchmark, speech_track, speed):
+    samples, _ = speech_track
+    benchmark.extra_info['peak_bytes'] = peak_memory(time_stretch, samples, speed)
+    stretched = benchmark(time_stretch, samples, speed)
+    assert len(stretched) == int(np.floor(len(samples) / speed))
+
+
+@pytest.mark.parametrize("speed", [0.7, 1.5])
+def test_time_stretch_keeps_pitch(speed):
+    sample_rate = 24000
+    t = np.arange(3 * sample_rate) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    stretched = time_stretch(tone, speed)
+    peak = np.fft.rfftfreq(len(stretched), 1 / sample_rate)[np.argmax(np.abs(np.fft.rfft(stretched)))]
+    assert abs(peak - 440) < 2
+
+
+def test_stretch_endpoint_cached(benchmark, client, dash_app):
+    from src.app import clip_library
+    from src.config import STRETCH_SAMPLE_RATE
+
+    entry = clip_library.index()[0]
+    url = f"/audio/{entry['id']}/stretch/1.30.pcm"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers['X-Sample-Rate'] == str(STRETCH_SAMPLE_RATE)
+    response = benchmark(client.get, url)
+    assert response.data == first.data
+    assert client.get(f"/audio/{entry['id']}/stretch/9.pcm").status_code == 400
+
+
+def test_render_reads_cached_variants(dash_app, tmp_path, monkeypatch):
+    import src.renderer
+    import src.timestretch
+    from src.app import audio_store, clip_library
+    from src.cache import DiskLRUCache
+
+    entry = clip_library.index()[0]
+    stretch_cache = DiskLRUCache(str(tmp_path / 'stretch'), 64 * MB, suffix='.pcm')
+    params = parse_render_params(MultiDict({'track1': entry['id'], 'speed1': '1.3', 'pitch': '1'}))
+    first = render_to_cache(audio_store, DiskLRUCache(str(tmp_path / 'a'), 64 * MB, suffix='.wav'), params,
+                            stretch_cache=stretch_cache)
+    assert len(os.listdir(stretch_cache.root)) == 1
+
+    # Con la variante en caché, un nuevo render no vuelve a pasar el vocoder de fase
+    def fail(*args):
+        raise AssertionError("time_stretch no debería ejecutarse")
+
+    monkeypatch.setattr(src.timestretch, 'time_stretch', fail)
+    monkeypatch.setattr(src.renderer, 'time_stretch', fail)
+    second = render_to_cache(audio_store, DiskLRUCache(str(tmp_path / 'b'), 64 * MB, suffix='.wav'), params,
+                             stretch_cache=stretch_cache)
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_stretch_endpoint_rejects_undecodable_audio(client, dash_app, tmp_path):
+    from src.app import audio_store
+
+    path = tmp_path / 'clip.m4a'
+    path.write_bytes(make_m4a_bytes(seed=2))
+    audio_id = audio_store.move_file(str(path), '.m4a')
+    response = client.get(f"/audio/{audio_id}/stretch/1.30.pcm")
+    assert response.status_code == 415 and 'error' in response.get_json()
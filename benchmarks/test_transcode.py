@@ -0,0 +1,108 @@
+"""
+Benchmarks de la ingesta de las subidas (recorte, normalización y transcodificación).
+
+El archivo se procesa por bloques, así que el pico de memoria no depende de
+su duración, y un clip de voz típico queda en una fracción de su tamaño.
+"""
+import glob
+import os
+import shutil
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from benchmarks.conftest import MB, make_wav_bytes, peak_memory
+from src.config import BUNDLED_AUDIO_DIR
+from src.storage import AudioStore
+from src.transcode import PAD_MS, PEAK_CEILING_DBFS, TARGET_RMS_DBFS, Transcoder, transcode
+
+SAMPLE_RATE = 24000
+
+
+@pytest.fixture(scope="module")
+def padded_speech(tmp_path_factory, speech_track):
+    """La pista de voz en estéreo a 48 kHz, atenuada y con 1 s de silencio a cada lado."""
+    samples, sample_rate = speech_track
+    rng = np.random.default_rng(0)
+    speech = np.interp(np.arange(len(samples) * 48000 // sample_rate) * sample_rate / 48000,
+                       np.arange(len(samples)), samples) * 0.2
+    silence = np.zeros(48000)
+    mono = np.concatenate([silence, speech, silence]) + rng.standard_normal(len(speech) + 96000) * 1e-5
+    path = tmp_path_factory.mktemp("transcode") / "padded.wav"
+    sf.write(str(path), np.stack([mono, mono * 0.5], axis=1), 48000, subtype='PCM_16')
+    return str(path), len(speech) / 48000
+
+
+def test_transcode_speech(benchmark, tmp_path, padded_speech):
+    path, speech_seconds = padded_speech
+    output = str(tmp_path / "speech.flac")
+    stats = benchmark(transcode, path, output, SAMPLE_RATE)
+
+    samples, sample_rate = sf.read(output, dtype='float32')
+    assert sample_rate == SAMPLE_RATE and samples.ndim == 1
+    # Se recorta el segundo de silencio de cada lado (y el del propio clip), con el margen
+    assert stats['trimmed'] > 2
+    assert 0.5 * speech_seconds < stats['duration'] <= speech_seconds + 2 * PAD_MS / 1000
+    assert abs(len(samples) / sample_rate - stats['duration']) < 1e-3
+    assert 20 * np.log10(np.abs(samples).max()) <= PEAK_CEILING_DBFS + 0.1
+    frames = samples[:len(samples) // 240 * 240].reshape(-1, 240)
+    energies = (frames ** 2).mean(axis=1)
+    voiced = energies[energies > energies.max() * 10 ** -4.5]
+    assert 10 * np.log10(voiced.mean()) <= TARGET_RMS_DBFS + 0.5
+    assert os.path.getsize(output) * 10 < os.path.getsize(path)
+
+
+def test_transcode_peak_memory(tmp_path):
+    path = tmp_path / "long.wav"
+    path.write_bytes(make_wav_bytes(30 * MB, sample_rate=44100))
+    # Decodificar los 30 MB enteros a float32 ocuparía 60 MB
+    assert peak_memory(transcode, str(path), str(tmp_path / "long.flac"), SAMPLE_RATE) < 8 * MB
+
+
+def test_ingest_replaces_original(tmp_path, padded_speech):
+    path, _ = padded_speech
+    store = AudioStore(str(tmp_path / "audio"))
+    # Como una subida: el archivo temporal se mueve al almacén sin marcarlo
+    upload = tmp_path / "upload.wav"
+    shutil.copyfile(path, upload)
+    original = store.move_file(str(upload), '.wav')
+    ingested = Transcoder(store, SAMPLE_RATE).ingest(original)
+
+    info = store.info(ingested)
+    assert info['ext'] == '.flac' and store.resolve(original) is None
+    # El id del original lleva a la versión transcodificada, que no se vuelve a procesar
+    assert store.info(original)['id'] == ingested
+    assert Transcoder(store, SAMPLE_RATE).ingest(original) == ingested
+
+
+def test_ingest_keeps_library_blobs(tmp_path, padded_speech):
+    path, _ = padded_speech
+    store = AudioStore(str(tmp_path / "audio"))
+    # Un clip registrado por la biblioteca y subido después con los mismos bytes
+    registered = store.put_file(path)
+    ingested = Transcoder(store, SAMPLE_RATE).ingest(registered)
+    assert ingested != registered
+    assert store.resolve(registered) is not None and store.info(registered)['ext'] == '.wav'
+
+
+def test_ingest_keeps_compact_originals(tmp_path):
+    # Los clips incluidos ya son MP3 mono a 24 kHz: FLAC no los haría más pequeños
+    store = AudioStore(str(tmp_path / "audio"))
+    original = store.put_file(glob.glob(os.path.join(BUNDLED_AUDIO_DIR, "*.mp3"))[0])
+    transcoder = Transcoder(store, SAMPLE_RATE)
+    assert transcoder.ingest(original) == original
+    assert store.alias_of(original) == store.info(original)['sha256']
+
+
+def test_resolve_requires_unique_match(tmp_path):
+    store = AudioStore(str(tmp_path / "audio"))
+    prefix = "ab" * 8
+    blob_dir = tmp_path / "audio" / "ab"
+    blob_dir.mkdir()
+    (blob_dir / (prefix + "0" * 48 + ".wav")).write_bytes(b"")
+    assert store.resolve(prefix) is not None
+    # Dos blobs con el mismo prefijo: el id corto ya no identifica a ninguno
+    (blob_dir / (prefix + "1" * 48 + ".wav")).write_bytes(b"")
+    assert store.resolve(prefix) is None
+    assert store.resolve(prefix + "1" * 48) is not None
@@ -0,0 +1,82 @@
+"""
+Benchmarks del camino de carga de audio.
+
+Recorren el flujo completo que sigue el navegador (ruta de carga fragmentada
+y callback de validación) con archivos sintéticos de 1, 5 y 30 MB, y
+registran el pico de memoria del servidor para detectar copias innecesarias
+de los datos subidos.
+"""
+import hashlib
+import itertools
+
+import pytest
+
+from benchmarks.conftest import MB, UPLOAD_SIZES_MB, make_wav_bytes, peak_memory, run_callback, wait_for_job
+from src.config import UPLOAD_CHUNK_BYTES
+
+# Cada ronda sube un archivo distinto para que la deduplicación no la abrevie
+_seeds = itertools.count(1)
+
+
+def upload_chunked(client, data, filename):
+    """Sube ``data`` como lo hace assets/uploader.js y devuelve la referencia."""
+    begin = client.post('/audio/uploads').get_json()
+    token, chunk_size = begin['token'], begin['chunk_size']
+    assert chunk_size == UPLOAD_CHUNK_BYTES
+    for offset in range(0, len(data), chunk_size):
+        response = client.put(f'/audio/uploads/{token}?offset={offset}',
+                               data=data[offset:offset + chunk_size])
+        assert response.status_code == 200
+    response = client.post(f'/audio/uploads/{token}/complete', json={'filename': filename})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_chunked_upload(benchmark, client, size_mb):
+    payloads = [make_wav_bytes(size_mb * MB, seed=next(_seeds)) for _ in range(4)]
+    benchmark.extra_info['peak_bytes'] = peak_memory(upload_chunked, client, payloads.pop(), 'bench.wav')
+    benchmark.pedantic(lambda: upload_chunked(client, payloads.pop(), 'bench.wav'), rounds=3, iterations=1)
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_validation_callback(benchmark, client, size_mb):
+    from src.app import job_queue, update_track_output
+
+    reference = upload_chunked(client, make_wav_bytes(size_mb * MB, seed=next(_seeds)), 'bench.wav')
+    args = (update_track_output, reference, None, None, None)
+    triggered_prop = '{"index":1,"type":"upload-ref"}.data'
+    benchmark.extra_info['peak_bytes'] = peak_memory(run_callback, *args, triggered_prop=triggered_prop)
+    # La validación solo encola la ingesta, que se sigue con el intervalo de la pista
+    error, _, stored, job, interval_disabled = run_callback(*args, triggered_prop=triggered_prop)
+    assert error is None and stored is None and not interval_disabled
+
+    wait_for_job(job_queue, job['id'])
+    poll_prop = '{"index":1,"type":"ingest-interval"}.n_intervals'
+    error, _, stored, _, interval_disabled = run_callback(update_track_output, reference, None, 1, job,
+                                                          triggered_prop=poll_prop)
+    # La subida se sustituye por su versión transcodificada, que es más pequeña
+    assert error is None and interval_disabled
+    assert stored['format'] == 'flac' and stored['size'] < reference['size']
+    # La URL (inmutable) del original redirige a la del audio transcodificado
+    response = client.get(reference['url'])
+    assert response.status_code == 302 and response.headers['Location'] == stored['url']
+    assert len(client.get(reference['url'], follow_redirects=True).data) == stored['size']
+
+    # Una vez ingerida, la misma subida se resuelve sin encolar nada
+    error, _, again, job, _ = benchmark(run_callback, *args, triggered_prop=triggered_prop)
+    assert again['id'] == stored['id'] and job is None
+
+
+def test_repeat_upload_is_deduplicated(benchmark, client):
+    data = make_wav_bytes(5 * MB, seed=next(_seeds))
+    reference = upload_chunked(client, data, 'bench.wav')
+    digest = hashlib.sha256(data).hexdigest()
+    response = benchmark(client.get, f'/audio/by-hash/{digest}')
+    assert response.get_json()['id'] == reference['id']
+
+
+def test_non_audio_upload_is_rejected_on_first_chunk(client):
+    token = client.post('/audio/uploads').get_json()['token']
+    response = client.put(f'/audio/uploads/{token}?offset=0', data=b'%PDF-1.7' + bytes(UPLOAD_CHUNK_BYTES))
+    assert response.status_code == 415
@@ -0,0 +1,103 @@
+"""
+Benchmarks de la forma de onda multirresolución.
+
+La pirámide se construye por bloques, así que su pico de memoria no crece con
+el archivo, y cada vista (completa o tras un zoom) respeta el presupuesto de
+puntos, de modo que la respuesta pesa lo mismo sea cual sea la duración.
+"""
+import json
+
+import dash
+import numpy as np
+import pytest
+
+from benchmarks.conftest import (MB, UPLOAD_SIZES_MB, make_m4a_bytes, make_wav_bytes, peak_memory, run_callback,
+                                 wait_for_job)
+from src.audio_io import to_int16
+from src.waveform import POINT_BUDGET, _reduce, build_pyramid, waveform_figure, waveform_view
+
+
+@pytest.fixture(scope="module")
+def long_wav(tmp_path_factory):
+    path = tmp_path_factory.mktemp("waveform") / "long.wav"
+    path.write_bytes(make_wav_bytes(30 * MB))
+    return str(path)
+
+
+@pytest.mark.parametrize("size_mb", UPLOAD_SIZES_MB)
+def test_build_pyramid(benchmark, tmp_path, size_mb):
+    path = tmp_path / 'bench.wav'
+    path.write_bytes(make_wav_bytes(size_mb * MB))
+    peak = peak_memory(build_pyramid, str(path))
+    benchmark.extra_info['peak_bytes'] = peak
+    pyramid = benchmark.pedantic(build_pyramid, args=(str(path),), rounds=3)
+    assert len(pyramid['levels'][-1][0]) <= POINT_BUDGET
+    assert peak < 16 * MB
+
+
+@pytest.mark.parametrize("span", [None, 60.0, 1.0, 0.02])
+def test_waveform_view(benchmark, long_wav, span):
+    pyramid = build_pyramid(long_wav)
+    duration = pyramid['frames'] / pyramid['sample_rate']
+    start, end = (None, None) if span is None else (duration / 2, duration / 2 + span)
+
+    view = benchmark(waveform_view, pyramid, start, end, path=long_wav)
+    assert 0 < len(view['times']) <= POINT_BUDGET + 1
+    payload = len(waveform_figure(view).to_json())
+    benchmark.extra_info['payload_bytes'] = payload
+    assert payload < 64 * 1024
+
+
+def test_waveform_view_bounds():
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-1, 1, 1_000_000).astype(np.float32)
+    pyramid = {'sample_rate': 1000, 'frames': len(samples), 'block': 256, 'factor': 4, 'levels': []}
+
+    blocks = np.pad(samples, (0, -len(samples) % 256), mode='edge').reshape(-1, 256)
+    levels = [(to_int16(blocks.min(axis=1)), to_int16(blocks.max(axis=1)))]
+    while len(levels[-1][0]) > POINT_BUDGET:
+        levels.append(_reduce(*levels[-1], 4))
+    pyramid['levels'] = levels
+
+    # Cada punto del nivel grueso envuelve las muestras que representa
+    view = waveform_view(pyramid)
+    assert view['level'] > 0
+    size = view['samples_per_point']
+    padded = np.pad(samples, (0, -len(samples) % size), mode='edge').reshape(-1, size)
+    assert np.allclose(view['mins'], padded.min(axis=1), atol=1e-4)
+    assert np.allclose(view['maxs'], padded.max(axis=1), atol=1e-4)
+
+
+def test_waveform_zoom_callback(dash_app):
+    from src.app import clip_library, job_queue, update_waveform
+
+    entry = clip_library.index()[0]
+    prop = json.dumps({'index': 1, 'type': 'waveform-graph'}, separators=(',', ':')) + '.relayoutData'
+    full, style, job_id, interval_disabled = run_callback(
+        update_waveform, entry, None, None, None, triggered_prop='{"index":1,"type":"audio-storage"}.data')
+    if job_id is not None:
+        # La primera vez la pirámide se calcula en la cola y el intervalo la recoge
+        assert style == {'display': 'none'} and not interval_disabled
+        wait_for_job(job_queue, job_id)
+        full, style, job_id, interval_disabled = run_callback(
+            update_waveform, entry, None, 1, job_id, triggered_prop='{"index":1,"type":"waveform-interval"}.n_intervals')
+    assert style == {'display': 'block'} and job_id is None and interval_disabled
+    zoomed, _, _, _ = run_callback(update_waveform, entry, {'xaxis.range[0]': 0.5, 'xaxis.range[1]': 0.6},
+                                   None, None, triggered_prop=prop)
+    assert list(zoomed.layout.xaxis.range) == [0.5, 0.6]
+    assert len(zoomed.data[0].x) <= POINT_BUDGET
+    ignored = run_callback(update_waveform, entry, {'dragmode': 'pan'}, None, None, triggered_prop=prop)
+    assert all(value is dash.no_update for value in ignored)
+
+
+def test_waveform_skips_undecodable_audio(dash_app, tmp_path):
+    from src.app import audio_store, update_waveform
+
+    # Un M4A pasa el probe, pero soundfile no lo decodifica: no hay forma de onda
+    path = tmp_path / 'clip.m4a'
+    path.write_bytes(make_m4a_bytes())
+    reference = audio_store.reference(audio_store.move_file(str(path), '.m4a'), 'clip.m4a')
+    assert reference['format'] == 'm4a' and not reference['decodable']
+    outputs = run_callback(update_waveform, reference, None, None, None,
+                           triggered_prop='{"index":1,"type":"audio-storage"}.data')
+    assert outputs == ({}, {'display': 'none'}, None, True)
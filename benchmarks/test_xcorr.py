@@ -0,0 +1,78 @@
+"""
+Benchmarks del análisis de desfase entre canales.
+
+La correlación cruzada por ventanas se calcula por FFT y por lotes, así que
+un estímulo de 10 repeticiones se analiza en bastante menos de un segundo.
+"""
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.conftest import run_callback, wait_for_job
+from src.renderer import render_stimulus
+from src.xcorr import channel_lag
+
+UPDATE_BUDGET_S = 1.0
+
+
+@pytest.mark.parametrize("speed2", [None, 1.0, 1.1])
+def test_channel_lag_ten_loops(benchmark, speech_track, speed2):
+    samples, sample_rate = speech_track
+    track2 = None if speed2 is None else samples
+    stimulus = render_stimulus(samples, sample_rate, delay_ms=200, loops=10, track2=track2, speed2=speed2 or 1.0)
+    start = time.perf_counter()
+    channel_lag(stimulus, sample_rate)
+    # El gráfico debe poder actualizarse en menos de un segundo
+    assert time.perf_counter() - start < UPDATE_BUDGET_S
+    result = benchmark.pedantic(channel_lag, args=(stimulus, sample_rate), rounds=3)
+    if speed2 is None:
+        # Pista única: el canal derecho es la misma pista retrasada
+        assert abs(np.nanmedian(result['lag_ms']) - 200) < 0.5
+    elif speed2 == 1.0:
+        # Modo dual: el retraso se aplica a los dos canales
+        assert abs(np.nanmedian(result['lag_ms'])) < 0.5
+    if speed2 in (None, 1.0):
+        assert np.nanmedian(result['coherence']) > 0.99
+
+
+def test_channel_lag_tracks_drift():
+    # Ruido modulado por una envolvente silábica; el canal derecho lo repite con
+    # un retraso que crece de 50 a 250 ms, así que las formas de onda no coinciden
+    sample_rate = 16000
+    rng = np.random.default_rng(0)
+    n = 12 * sample_rate
+    knots = np.arange(0, n, sample_rate // 4)
+    envelope = np.interp(np.arange(n), knots, rng.uniform(0, 1, len(knots))) ** 2
+    source = (rng.standard_normal(n) * envelope).astype(np.float32)
+    t = np.arange(10 * sample_rate) / sample_rate
+    left = source[sample_rate:11 * sample_rate]
+    right = np.interp(t + 1 - (0.05 + 0.02 * t), np.arange(n) / sample_rate, source).astype(np.float32)
+
+    result = channel_lag(np.stack([left, right], axis=1), sample_rate)
+    expected = 1000 * (0.05 + 0.02 * result['envelope_times'])
+    assert np.nanpercentile(np.abs(result['envelope_lag_ms'] - expected), 90) < 15
+    assert np.nanmedian(result['envelope_coherence']) > 0.8
+
+
+def test_channel_lag_silence():
+    result = channel_lag(np.zeros((48000, 2), dtype=np.float32), 48000)
+    assert np.all(np.isnan(result['lag_ms']))
+
+
+def test_channel_lag_callback(dash_app):
+    from src.app import clip_library, job_queue, poll_channel_lag, start_channel_lag
+
+    entry = clip_library.index()[0]
+    href = f"/render/stimulus.wav?track1={entry['id']}&delay=150&loops=3&speed1=1.0"
+    job_id, interval_disabled, _ = run_callback(start_channel_lag, 1, href, triggered_prop='xcorr-button.n_clicks')
+    assert not interval_disabled
+
+    # El render y el análisis corren en la cola; el sondeo solo lee el resultado
+    wait_for_job(job_queue, job_id)
+    figure, style, interval_disabled, error = run_callback(poll_channel_lag, 1, job_id,
+                                                           triggered_prop='xcorr-interval.n_intervals')
+    assert error is None and style == {'display': 'block'} and interval_disabled
+    lags = np.array(figure.data[0].y, dtype=float)
+    assert abs(np.nanmedian(lags) - 150) < 0.5
+    assert any(shape.y0 == 150 for shape in figure.layout.shapes)
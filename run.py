@@ -2,11 +2,30 @@
 Run script for the Phantom Words Dashboard.
 This script serves as an entry point to run the Dash application.
 """
-from src.app import app
+import argparse
+
+from src.app import app, clip_library
 
 def main():
     """Run the Dash application server."""
+    # Decode the bundled clips once before serving the first request
+    clip_library.warm()
     app.run_server(debug=True, host="0.0.0.0", port=8050)
 
+def serve(argv=None):
+    """Run the application in production mode (multiple workers, compression, asset caching)."""
+    from src.serving import serve_production
+
+    parser = argparse.ArgumentParser(description="Serve the Phantom Words Dashboard in production mode.")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8050, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: 2 x cores + 1)")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per worker (default: 4)")
+    args = parser.parse_args(argv)
+
+    # Workers are forked after this point, so they all share the decoded library
+    clip_library.warm()
+    serve_production(app, host=args.host, port=args.port, workers=args.workers, threads=args.threads)
+
 if __name__ == "__main__":
     main()
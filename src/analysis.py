@@ -0,0 +1,200 @@
+"""
+Análisis de energía por bandas críticas de Bark de las pistas subidas.
+
+La señal se decodifica por bloques de tamaño fijo (con el solapamiento que
+necesita la STFT) y cada bloque se transforma de una vez: las ventanas se
+obtienen como vistas del bloque y se calcula la FFT de todas a la vez. Los
+bins de frecuencia se agrupan en las 24 bandas de ``BARK_BAND_EDGES`` con una
+matriz de bandas dispersa: cada bin pertenece a una sola banda, así que la
+matriz se guarda como los índices de inicio de cada banda y el producto se
+hace con ``np.add.reduceat``.
+
+La memoria usada depende del tamaño de bloque y no de la duración del audio,
+y el resultado se guarda en una caché en disco por hash del audio.
+"""
+import functools
+
+import numpy as np
+import soundfile as sf
+
+from src.audio_io import to_mono
+from src.bark import BARK_BAND_CENTERS, BARK_BAND_EDGES
+from src.cache import make_key
+
+# Parámetros de la STFT
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Ventanas de la STFT que se transforman en cada bloque
+FRAMES_PER_BLOCK = 256
+
+# Columnas máximas del mapa de calor; las ventanas se promedian para no superarlas
+MAX_COLUMNS = 600
+
+# Energía mínima en dB (evita log(0) en silencios y bandas sobre Nyquist)
+DB_FLOOR = -100.0
+
+# Incrementar al cambiar el análisis para invalidar la caché
+_ANALYSIS_VERSION = 1
+
+
+@functools.lru_cache(maxsize=8)
+def band_matrix(sample_rate, n_fft=N_FFT):
+    """
+    Matriz dispersa que agrupa los bins de la FFT en las bandas de Bark.
+
+    Parámetros:
+    sample_rate (int): Frecuencia de muestreo en Hz
+    n_fft (int): Tamaño de la FFT
+
+    Retorna:
+    tuple: (primer bin de cada banda no vacía, índices de esas bandas,
+    número de bins por banda); los bins fuera de las bandas se descartan
+    """
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    band_of_bin = np.searchsorted(BARK_BAND_EDGES, freqs, side='right') - 1
+    n_bands = len(BARK_BAND_EDGES) - 1
+    counts = np.bincount(band_of_bin[(band_of_bin >= 0) & (band_of_bin < n_bands)], minlength=n_bands)
+    bands = np.flatnonzero(counts)
+    starts = np.searchsorted(band_of_bin, bands)
+    return starts, bands, counts
+
+
+def band_energies(frames, sample_rate):
+    """
+    Energía media por banda de Bark de un lote de ventanas.
+
+    Parámetros:
+    frames (np.ndarray): Ventanas de forma (n, N_FFT), ya multiplicadas por la ventana de Hann
+    sample_rate (int): Frecuencia de muestreo en Hz
+
+    Retorna:
+    np.ndarray: Energías de forma (n, 24); cero en las bandas sobre Nyquist
+    """
+    starts, bands, counts = band_matrix(sample_rate, frames.shape[1])
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    # Se descartan los bins por encima de la última banda antes de sumar
+    last_bin = starts[-1] + counts[bands[-1]]
+    sums = np.add.reduceat(power[:, :last_bin], starts, axis=1)
+    energies = np.zeros((len(frames), len(counts)), dtype=np.float64)
+    energies[:, bands] = sums / counts[bands]
+    return energies
+
+
+def analyze_bark_bands(path, max_columns=MAX_COLUMNS, progress=None):
+    """
+    Calcula el mapa de energía por bandas de Bark de un archivo de audio.
+
+    Parámetros:
+    path (str): Ruta del archivo
+    max_columns (int): Número máximo de columnas temporales
+    progress (callable o None): Recibe la fracción procesada (0 a 1) tras cada bloque
+
+    Retorna:
+    dict: times (inicio de cada columna, s), centers (Hz de cada banda),
+    energy_db (arreglo float32 de forma (24, columnas)) y sample_rate
+    """
+    info = sf.info(path)
+    sample_rate = info.samplerate
+    total_frames = max(1 + (info.frames - N_FFT) // HOP_LENGTH, 1)
+    frames_per_column = -(-total_frames // max_columns)
+    n_columns = -(-total_frames // frames_per_column)
+
+    window = np.hanning(N_FFT).astype(np.float32)
+    sums = np.zeros((n_columns, len(BARK_BAND_CENTERS)), dtype=np.float64)
+    counts = np.zeros(n_columns, dtype=np.int64)
+
+    # Bloques consecutivos solapados en N_FFT - HOP_LENGTH muestras: cada uno
+    # aporta exactamente FRAMES_PER_BLOCK ventanas (menos el último)
+    block_size = N_FFT - HOP_LENGTH + HOP_LENGTH * FRAMES_PER_BLOCK
+    frame_index = 0
+    for block in sf.blocks(path, blocksize=block_size, overlap=N_FFT - HOP_LENGTH,
+                           dtype='float32', always_2d=True):
+        mono = to_mono(block)
+        n_frames = min(max(1 + (len(mono) - N_FFT) // HOP_LENGTH, 0), total_frames - frame_index)
+        if n_frames <= 0:
+            break
+        windows = np.lib.stride_tricks.sliding_window_view(mono, N_FFT)[::HOP_LENGTH][:n_frames]
+        energies = band_energies(windows * window, sample_rate)
+        columns = (frame_index + np.arange(n_frames)) // frames_per_column
+        np.add.at(sums, columns, energies)
+        np.add.at(counts, columns, 1)
+        frame_index += n_frames
+        if progress is not None:
+            progress(frame_index / total_frames)
+
+    mean = sums / np.maximum(counts, 1)[:, None]
+    energy_db = np.maximum(10 * np.log10(mean + 1e-12), DB_FLOOR).T.astype(np.float32)
+    times = np.arange(n_columns) * frames_per_column * HOP_LENGTH / sample_rate
+    return {
+        'times': times,
+        'centers': BARK_BAND_CENTERS,
+        'energy_db': energy_db,
+        'sample_rate': sample_rate,
+    }
+
+
+def analysis_to_cache(store, cache, audio_id, progress=None):
+    """
+    Devuelve el análisis por bandas de un audio, calculándolo solo si no está en caché.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de análisis (archivos .npz)
+    audio_id (str): Id corto del audio
+    progress (callable o None): Recibe la fracción procesada si hay que calcularlo
+
+    Retorna:
+    dict o None: Resultado de analyze_bark_bands, o None si el audio no existe
+    """
+    info = store.info(audio_id)
+    if info is None:
+        return None
+
+    key = make_key('bark-bands', info['sha256'], N_FFT, HOP_LENGTH, MAX_COLUMNS,
+                   BARK_BAND_EDGES.tolist(), _ANALYSIS_VERSION)
+
+    def write(path):
+        result = analyze_bark_bands(info['path'], progress=progress)
+        with open(path, 'wb') as f:
+            np.savez(f, **result)
+
+    with np.load(cache.get_or_create(key, write)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def bark_heatmap_figure(analyses):
+    """
+    Mapa de calor de energía por banda de Bark para una o varias pistas.
+
+    Parámetros:
+    analyses (list): Pares (título, resultado de analysis_to_cache)
+
+    Retorna:
+    plotly.graph_objs.Figure: Un mapa de calor por pista, apilados en vertical
+    """
+    from plotly.subplots import make_subplots
+    import plotly.graph_objs as go
+
+    fig = make_subplots(rows=len(analyses), cols=1, subplot_titles=[title for title, _ in analyses],
+                        vertical_spacing=0.15)
+    band_labels = [f"{band} ({center} Hz)" for band, center in enumerate(BARK_BAND_CENTERS, start=1)]
+    for row, (_, analysis) in enumerate(analyses, start=1):
+        fig.add_trace(go.Heatmap(
+            x=analysis['times'],
+            y=band_labels,
+            z=analysis['energy_db'],
+            coloraxis='coloraxis',
+            hovertemplate='t=%{x:.2f} s<br>Banda %{y}<br>%{z:.1f} dB<extra></extra>',
+        ), row=row, col=1)
+        fig.update_xaxes(title_text='Tiempo (s)', row=row, col=1)
+        fig.update_yaxes(title_text='Banda de Bark', row=row, col=1)
+
+    fig.update_layout(
+        title='Energía por Bandas Críticas de Bark',
+        coloraxis=dict(colorscale='Viridis', colorbar=dict(title='dB')),
+        plot_bgcolor='white',
+        margin=dict(l=40, r=40, t=80, b=40),
+        height=350 * len(analyses) + 100,
+    )
+    return fig
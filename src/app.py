@@ -1,107 +1,227 @@
 import dash
-from dash import html, dcc, Input, Output, State, callback, ctx, ClientsideFunction
+from dash import html, dcc, Input, Output, State, ALL, MATCH, callback, ctx, ClientsideFunction
 import dash_bootstrap_components as dbc
-import base64
-import json
+import functools
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
 import numpy as np
-import plotly.graph_objs as go
+from werkzeug.datastructures import MultiDict
+
+from src.analysis import analysis_to_cache, bark_heatmap_figure
+from src.bark import bark_scale, generate_bark_scale_figure, load_bark_data
+from src.cache import DiskLRUCache
+from src.config import (
+    ACCEPTED_EXTENSIONS, ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_BYTES, AUDIO_STORE_DIR,
+    BUNDLED_AUDIO_DIR, JOB_WORKERS, JOBS_DB_PATH, KEEP_ORIGINALS, LIBRARY_DIR, LIBRARY_SAMPLE_RATE,
+    MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS,
+    RENDER_CACHE_DIR, RESPONSES_DB_PATH, RENDER_CACHE_MAX_BYTES, SIMILARITY_INDEX_DIR, STREAM_CACHE_DIR,
+    STREAM_CACHE_MAX_BYTES, STREAM_SAMPLE_RATE, STREAM_SEGMENT_SECONDS, STRETCH_CACHE_DIR, STRETCH_CACHE_MAX_BYTES,
+    STRETCH_SAMPLE_RATE, SW_AUDIO_CACHE_MAX_BYTES, TRANSCODE_FORMAT, TRANSCODE_SAMPLE_RATE, WAVEFORM_CACHE_DIR,
+    WAVEFORM_CACHE_MAX_BYTES,
+)
+from src.jobs import ACTIVE_STATES, CANCELLED, DONE, JobQueue, create_jobs_blueprint
+from src.library import ClipLibrary, create_library_blueprint
+from src.metrics import SlowRequestProfiler, instrument_server
+from src.offline import create_service_worker_blueprint
+from src.renderer import MAX_DELAY_MS, MAX_TRACKS, create_render_blueprint, parse_render_params, render_to_cache
+from src.responses import ResponseLog, create_responses_blueprint, normalize_word
+from src.similarity import SimilarityIndex, fingerprint_from_energy
+from src.storage import AudioStore, create_audio_blueprint
+from src.streaming import create_streaming_blueprint
+from src.timestretch import create_timestretch_blueprint, stretch_to_cache
+from src.transcode import Transcoder
+from src.waveform import cached_waveform, load_pyramid, waveform_figure, waveform_to_cache, waveform_view
+from src.xcorr import lag_figure, stimulus_lag
+
+# Inicializar la aplicación Dash con el tema Bootstrap
+app = dash.Dash(
+    __name__,
+    external_stylesheets=[dbc.themes.BOOTSTRAP],
+    meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}],
+    suppress_callback_exceptions=True,
+    # El worker se sirve desde /service-worker.js (src/offline.py), no como recurso
+    assets_ignore=r'service-worker\.js',
+)
+
+# Latencia y tamaño de cada callback y ruta, exportados en /metrics
+instrument_server(app, profiler=SlowRequestProfiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS / 1000))
+
+# Almacén de audio direccionado por contenido y sus rutas de carga/descarga
+audio_store = AudioStore(AUDIO_STORE_DIR)
+app.server.register_blueprint(create_audio_blueprint(audio_store))
+
+# Las subidas se recortan, normalizan y transcodifican a un formato compacto para voz
+transcoder = Transcoder(audio_store, TRANSCODE_SAMPLE_RATE, TRANSCODE_FORMAT, keep_originals=KEEP_ORIGINALS)
+
+# Variantes de velocidad que conservan el tono, con caché en disco por (hash, velocidad)
+stretch_cache = DiskLRUCache(STRETCH_CACHE_DIR, STRETCH_CACHE_MAX_BYTES, suffix='.pcm')
+app.server.register_blueprint(create_timestretch_blueprint(audio_store, stretch_cache, STRETCH_SAMPLE_RATE))
+
+# Estímulos renderizados en el servidor, con caché LRU en disco
+render_cache = DiskLRUCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, suffix='.wav')
+app.server.register_blueprint(create_render_blueprint(audio_store, render_cache, stretch_cache))
+
+# Segmentos PCM para reproducir grabaciones largas sin decodificarlas enteras
+segment_cache = DiskLRUCache(STREAM_CACHE_DIR, STREAM_CACHE_MAX_BYTES, suffix='.pcm')
+app.server.register_blueprint(
+    create_streaming_blueprint(audio_store, segment_cache, STREAM_SEGMENT_SECONDS, STREAM_SAMPLE_RATE))
+
+# Análisis por bandas de Bark de cada audio, con caché en disco por hash
+analysis_cache = DiskLRUCache(ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_BYTES, suffix='.npz')
+
+# Pirámides de mínimos y máximos para la forma de onda de cada pista
+waveform_cache = DiskLRUCache(WAVEFORM_CACHE_DIR, WAVEFORM_CACHE_MAX_BYTES, suffix='.npz')
 
-# Función para calcular la escala de Bark
-def bark_scale(f):
+# Índice de huellas en bandas de Bark para buscar clips con espectro parecido
+similarity_index = SimilarityIndex(SIMILARITY_INDEX_DIR)
+
+# Cola de trabajos en segundo plano para el trabajo pesado (fuera de los callbacks)
+job_queue = JobQueue(JOBS_DB_PATH, workers=JOB_WORKERS)
+app.server.register_blueprint(create_jobs_blueprint(job_queue))
+
+
+def run_bark_analysis(params, report):
     """
-    Calcula el valor en la escala de Bark para una frecuencia dada en Hz.
+    Trabajo de la cola: analiza por bandas de Bark cada pista indicada.
 
     Parámetros:
-    f (float o array): Frecuencia en Hz
+    params (dict): 'ids' con los ids de los audios a analizar
+    report (callable): Función de progreso de la cola de trabajos
 
     Retorna:
-    float o array: Valor correspondiente en la escala de Bark
+    dict: Los mismos ids; los resultados quedan en la caché de análisis
     """
-    return 13 * np.arctan(0.00076 * f) + 3.5 * np.arctan((f/7500)**2)
+    ids = params['ids']
+    for i, audio_id in enumerate(ids):
+        message = f"Analizando pista {i + 1} de {len(ids)}..."
+        report(i / len(ids), message)
+        result = analysis_to_cache(
+            audio_store, analysis_cache, audio_id,
+            progress=lambda fraction, i=i: report((i + fraction) / len(ids), message))
+        if result is None:
+            raise ValueError("No se encontró el archivo. Por favor súbalo nuevamente.")
+    return {'ids': ids}
+
+
+job_queue.register('bark-analysis', run_bark_analysis)
 
-# Función para generar la gráfica de la escala de Bark
-def generate_bark_scale_figure():
+
+def run_waveform(params, report):
     """
-    Genera una figura de Plotly que muestra la relación entre frecuencia (Hz) y la escala de Bark.
+    Trabajo de la cola: calcula la pirámide de la forma de onda de un audio.
+
+    Parámetros:
+    params (dict): 'id' del audio
+    report (callable): Función de progreso de la cola de trabajos
 
     Retorna:
-    plotly.graph_objs.Figure: Figura con la gráfica de la escala de Bark
+    dict: El mismo id; la pirámide queda en la caché de formas de onda
     """
-    # Generar un rango de frecuencias de 20 Hz a 20 kHz (rango audible humano)
-    frequencies = np.logspace(np.log10(20), np.log10(20000), 1000)
-
-    # Calcular los valores correspondientes en la escala de Bark
-    bark_values = bark_scale(frequencies)
-
-    # Crear la figura
-    fig = go.Figure()
-
-    # Añadir la línea de la escala de Bark
-    fig.add_trace(go.Scatter(
-        x=frequencies,
-        y=bark_values,
-        mode='lines',
-        name='Escala de Bark',
-        line=dict(color='blue', width=2)
-    ))
-
-    # Definir las frecuencias límite de las bandas críticas de Bark
-    band_boundaries = [
-        0, 100, 200, 300, 400, 510, 630, 770, 920, 1080, 1270, 1480, 
-        1720, 2000, 2320, 2700, 3150, 3700, 4400, 5300, 6400, 7700, 9500, 12000, 15500
-    ]
+    report(0, "Calculando la forma de onda...")
+    if waveform_to_cache(audio_store, waveform_cache, params['id']) is None:
+        raise ValueError("No se encontró el archivo. Por favor súbalo nuevamente.")
+    return params
 
-    # Calcular los valores de Bark correspondientes a las frecuencias límite
-    band_bark_values = bark_scale(np.array(band_boundaries))
-
-    # Añadir puntos rojos para las bandas críticas
-    fig.add_trace(go.Scatter(
-        x=band_boundaries,
-        y=band_bark_values,
-        mode='markers',
-        name='Bandas Críticas',
-        marker=dict(
-            color='red',
-            size=8,
-            symbol='circle'
-        )
-    ))
-
-    # Configurar el diseño de la gráfica
-    fig.update_layout(
-        title='Relación entre Frecuencia y Escala de Bark',
-        xaxis=dict(
-            title='Frecuencia (Hz)',
-            type='log',
-            tickformat='.0f',
-            gridcolor='lightgray'
-        ),
-        yaxis=dict(
-            title='Escala de Bark (z)',
-            gridcolor='lightgray'
-        ),
-        plot_bgcolor='white',
-        margin=dict(l=40, r=40, t=50, b=40),
-        height=500,
-        width=700,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
-    )
 
-    return fig
+job_queue.register('waveform', run_waveform)
 
-# Inicializar la aplicación Dash con el tema Bootstrap
-app = dash.Dash(
-    __name__,
-    external_stylesheets=[dbc.themes.BOOTSTRAP],
-    meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}],
-    suppress_callback_exceptions=True,
-)
+
+def run_time_stretch(params, report):
+    """
+    Trabajo de la cola: precalcula la variante de una pista que conserva el tono.
+
+    Parámetros:
+    params (dict): 'id' del audio y 'speed'
+    report (callable): Función de progreso de la cola de trabajos
+
+    Retorna:
+    dict: Los mismos parámetros; la variante queda en la caché de variantes
+    """
+    report(0, "Estirando la pista...")
+    if stretch_to_cache(audio_store, stretch_cache, params['id'], params['speed'], STRETCH_SAMPLE_RATE) is None:
+        raise ValueError("No se encontró el archivo. Por favor súbalo nuevamente.")
+    return params
+
+
+job_queue.register('time-stretch', run_time_stretch)
+
+
+def run_ingest(params, report):
+    """
+    Trabajo de la cola: recorta, normaliza y transcodifica un audio subido.
+
+    Parámetros:
+    params (dict): 'id' del audio subido
+    report (callable): Función de progreso de la cola de trabajos
+
+    Retorna:
+    dict: 'id' del audio que sustituye a la subida
+    """
+    report(0, "Procesando el audio...")
+    audio_id = transcoder.ingest(params['id'])
+    if audio_id is None:
+        raise ValueError("No se encontró el archivo subido. Por favor súbalo nuevamente.")
+    return {'id': audio_id}
+
+
+job_queue.register('ingest', run_ingest)
+
+
+def run_channel_lag(params, report):
+    """
+    Trabajo de la cola: renderiza el estímulo y mide el desfase entre sus canales.
+
+    Parámetros:
+    params (dict): 'query' con la consulta del enlace de descarga del estímulo
+    report (callable): Función de progreso de la cola de trabajos
+
+    Retorna:
+    dict: Resultado de channel_lag en listas y 'nominal_ms', el retraso de referencia
+    """
+    # El mismo estímulo que se descarga, leído de la caché de renders
+    render_params = parse_render_params(MultiDict(parse_qsl(params['query'])))
+    report(0, "Renderizando el estímulo...")
+    path = render_to_cache(audio_store, render_cache, render_params, stretch_cache=stretch_cache)
+    if path is None:
+        raise ValueError("No se encontró el archivo. Por favor súbalo nuevamente.")
+    report(0.5, "Midiendo el desfase...")
+    result = {key: np.asarray(value).tolist() for key, value in stimulus_lag(path).items()}
+    # Solo en modo de pista única el retraso separa los canales; en modo dual retrasa a ambos
+    single = render_params.get('mode') != 'multi' and not render_params['track2']
+    result['nominal_ms'] = render_params['delay_ms'] if single else None
+    return result
+
+
+job_queue.register('channel-lag', run_channel_lag)
+
+
+def run_similarity_index(params, report):
+    """
+    Trabajo de la cola: construye el índice de similitud con los clips incluidos.
+
+    Parámetros:
+    params (dict): Sin parámetros; la cola no duplica un trabajo idéntico en curso
+    report (callable): Función de progreso de la cola de trabajos
+
+    Retorna:
+    dict: Número de clips indexados y de clips analizados de nuevo
+    """
+    report(0, "Indexando los clips...")
+    return similarity_index.build([BUNDLED_AUDIO_DIR], workers=1)
+
+
+job_queue.register('similarity-index', run_similarity_index)
+
+# Respuestas de los participantes, escritas por lotes en segundo plano
+response_log = ResponseLog(RESPONSES_DB_PATH)
+app.server.register_blueprint(create_responses_blueprint(response_log))
+
+# Biblioteca de clips incluidos, decodificados una sola vez a PCM compacto
+clip_library = ClipLibrary(BUNDLED_AUDIO_DIR, LIBRARY_DIR, audio_store, LIBRARY_SAMPLE_RATE)
+app.server.register_blueprint(create_library_blueprint(clip_library))
+
+# Service worker que guarda el panel y el audio para usarlos sin conexión
+app.server.register_blueprint(create_service_worker_blueprint(app, SW_AUDIO_CACHE_MAX_BYTES))
 
 # Usar la cadena de índice predeterminada de Dash (CSS ahora está en assets/custom_styles.css)
 
@@ -117,395 +237,705 @@ header_style = {
     "marginBottom": "2rem",
 }
 
-# Definir el diseño de la aplicación
-app.layout = html.Div([
-    # Sección de encabezado
-    html.Div([
-        html.H1("Panel de Palabras Fantasma", className="display-4"),
-        html.P("Una demostración del efecto de Palabras Fantasma", className="lead"),
-    ], style=header_style),
-
-    # Contenedor principal de contenido
-    dbc.Container([
-        # Sección de carga de audio
-        dbc.Row([
-            dbc.Col([
-                html.H3("Subir Archivos de Audio", className="mb-3"),
-                html.P("Seleccione archivos de audio para experimentar el efecto de Palabras Fantasma. Los archivos deben ser archivos de audio y menos de 5MB cada uno."),
-            ], width=12),
-        ], className="mb-2"),
-
-        # Selector de modo de pista
-        dbc.Row([
-            dbc.Col([
-                html.Label("Seleccionar Modo de Pista:"),
-                dcc.Dropdown(
-                    id='track-mode-selector',
-                    options=[
-                        {'label': 'Pista Única', 'value': 'single'},
-                        {'label': 'Pistas Duales', 'value': 'dual'}
-                    ],
-                    value='dual',
-                    clearable=False,
-                    style={'width': '100%'}
-                ),
-            ], width=12),
-        ], className="mb-3"),
-
-        dbc.Row([
-            dbc.Col([
-                html.H5("Pista 1", className="mb-2"),
-                dcc.Upload(
-                    id='upload-audio-1',
-                    children=html.Div([
-                        'Arrastrar y Soltar o ',
-                        html.A('Seleccionar Pista de Audio 1')
-                    ]),
-                    style={
-                        'width': '100%',
-                        'height': '60px',
-                        'lineHeight': '60px',
-                        'borderWidth': '1px',
-                        'borderStyle': 'dashed',
-                        'borderRadius': '5px',
-                        'textAlign': 'center',
-                        'margin': '10px 0'
-                    },
-                    multiple=False
+# Pistas del modo multipista: mínimo, valor inicial y reparto inicial en el campo estéreo
+MIN_MULTI_TRACKS = 2
+DEFAULT_MULTI_TRACKS = 4
+DEFAULT_PANS = (-1.0, 1.0, -0.5, 0.5, -0.75, 0.75, -0.25, 0.25)
+
+# Resultados que muestra la búsqueda de clips similares
+SIMILAR_CLIPS = 5
+
+def active_tracks(track_mode, track_count):
+    """
+    Índices de las pistas que participan en el estímulo según el modo.
+
+    Parámetros:
+    track_mode (str): 'single', 'dual' o 'multi'
+    track_count (int o None): Número de pistas del modo multipista
+
+    Retorna:
+    list: Índices de pista, empezando en 1
+    """
+    if track_mode == 'single':
+        return [1]
+    if track_mode == 'multi':
+        count = min(max(int(track_count or DEFAULT_MULTI_TRACKS), MIN_MULTI_TRACKS), MAX_TRACKS)
+        return list(range(1, count + 1))
+    return [1, 2]
+
+# Tarjeta con la carga, la velocidad y (en modo multipista) el panorama y retraso de una pista
+def build_track_card(index):
+    """
+    Crea los controles de una pista con ids de patrón ``{'type': ..., 'index': index}``.
+
+    Parámetros:
+    index (int): Número de la pista, empezando en 1
+
+    Retorna:
+    dash.html.Div: Carga de audio, reproductor, velocidad, panorama y retraso de la pista
+    """
+    return html.Div([
+        html.H5(f"Pista {index}", className="mb-2"),
+        dcc.Dropdown(
+            id={'type': 'library-selector', 'index': index},
+            options=clip_library.options(),
+            placeholder="Elegir un clip de la biblioteca...",
+            className="mb-2"
+        ),
+        dcc.Upload(
+            id={'type': 'upload-audio', 'index': index},
+            children=html.Div([
+                'Arrastrar y Soltar o ',
+                html.A(f'Seleccionar Pista de Audio {index}')
+            ]),
+            style={
+                'width': '100%',
+                'height': '60px',
+                'lineHeight': '60px',
+                'borderWidth': '1px',
+                'borderStyle': 'dashed',
+                'borderRadius': '5px',
+                'textAlign': 'center',
+                'margin': '10px 0'
+            },
+            multiple=False
+        ),
+        html.Div(id={'type': 'upload-error', 'index': index}, className="text-danger mt-2"),
+        html.Div(id={'type': 'audio-output', 'index': index}),
+        # Forma de onda de la pista; al hacer zoom se piden solo los puntos visibles
+        dcc.Graph(
+            id={'type': 'waveform-graph', 'index': index},
+            config={'displaylogo': False, 'modeBarButtonsToRemove': ['lasso2d', 'select2d']},
+            style={'display': 'none'},
+        ),
+
+        html.Label(f"Velocidad de reproducción de la Pista {index}:", className="mt-3"),
+        dcc.Slider(
+            id={'type': 'speed-slider', 'index': index},
+            min=0.5,
+            max=2.0,
+            step=0.1,
+            value=1.0,
+            marks={i/10: f'{i/10}x' for i in range(5, 21, 5)},
+            className="mb-2"
+        ),
+        html.Div(id={'type': 'speed-value-display', 'index': index}, className="text-center mb-3"),
+
+        # Posición en el campo estéreo y retraso propios de la pista (modo multipista)
+        html.Div(
+            id={'type': 'multi-controls', 'index': index},
+            children=[
+                html.Label(f"Panorama de la Pista {index}:"),
+                dcc.Slider(
+                    id={'type': 'pan-slider', 'index': index},
+                    min=-1.0,
+                    max=1.0,
+                    step=0.05,
+                    value=DEFAULT_PANS[index - 1],
+                    marks={-1: 'Izq.', 0: 'Centro', 1: 'Der.'},
+                    className="mb-2"
                 ),
-                html.Div(id='upload-error-1', className="text-danger mt-2"),
-                html.Div(id='audio-output-1'),
-            ], md=6),
-
-            dbc.Col([
-                html.Div(
-                    id='track-2-container',
-                    children=[
-                        html.H5("Pista 2", className="mb-2"),
-                        dcc.Upload(
-                            id='upload-audio-2',
-                            children=html.Div([
-                                'Arrastrar y Soltar o ',
-                                html.A('Seleccionar Pista de Audio 2')
-                            ]),
-                            style={
-                                'width': '100%',
-                                'height': '60px',
-                                'lineHeight': '60px',
-                                'borderWidth': '1px',
-                                'borderStyle': 'dashed',
-                                'borderRadius': '5px',
-                                'textAlign': 'center',
-                                'margin': '10px 0'
-                            },
-                            multiple=False
-                        ),
-                        html.Div(id='upload-error-2', className="text-danger mt-2"),
-                        html.Div(id='audio-output-2'),
-                    ]
-                )
-            ], md=6),
-        ], className="mb-4"),
-
-        # Sección de controles
-        dbc.Row([
-            dbc.Col([
-                html.H4("Control de Retraso", className="mb-3"),
-                html.P("Ajuste el retraso entre los canales de audio izquierdo y derecho:"),
+                html.Div(id={'type': 'pan-value-display', 'index': index}, className="text-center mb-3"),
+                html.Label(f"Retraso de la Pista {index}:"),
                 dcc.Slider(
-                    id='delay-slider',
+                    id={'type': 'track-delay-slider', 'index': index},
                     min=0,
-                    max=500,
+                    max=MAX_DELAY_MS,
                     step=10,
-                    value=200,
-                    marks={i: f'{i} ms' for i in range(0, 501, 100)},
+                    value=(index - 1) * 50,
+                    marks={i: f'{i} ms' for i in range(0, MAX_DELAY_MS + 1, 250)},
                     className="mb-2"
                 ),
-                html.Div(id='delay-value-display', className="text-center mb-4"),
-            ], md=6),
-
-            dbc.Col([
-                html.H4("Control de Repetición", className="mb-3"),
-                html.P("Establezca el número de veces para repetir el audio:"),
-                dbc.InputGroup([
-                    dbc.InputGroupText("Repeticiones:"),
-                    dbc.Input(
-                        id="loop-count",
-                        type="number",
-                        min=1,
-                        max=100,
-                        step=1,
-                        value=10
+                html.Div(id={'type': 'track-delay-value-display', 'index': index}, className="text-center mb-3"),
+            ]
+        ),
+
+        # Referencia (id y URL) del audio subido, trabajo que lo ingiere y sondeo
+        # de su estado, datos del audio validado, trabajo que precalcula su
+        # variante a la velocidad elegida y trabajo que calcula su forma de onda
+        dcc.Store(id={'type': 'upload-ref', 'index': index}),
+        dcc.Store(id={'type': 'ingest-job', 'index': index}),
+        dcc.Interval(id={'type': 'ingest-interval', 'index': index}, interval=500, disabled=True),
+        dcc.Store(id={'type': 'audio-storage', 'index': index}),
+        dcc.Store(id={'type': 'stretch-job', 'index': index}),
+        dcc.Store(id={'type': 'waveform-job', 'index': index}),
+        dcc.Interval(id={'type': 'waveform-interval', 'index': index}, interval=500, disabled=True),
+    ], className="mb-4")
+
+# Definir el diseño de la aplicación
+@functools.lru_cache(maxsize=1)
+def serve_layout():
+    """
+    Construye el diseño de la aplicación la primera vez que se solicita.
+
+    El resultado se memoriza, así que importar el módulo no construye el
+    diseño y las visitas siguientes reutilizan el mismo árbol de componentes.
+
+    Retorna:
+    dash.html.Div: Diseño completo del panel
+    """
+    bark_data = load_bark_data()
+
+    return html.Div([
+        # Sección de encabezado
+        html.Div([
+            html.H1("Panel de Palabras Fantasma", className="display-4"),
+            html.P("Una demostración del efecto de Palabras Fantasma", className="lead"),
+        ], style=header_style),
+
+        # Contenedor principal de contenido
+        dbc.Container([
+            # Sección de carga de audio
+            dbc.Row([
+                dbc.Col([
+                    html.H3("Subir Archivos de Audio", className="mb-3"),
+                    html.P(f"Seleccione archivos de audio para experimentar el efecto de Palabras Fantasma. Los archivos deben ser archivos de audio y menos de {MAX_UPLOAD_MB}MB cada uno."),
+                ], width=12),
+            ], className="mb-2"),
+
+            # Selector de modo de pista
+            dbc.Row([
+                dbc.Col([
+                    html.Label("Seleccionar Modo de Pista:"),
+                    dcc.Dropdown(
+                        id='track-mode-selector',
+                        options=[
+                            {'label': 'Pista Única', 'value': 'single'},
+                            {'label': 'Pistas Duales', 'value': 'dual'},
+                            {'label': 'Multipista', 'value': 'multi'}
+                        ],
+                        value='dual',
+                        clearable=False,
+                        style={'width': '100%'}
                     ),
-                ], className="mb-4"),
-            ], md=6),
-        ], className="mb-4"),
-
-        # Controles deslizantes de velocidad
-        dbc.Row([
-            dbc.Col([
-                html.H4("Control de Velocidad - Pista 1", className="mb-3"),
-                html.P("Ajuste la velocidad de reproducción de la Pista 1:"),
-                dcc.Slider(
-                    id='speed-slider-1',
-                    min=0.5,
-                    max=2.0,
-                    step=0.1,
-                    value=1.0,
-                    marks={i/10: f'{i/10}x' for i in range(5, 21, 5)},
-                    className="mb-2"
-                ),
-                html.Div(id='speed-value-display-1', className="text-center mb-4"),
-            ], md=6),
-
-            dbc.Col([
-                html.Div(
-                    id='speed-control-2-container',
-                    children=[
-                        html.H4("Control de Velocidad - Pista 2", className="mb-3"),
-                        html.P("Ajuste la velocidad de reproducción de la Pista 2:"),
-                        dcc.Slider(
-                            id='speed-slider-2',
-                            min=0.5,
-                            max=2.0,
-                            step=0.1,
-                            value=1.0,
-                            marks={i/10: f'{i/10}x' for i in range(5, 21, 5)},
-                            className="mb-2"
+                ], md=8),
+
+                dbc.Col([
+                    html.Div(
+                        id='track-count-container',
+                        children=[
+                            html.Label("Número de Pistas:"),
+                            dbc.Input(
+                                id='track-count',
+                                type='number',
+                                min=MIN_MULTI_TRACKS,
+                                max=MAX_TRACKS,
+                                step=1,
+                                value=DEFAULT_MULTI_TRACKS
+                            ),
+                        ]
+                    ),
+                ], md=4),
+            ], className="mb-3"),
+
+            # Una tarjeta por pista; el modo decide cuáles se muestran
+            dbc.Row([
+                dbc.Col(build_track_card(index), id={'type': 'track-card', 'index': index}, md=6)
+                for index in range(1, MAX_TRACKS + 1)
+            ], className="mb-4"),
+
+            # Sección de controles
+            dbc.Row([
+                dbc.Col([
+                    html.H4("Control de Retraso", className="mb-3"),
+                    html.P("Ajuste el retraso entre los canales de audio izquierdo y derecho:"),
+                    dcc.Slider(
+                        id='delay-slider',
+                        min=0,
+                        max=500,
+                        step=10,
+                        value=200,
+                        marks={i: f'{i} ms' for i in range(0, 501, 100)},
+                        className="mb-2"
+                    ),
+                    html.Div(id='delay-value-display', className="text-center mb-4"),
+                ], id='delay-control-container', md=6),
+
+                dbc.Col([
+                    html.H4("Control de Repetición", className="mb-3"),
+                    html.P("Establezca el número de veces para repetir el audio:"),
+                    dbc.InputGroup([
+                        dbc.InputGroupText("Repeticiones:"),
+                        dbc.Input(
+                            id="loop-count",
+                            type="number",
+                            min=1,
+                            max=100,
+                            step=1,
+                            value=10
                         ),
-                        html.Div(id='speed-value-display-2', className="text-center mb-4"),
-                    ]
-                )
-            ], md=6),
-        ], className="mb-4"),
-
-        # Botón de reproducción para el efecto de palabras fantasma
-        dbc.Row([
-            dbc.Col([
-                html.H4("Reproducir Efecto de Palabras Fantasma", className="mb-3"),
-                html.P("Haga clic en los botones a continuación para reproducir o detener el audio con el efecto de palabras fantasma:"),
-            ], width=12),
-        ], className="mb-2"),
-
-        # Fila de botones con espacio
-        dbc.Row([
-            dbc.Col([
-                dbc.Button(
-                    "Reproducir Audio",
-                    id="play-button",
-                    color="primary",
-                    className="w-100",
-                    n_clicks=0
-                ),
-            ], width=5),
-
-            # Columna vacía para espaciado
-            dbc.Col(width=2),
-
-            dbc.Col([
-                dbc.Button(
-                    "Detener Audio",
-                    id="stop-button",
-                    color="danger",
-                    className="w-100",
-                    n_clicks=0
-                ),
-            ], width=5),
-        ], className="mb-3"),
-
-        dbc.Row([
-            dbc.Col([
-                html.Div(id="playback-status", className="mt-2 text-center")
-            ], width=12),
-        ], className="mb-4"),
-
-        # Sección de ejemplo de la escala de Bark
-        dbc.Row([
-            dbc.Col([
-                html.H4("Ejemplo de Escala de Bark", className="mb-3"),
-                html.P([
-                    "La escala de Bark es una escala psicoacústica que representa cómo los humanos perciben las frecuencias de sonido. ",
-                    "Está dividida en bandas críticas (o 'barks') que corresponden a cómo nuestro sistema auditivo procesa diferentes rangos de frecuencia. ",
-                    "Esta escala es relevante para el efecto de palabras fantasma porque ayuda a entender cómo nuestro cerebro interpreta y fusiona sonidos, ",
-                    "especialmente cuando se presentan estímulos auditivos repetitivos y superpuestos como en este experimento."
-                ]),
-            ], width=12),
-        ], className="mb-3"),
+                    ], className="mb-3"),
+                    dbc.Switch(
+                        id='streaming-mode',
+                        label="Reproducción por segmentos (grabaciones largas)",
+                        value=False,
+                        className="mb-2"
+                    ),
+                    dbc.Switch(
+                        id='preserve-pitch',
+                        label="Preservar el tono al cambiar la velocidad",
+                        value=False,
+                        className="mb-4"
+                    ),
+                ], md=6),
+            ], className="mb-4"),
 
-        # Visualización de la escala de Bark
-        dbc.Row([
-            dbc.Col([
-                html.Div([
-                    dcc.Graph(
-                        id='bark-scale-graph',
-                        figure=generate_bark_scale_figure(),
-                        config={'displayModeBar': False}
+            # Botón de reproducción para el efecto de palabras fantasma
+            dbc.Row([
+                dbc.Col([
+                    html.H4("Reproducir Efecto de Palabras Fantasma", className="mb-3"),
+                    html.P("Haga clic en los botones a continuación para reproducir o detener el audio con el efecto de palabras fantasma:"),
+                ], width=12),
+            ], className="mb-2"),
+
+            # Fila de botones con espacio
+            dbc.Row([
+                dbc.Col([
+                    dbc.Button(
+                        "Reproducir Audio",
+                        id="play-button",
+                        color="primary",
+                        className="w-100",
+                        n_clicks=0
                     ),
-                    html.Figcaption(
-                        "Figura: Representación de la escala de Bark que muestra la relación no lineal entre la frecuencia (Hz) y la percepción auditiva (Bark). Generada con la ecuación: z(f) = 13 * arctan(0.00076 * f) + 3.5 * arctan((f/7500)²)",
-                        style={"textAlign": "center", "marginTop": "10px", "fontStyle": "italic"}
-                    )
-                ]),
-            ], width=12),
-        ]),
+                ], width=5),
+
+                # Columna vacía para espaciado
+                dbc.Col(width=2),
+
+                dbc.Col([
+                    dbc.Button(
+                        "Detener Audio",
+                        id="stop-button",
+                        color="danger",
+                        className="w-100",
+                        n_clicks=0
+                    ),
+                ], width=5),
+            ], className="mb-3"),
+
+            dbc.Row([
+                dbc.Col([
+                    html.Div(id="playback-status", className="mt-2 text-center")
+                ], width=12),
+            ], className="mb-2"),
+
+            # Panel de respuesta del participante
+            dbc.Row([
+                dbc.Col([
+                    html.H5("Respuesta del Participante", className="mb-2"),
+                    html.P("Después de escuchar el estímulo, escriba la palabra o frase que percibió:"),
+                    dbc.InputGroup([
+                        dbc.InputGroupText("Participante:"),
+                        dbc.Input(id='participant-id', type='text', placeholder="Id opcional", debounce=True),
+                    ], className="mb-2"),
+                    dbc.InputGroup([
+                        dbc.Input(id='response-word', type='text', placeholder="Palabra percibida..."),
+                        dbc.Button("Registrar Respuesta", id='submit-response', color="success", n_clicks=0),
+                    ]),
+                    html.Div(id='response-status', className="mt-2"),
+                    html.A("Exportar respuestas agregadas (CSV)", href="/responses/export.csv",
+                           className="d-inline-block mt-2"),
+                ], width=12),
+            ], className="mb-3"),
 
-        # Tabla de bandas críticas de Bark
-        dbc.Row([
-            dbc.Col([
-                html.H5("Bandas Críticas de la Escala de Bark", className="mb-3"),
-                html.P("La siguiente tabla muestra todas las bandas críticas de la escala de Bark y sus rangos de frecuencia correspondientes:"),
-                dbc.Table([
-                    html.Thead(
-                        html.Tr([
-                            html.Th("Banda Bark"),
-                            html.Th("Rango de Frecuencia (Hz)"),
-                            html.Th("Ancho de Banda (Hz)"),
-                            html.Th("Frecuencia Central (Hz)")
+            # Descarga del estímulo renderizado en el servidor
+            dbc.Row([
+                dbc.Col([
+                    html.A(
+                        "Descargar estímulo (WAV)",
+                        id="download-stimulus-link",
+                        className="btn btn-outline-secondary w-100 disabled",
+                    ),
+                ], width=12),
+            ], className="mb-4"),
+
+            # Sección de ejemplo de la escala de Bark
+            dbc.Row([
+                dbc.Col([
+                    html.H4("Ejemplo de Escala de Bark", className="mb-3"),
+                    html.P([
+                        "La escala de Bark es una escala psicoacústica que representa cómo los humanos perciben las frecuencias de sonido. ",
+                        "Está dividida en bandas críticas (o 'barks') que corresponden a cómo nuestro sistema auditivo procesa diferentes rangos de frecuencia. ",
+                        "Esta escala es relevante para el efecto de palabras fantasma porque ayuda a entender cómo nuestro cerebro interpreta y fusiona sonidos, ",
+                        "especialmente cuando se presentan estímulos auditivos repetitivos y superpuestos como en este experimento."
+                    ]),
+                ], width=12),
+            ], className="mb-3"),
+
+            # Visualización de la escala de Bark
+            dbc.Row([
+                dbc.Col([
+                    html.Div([
+                        dcc.Graph(
+                            id='bark-scale-graph',
+                            figure=bark_data['figure'],
+                            config={'displayModeBar': False}
+                        ),
+                        html.Figcaption(
+                            "Figura: Representación de la escala de Bark que muestra la relación no lineal entre la frecuencia (Hz) y la percepción auditiva (Bark). Generada con la ecuación: z(f) = 13 * arctan(0.00076 * f) + 3.5 * arctan((f/7500)²)",
+                            style={"textAlign": "center", "marginTop": "10px", "fontStyle": "italic"}
+                        )
+                    ]),
+                ], width=12),
+            ]),
+
+            # Tabla de bandas críticas de Bark
+            dbc.Row([
+                dbc.Col([
+                    html.H5("Bandas Críticas de la Escala de Bark", className="mb-3"),
+                    html.P("La siguiente tabla muestra todas las bandas críticas de la escala de Bark y sus rangos de frecuencia correspondientes:"),
+                    dbc.Table([
+                        html.Thead(
+                            html.Tr([
+                                html.Th("Banda Bark"),
+                                html.Th("Rango de Frecuencia (Hz)"),
+                                html.Th("Ancho de Banda (Hz)"),
+                                html.Th("Frecuencia Central (Hz)")
+                            ])
+                        ),
+                        html.Tbody([
+                            html.Tr([html.Td(cell) for cell in row]) for row in bark_data['table']
                         ])
+                    ], bordered=True, hover=True, responsive=True, striped=True, className="mb-3"),
+                    html.P([
+                        "En el efecto de palabras fantasma, los sonidos que caen dentro de la misma banda crítica tienden a ser procesados juntos por el cerebro, ",
+                        "lo que puede contribuir a la percepción de palabras o frases que no están realmente presentes en el estímulo auditivo original."
+                    ]),
+                ], width=12),
+            ], className="mb-4"),
+
+            # Análisis por bandas críticas de las pistas cargadas
+            dbc.Row([
+                dbc.Col([
+                    html.H5("Energía por Bandas Críticas de las Pistas", className="mb-3"),
+                    html.P("Analice las pistas cargadas para comparar cómo se reparte su energía entre las 24 bandas críticas a lo largo del tiempo:"),
+                    dbc.Button(
+                        "Analizar Pistas",
+                        id="analyze-button",
+                        color="secondary",
+                        n_clicks=0
                     ),
-                    html.Tbody([
-                        html.Tr([html.Td("1"), html.Td("0 - 100"), html.Td("100"), html.Td("50")]),
-                        html.Tr([html.Td("2"), html.Td("100 - 200"), html.Td("100"), html.Td("150")]),
-                        html.Tr([html.Td("3"), html.Td("200 - 300"), html.Td("100"), html.Td("250")]),
-                        html.Tr([html.Td("4"), html.Td("300 - 400"), html.Td("100"), html.Td("350")]),
-                        html.Tr([html.Td("5"), html.Td("400 - 510"), html.Td("110"), html.Td("450")]),
-                        html.Tr([html.Td("6"), html.Td("510 - 630"), html.Td("120"), html.Td("570")]),
-                        html.Tr([html.Td("7"), html.Td("630 - 770"), html.Td("140"), html.Td("700")]),
-                        html.Tr([html.Td("8"), html.Td("770 - 920"), html.Td("150"), html.Td("840")]),
-                        html.Tr([html.Td("9"), html.Td("920 - 1080"), html.Td("160"), html.Td("1000")]),
-                        html.Tr([html.Td("10"), html.Td("1080 - 1270"), html.Td("190"), html.Td("1170")]),
-                        html.Tr([html.Td("11"), html.Td("1270 - 1480"), html.Td("210"), html.Td("1370")]),
-                        html.Tr([html.Td("12"), html.Td("1480 - 1720"), html.Td("240"), html.Td("1600")]),
-                        html.Tr([html.Td("13"), html.Td("1720 - 2000"), html.Td("280"), html.Td("1850")]),
-                        html.Tr([html.Td("14"), html.Td("2000 - 2320"), html.Td("320"), html.Td("2150")]),
-                        html.Tr([html.Td("15"), html.Td("2320 - 2700"), html.Td("380"), html.Td("2500")]),
-                        html.Tr([html.Td("16"), html.Td("2700 - 3150"), html.Td("450"), html.Td("2900")]),
-                        html.Tr([html.Td("17"), html.Td("3150 - 3700"), html.Td("550"), html.Td("3400")]),
-                        html.Tr([html.Td("18"), html.Td("3700 - 4400"), html.Td("700"), html.Td("4000")]),
-                        html.Tr([html.Td("19"), html.Td("4400 - 5300"), html.Td("900"), html.Td("4800")]),
-                        html.Tr([html.Td("20"), html.Td("5300 - 6400"), html.Td("1100"), html.Td("5800")]),
-                        html.Tr([html.Td("21"), html.Td("6400 - 7700"), html.Td("1300"), html.Td("7000")]),
-                        html.Tr([html.Td("22"), html.Td("7700 - 9500"), html.Td("1800"), html.Td("8500")]),
-                        html.Tr([html.Td("23"), html.Td("9500 - 12000"), html.Td("2500"), html.Td("10500")]),
-                        html.Tr([html.Td("24"), html.Td("12000 - 15500"), html.Td("3500"), html.Td("13500")])
-                    ])
-                ], bordered=True, hover=True, responsive=True, striped=True, className="mb-3"),
-                html.P([
-                    "En el efecto de palabras fantasma, los sonidos que caen dentro de la misma banda crítica tienden a ser procesados juntos por el cerebro, ",
-                    "lo que puede contribuir a la percepción de palabras o frases que no están realmente presentes en el estímulo auditivo original."
-                ]),
-            ], width=12),
-        ], className="mb-4"),
+                    dbc.Progress(
+                        id='analysis-progress',
+                        value=0,
+                        striped=True,
+                        animated=True,
+                        className="mt-3",
+                        style={'display': 'none'}
+                    ),
+                    html.Div(id='analysis-error', className="text-danger mt-2"),
+                    dcc.Graph(
+                        id='bark-analysis-graph',
+                        config={'displayModeBar': False},
+                        style={'display': 'none'}
+                    ),
+                    # Trabajo de análisis en curso y sondeo de su progreso
+                    dcc.Store(id='analysis-job'),
+                    dcc.Interval(id='analysis-interval', interval=500, disabled=True),
+                ], width=12),
+            ], className="mb-4"),
+
+            # Desfase efectivo entre los canales del estímulo renderizado
+            dbc.Row([
+                dbc.Col([
+                    html.H5("Desfase Efectivo entre Canales", className="mb-3"),
+                    html.P("Con velocidades distintas y repeticiones el desfase real entre los canales deriva respecto al retraso nominal. Mida el desfase y la coherencia del estímulo actual a lo largo del tiempo:"),
+                    dbc.Button(
+                        "Analizar Desfase",
+                        id="xcorr-button",
+                        color="secondary",
+                        n_clicks=0
+                    ),
+                    html.Div(id='xcorr-error', className="text-danger mt-2"),
+                    dcc.Graph(
+                        id='xcorr-graph',
+                        config={'displayModeBar': False},
+                        style={'display': 'none'}
+                    ),
+                    # Trabajo de medida en curso y sondeo de su estado
+                    dcc.Store(id='xcorr-job'),
+                    dcc.Interval(id='xcorr-interval', interval=500, disabled=True),
+                ], width=12),
+            ], className="mb-4"),
 
-        # Divs ocultos para almacenar los datos de audio
-        html.Div(id='audio-storage-1', style={'display': 'none'}),
-        html.Div(id='audio-storage-2', style={'display': 'none'}),
+            # Búsqueda de clips cuyo espectro se solapa en las mismas bandas críticas
+            dbc.Row([
+                dbc.Col([
+                    html.H5("Clips con Espectro Similar", className="mb-3"),
+                    html.P("Busque en el corpus los clips que reparten su energía entre las bandas críticas de forma más parecida a cada pista cargada:"),
+                    dbc.Button(
+                        "Buscar Clips Similares",
+                        id="similar-button",
+                        color="secondary",
+                        n_clicks=0
+                    ),
+                    html.Div(id='similar-output', className="mt-3"),
+                    # Construcción del índice en curso y sondeo de su estado
+                    dcc.Store(id='similar-job'),
+                    dcc.Interval(id='similar-interval', interval=500, disabled=True),
+                ], width=12),
+            ], className="mb-4"),
 
-    ]),
+            # Últimos valores de retraso, velocidad y panorama aplicados en vivo
+            dcc.Store(id='live-params'),
+            # Parámetros del estímulo que suena, publicados por el navegador
+            dcc.Store(id='stimulus-params'),
 
-    # Pie de página
-    html.Footer([
-        html.P("Proyecto de Palabras Fantasma - 2025", className="text-center text-muted"),
-    ], style={"padding": "2rem 0", "marginTop": "2rem", "borderTop": "1px solid #e7e7e7"}),
-])
+        ]),
 
-# Callback para validar el archivo cargado y almacenar datos de audio para la Pista 1
-@callback(
-    [Output('upload-error-1', 'children'),
-     Output('audio-output-1', 'children'),
-     Output('audio-storage-1', 'children')],
-    [Input('upload-audio-1', 'contents')],
-    [State('upload-audio-1', 'filename')]
-)
-def update_output_track1(contents, filename):
-    if contents is None:
-        return None, None, None
+        # Pie de página
+        html.Footer([
+            html.P("Proyecto de Palabras Fantasma - 2025", className="text-center text-muted"),
+        ], style={"padding": "2rem 0", "marginTop": "2rem", "borderTop": "1px solid #e7e7e7"}),
+    ])
 
-    # Verificar la extensión del archivo
-    if not filename.lower().endswith(('.mp3', '.wav', '.ogg', '.m4a')):
-        return "Error: Por favor suba un archivo de audio (MP3, WAV, OGG, M4A).", None, None
+app.layout = serve_layout
 
-    # Decodificar el contenido del archivo
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
+# Resumen legible de las propiedades leídas de las cabeceras del audio
+def describe_audio(reference):
+    """
+    Describe el formato, la duración, la frecuencia y los canales de un audio.
 
-    # Verificar el tamaño del archivo (límite de 30MB)
-    if len(decoded) > 30 * 1024 * 1024:  # 5MB en bytes
-        return "Error: El tamaño del archivo excede el límite de 30MB.", None, None
+    Parámetros:
+    reference (dict): Referencia del almacén o entrada de la biblioteca
 
-    # Almacenar los datos de audio
-    audio_data = {
-        'content': contents,
-        'filename': filename
-    }
+    Retorna:
+    str: Texto como 'MP3 · 1.66 s · 24000 Hz · mono' (vacío si no hay datos)
+    """
+    parts = []
+    if reference.get('format'):
+        parts.append(reference['format'].upper())
+    if reference.get('duration') is not None:
+        parts.append(f"{reference['duration']:.2f} s")
+    if reference.get('sample_rate'):
+        parts.append(f"{reference['sample_rate']} Hz")
+    if reference.get('channels'):
+        parts.append({1: 'mono', 2: 'estéreo'}.get(reference['channels'], f"{reference['channels']} canales"))
+    return " · ".join(parts)
 
-    # Crear componente de reproductor de audio
-    audio_player = html.Div([
-        html.H6(f"Archivo seleccionado: {filename}", className="mt-2"),
+# Componente de reproductor para un audio ya almacenado en el servidor
+def build_audio_player(player_id, reference):
+    """
+    Crea el reproductor de audio para una referencia del almacén.
+
+    Parámetros:
+    player_id (str o dict): Id del elemento html.Audio
+    reference (dict): Referencia devuelta por la ruta de carga
+
+    Retorna:
+    dash.html.Div: Nombre del archivo y reproductor apuntando a la URL del audio
+    """
+    details = describe_audio(reference)
+    return html.Div([
+        html.H6(f"Archivo seleccionado: {reference['filename']}", className="mt-2"),
+        html.Small(details, className="text-muted") if details else None,
         html.Audio(
-            id='audio-player-1',
-            src=contents,
+            id=player_id,
+            src=reference['url'],
             controls=True,
+            preload='metadata',
             style={'width': '100%', 'marginTop': '5px'}
         )
     ])
 
-    return None, audio_player, json.dumps(audio_data)
+# Subir los archivos al almacén en fragmentos desde el navegador
+app.clientside_callback(
+    ClientsideFunction(
+        namespace='uploader',
+        function_name='uploadToStore'
+    ),
+    Output({'type': 'upload-ref', 'index': MATCH}, 'data'),
+    [Input({'type': 'upload-audio', 'index': MATCH}, 'contents')],
+    [State({'type': 'upload-audio', 'index': MATCH}, 'filename')]
+)
+
+# Validación común de un archivo subido a cualquiera de las pistas
+def validate_upload(upload_ref):
+    """
+    Valida un archivo subido consultando el almacén y sus cabeceras.
+
+    No se decodifica el audio: el tamaño sale del almacén y el formato, la
+    duración, la frecuencia de muestreo y los canales de las cabeceras, así
+    que el coste no depende del tamaño del archivo.
+
+    Parámetros:
+    upload_ref (dict): Referencia devuelta por la subida en el navegador
+
+    Retorna:
+    tuple: (mensaje de error o None, referencia validada o None)
+    """
+    filename = upload_ref.get('filename') or ''
+
+    # Verificar la extensión del archivo
+    if not filename.lower().endswith(ACCEPTED_EXTENSIONS):
+        return "Error: Por favor suba un archivo de audio (MP3, WAV, OGG, M4A).", None
+
+    if upload_ref.get('error'):
+        return f"Error: {upload_ref['error']}", None
+
+    # Consultar el archivo en el almacén en lugar de confiar en el navegador
+    reference = audio_store.reference(upload_ref.get('id'), filename)
+    if reference is None:
+        return "Error: No se encontró el archivo subido. Por favor súbalo nuevamente.", None
+
+    # Verificar el tamaño del archivo (límite común a todas las pistas)
+    if reference['size'] > MAX_UPLOAD_BYTES:
+        return f"Error: El tamaño del archivo excede el límite de {MAX_UPLOAD_MB}MB.", None
+
+    # Verificar que las cabeceras correspondan a un formato de audio reconocido
+    if reference['format'] is None:
+        return "Error: El archivo no es un audio MP3, WAV, OGG o M4A válido.", None
+
+    return None, reference
 
-# Callback para validar el archivo cargado y almacenar datos de audio para la Pista 2
+# Resultado de la ingesta de una subida en la cola de trabajos
+def ingest_output(player_id, job):
+    """
+    Salidas de update_track_output mientras se ingiere una subida.
+
+    Parámetros:
+    player_id (dict): Id del reproductor de la pista
+    job (dict): 'id' del trabajo de ingesta y 'filename' original
+
+    Retorna:
+    tuple: Error, reproductor, referencia, trabajo e intervalo desactivado
+    """
+    status = job_queue.status(job['id']) if job else None
+    if status is None:
+        return None, None, None, None, True
+    if status['status'] in ACTIVE_STATES:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, False
+    reference = None
+    if status['status'] == DONE:
+        reference = audio_store.reference(status['result']['id'], job['filename'])
+    if reference is None:
+        error = "Error: No se pudo procesar el archivo subido. Por favor súbalo nuevamente."
+        return error, None, None, None, True
+    return None, build_audio_player(player_id, reference), reference, None, True
+
+# Callback para validar el archivo cargado y almacenar los datos de audio de cada pista;
+# la subida se sustituye por su versión recortada, normalizada y transcodificada
 @callback(
-    [Output('upload-error-2', 'children'),
-     Output('audio-output-2', 'children'),
-     Output('audio-storage-2', 'children')],
-    [Input('upload-audio-2', 'contents')],
-    [State('upload-audio-2', 'filename')]
+    [Output({'type': 'upload-error', 'index': MATCH}, 'children'),
+     Output({'type': 'audio-output', 'index': MATCH}, 'children'),
+     Output({'type': 'audio-storage', 'index': MATCH}, 'data'),
+     Output({'type': 'ingest-job', 'index': MATCH}, 'data'),
+     Output({'type': 'ingest-interval', 'index': MATCH}, 'disabled')],
+    [Input({'type': 'upload-ref', 'index': MATCH}, 'data'),
+     Input({'type': 'library-selector', 'index': MATCH}, 'value'),
+     Input({'type': 'ingest-interval', 'index': MATCH}, 'n_intervals')],
+    [State({'type': 'ingest-job', 'index': MATCH}, 'data')]
 )
-def update_output_track2(contents, filename):
-    if contents is None:
-        return None, None, None
+def update_track_output(upload_ref, library_clip, n_intervals, ingest_job):
+    trigger = ctx.triggered_id
+    if trigger is None:
+        return None, None, None, None, True
+    player_id = {'type': 'audio-player', 'index': trigger['index']}
 
-    # Verificar la extensión del archivo
-    if not filename.lower().endswith(('.mp3', '.wav', '.ogg', '.m4a')):
-        return "Error: Por favor suba un archivo de audio (MP3, WAV, OGG, M4A).", None, None
+    if trigger['type'] == 'ingest-interval':
+        return ingest_output(player_id, ingest_job)
 
-    # Decodificar el contenido del archivo
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
+    # Los clips de la biblioteca se cargan por referencia, sin pasar por la subida
+    if trigger['type'] == 'library-selector':
+        entry = clip_library.entry(library_clip) if library_clip else None
+        if entry is None:
+            return None, None, None, None, True
+        return None, build_audio_player(player_id, entry), entry, None, True
 
-    # Verificar el tamaño del archivo (límite de 5MB)
-    if len(decoded) > 5 * 1024 * 1024:  # 5MB en bytes
-        return "Error: El tamaño del archivo excede el límite de 5MB.", None, None
+    if upload_ref is None:
+        return None, None, None, None, True
 
-    # Almacenar los datos de audio
-    audio_data = {
-        'content': contents,
-        'filename': filename
-    }
+    error, reference = validate_upload(upload_ref)
+    if error:
+        return error, None, None, None, True
 
-    # Crear componente de reproductor de audio
-    audio_player = html.Div([
-        html.H6(f"Archivo seleccionado: {filename}", className="mt-2"),
-        html.Audio(
-            id='audio-player-2',
-            src=contents,
-            controls=True,
-            style={'width': '100%', 'marginTop': '5px'}
-        )
-    ])
+    # Una subida repetida ya está ingerida; si no, se procesa en la cola de trabajos
+    ingested = transcoder.ingested_id(reference['id'])
+    if ingested is not None:
+        reference = audio_store.reference(ingested, reference['filename'])
+        return None, build_audio_player(player_id, reference), reference, None, True
+    job = {'id': job_queue.submit('ingest', {'id': reference['id']}), 'filename': reference['filename']}
+    return None, html.Small("Procesando el audio...", className="text-muted"), None, job, False
+
+def visible_range(relayout_data):
+    """
+    Extrae el rango de tiempo visible de un evento ``relayoutData`` de Plotly.
+
+    Parámetros:
+    relayout_data (dict o None): Cambios de diseño enviados por el gráfico
 
-    return None, audio_player, json.dumps(audio_data)
+    Retorna:
+    tuple: ('range', [inicio, fin]) tras un zoom, ('full', None) al
+    restablecer la vista, o (None, None) si el evento no cambia el eje x
+    """
+    if not relayout_data:
+        return None, None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return 'range', [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    if 'xaxis.range' in relayout_data:
+        return 'range', list(relayout_data['xaxis.range'])
+    if relayout_data.get('xaxis.autorange'):
+        return 'full', None
+    return None, None
 
-# Callbacks para mostrar/ocultar la pista 2 y el control deslizante de velocidad 2 según el modo de pista
+# Callback para dibujar la forma de onda de cada pista y refinarla al hacer zoom;
+# la pirámide se calcula en la cola de trabajos la primera vez
 @callback(
-    [Output('track-2-container', 'style'),
-     Output('speed-control-2-container', 'style')],
-    [Input('track-mode-selector', 'value')]
+    [Output({'type': 'waveform-graph', 'index': MATCH}, 'figure'),
+     Output({'type': 'waveform-graph', 'index': MATCH}, 'style'),
+     Output({'type': 'waveform-job', 'index': MATCH}, 'data'),
+     Output({'type': 'waveform-interval', 'index': MATCH}, 'disabled')],
+    [Input({'type': 'audio-storage', 'index': MATCH}, 'data'),
+     Input({'type': 'waveform-graph', 'index': MATCH}, 'relayoutData'),
+     Input({'type': 'waveform-interval', 'index': MATCH}, 'n_intervals')],
+    [State({'type': 'waveform-job', 'index': MATCH}, 'data')]
 )
-def toggle_track2_visibility(track_mode):
-    if track_mode == 'single':
-        return {'display': 'none'}, {'display': 'none'}
-    else:
-        return {'display': 'block'}, {'display': 'block'}
+def update_waveform(audio, relayout_data, n_intervals, job_id):
+    hidden = {}, {'display': 'none'}, None, True
+    # Los audios que el servidor no decodifica (M4A) se reproducen sin forma de onda
+    if not audio or not audio.get('decodable', True):
+        return hidden
+    trigger = ctx.triggered_id['type'] if ctx.triggered_id is not None else None
+
+    path = cached_waveform(audio_store, waveform_cache, audio['id'])
+    if path is None:
+        status = job_queue.status(job_id) if trigger == 'waveform-interval' and job_id else None
+        if status is not None and status['status'] in ACTIVE_STATES:
+            return dash.no_update, dash.no_update, job_id, False
+        if status is not None:
+            return hidden
+        return {}, {'display': 'none'}, job_queue.submit('waveform', {'id': audio['id']}), False
+
+    # Al cambiar el audio se muestra entero; al hacer zoom, solo el rango visible
+    x_range = None
+    if trigger == 'waveform-graph':
+        change, x_range = visible_range(relayout_data)
+        if change is None:
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+
+    pyramid = load_pyramid(path)
+    start, end = (None, None) if x_range is None else sorted(float(value) for value in x_range)
+    view = waveform_view(pyramid, start, end, path=audio_store.info(audio['id'])['path'])
+    return waveform_figure(view, x_range, uirevision=audio['id']), {'display': 'block'}, None, True
+
+# Callback para mostrar las pistas del modo elegido y sus controles
+@callback(
+    [Output({'type': 'track-card', 'index': ALL}, 'style'),
+     Output({'type': 'multi-controls', 'index': ALL}, 'style'),
+     Output('track-count-container', 'style'),
+     Output('delay-control-container', 'style')],
+    [Input('track-mode-selector', 'value'),
+     Input('track-count', 'value')]
+)
+def toggle_track_visibility(track_mode, track_count):
+    shown, hidden = {'display': 'block'}, {'display': 'none'}
+    active = active_tracks(track_mode, track_count)
+    cards = [shown if index in active else hidden for index in range(1, MAX_TRACKS + 1)]
+    # En multipista cada pista tiene su propio retraso y panorama
+    multi = track_mode == 'multi'
+    return (cards, [shown if multi else hidden] * MAX_TRACKS,
+            shown if multi else hidden, hidden if multi else shown)
 
 
 # Callbacks para actualizar las visualizaciones de valores para los controles deslizantes
@@ -517,18 +947,260 @@ def update_delay_display(value):
     return f"Retraso actual: {value} ms"
 
 @callback(
-    Output('speed-value-display-1', 'children'),
-    [Input('speed-slider-1', 'value')]
+    Output({'type': 'speed-value-display', 'index': MATCH}, 'children'),
+    [Input({'type': 'speed-slider', 'index': MATCH}, 'value')]
 )
-def update_speed1_display(value):
+def update_speed_display(value):
     return f"Velocidad actual: {value}x"
 
 @callback(
-    Output('speed-value-display-2', 'children'),
-    [Input('speed-slider-2', 'value')]
+    Output({'type': 'pan-value-display', 'index': MATCH}, 'children'),
+    [Input({'type': 'pan-slider', 'index': MATCH}, 'value')]
 )
-def update_speed2_display(value):
-    return f"Velocidad actual: {value}x"
+def update_pan_display(value):
+    if not value:
+        return "Panorama actual: centro"
+    side = "izquierda" if value < 0 else "derecha"
+    return f"Panorama actual: {abs(value):.0%} a la {side}"
+
+@callback(
+    Output({'type': 'track-delay-value-display', 'index': MATCH}, 'children'),
+    [Input({'type': 'track-delay-slider', 'index': MATCH}, 'value')]
+)
+def update_track_delay_display(value):
+    return f"Retraso actual: {value} ms"
+
+# Callback para actualizar el enlace de descarga del estímulo renderizado en el servidor
+@callback(
+    [Output('download-stimulus-link', 'href'),
+     Output('download-stimulus-link', 'className')],
+    [Input({'type': 'audio-storage', 'index': ALL}, 'data'),
+     Input('track-mode-selector', 'value'),
+     Input('track-count', 'value'),
+     Input('delay-slider', 'value'),
+     Input('loop-count', 'value'),
+     Input({'type': 'speed-slider', 'index': ALL}, 'value'),
+     Input({'type': 'pan-slider', 'index': ALL}, 'value'),
+     Input({'type': 'track-delay-slider', 'index': ALL}, 'value'),
+     Input('preserve-pitch', 'value')]
+)
+def update_download_link(audio, track_mode, track_count, delay, loops, speeds, pans, track_delays, preserve_pitch):
+    base_class = "btn btn-outline-secondary w-100"
+    active = [index - 1 for index in active_tracks(track_mode, track_count)]
+    if any(not audio[i] for i in active):
+        return None, base_class + " disabled"
+
+    if track_mode == 'multi':
+        params = {
+            'mode': 'multi',
+            'tracks': ",".join(audio[i]['id'] for i in active),
+            'delays': ",".join(str(track_delays[i] or 0) for i in active),
+            'speeds': ",".join(str(speeds[i]) for i in active),
+            'pans': ",".join(str(pans[i]) for i in active),
+            'loops': loops or 1,
+        }
+    else:
+        params = {'track1': audio[0]['id'], 'delay': delay or 0, 'loops': loops or 1, 'speed1': speeds[0]}
+        if track_mode == 'dual':
+            params.update({'track2': audio[1]['id'], 'speed2': speeds[1]})
+    if preserve_pitch:
+        params['pitch'] = 1
+    return f"/render/stimulus.wav?{urlencode(params)}", base_class
+
+# Callback para precalcular en la cola de trabajos la variante que conserva el tono
+@callback(
+    Output({'type': 'stretch-job', 'index': MATCH}, 'data'),
+    [Input({'type': 'speed-slider', 'index': MATCH}, 'value'),
+     Input({'type': 'audio-storage', 'index': MATCH}, 'data'),
+     Input('preserve-pitch', 'value')],
+    prevent_initial_call=True
+)
+def prefetch_time_stretch(speed, audio, preserve_pitch):
+    # Al pulsar reproducir (o mover el control en vivo) la variante ya está en caché
+    if not preserve_pitch or not audio or not speed or speed == 1.0:
+        return None
+    return job_queue.submit('time-stretch', {'id': audio['id'], 'speed': round(speed, 2)})
+
+# Callback para encolar el análisis por bandas de Bark de las pistas cargadas
+@callback(
+    [Output('analysis-job', 'data'),
+     Output('analysis-interval', 'disabled'),
+     Output('analysis-progress', 'style'),
+     Output('analysis-error', 'children')],
+    [Input('analyze-button', 'n_clicks')],
+    [State({'type': 'audio-storage', 'index': ALL}, 'data'),
+     State('track-mode-selector', 'value'),
+     State('track-count', 'value')],
+    prevent_initial_call=True
+)
+def start_bark_analysis(n_clicks, audio, track_mode, track_count):
+    tracks = [(f"Pista {index}", audio[index - 1]) for index in active_tracks(track_mode, track_count)]
+    if any(audio is None for _, audio in tracks):
+        return None, True, {'display': 'none'}, "Error: Cargue primero las pistas que desea analizar."
+
+    # El análisis se ejecuta en la cola de trabajos; este callback solo lo encola
+    job_id = job_queue.submit('bark-analysis', {'ids': [audio['id'] for _, audio in tracks]})
+    job = {
+        'id': job_id,
+        'titles': [f"{title}: {audio['filename']}" for title, audio in tracks],
+    }
+    return job, False, {'display': 'flex'}, None
+
+# Callback para seguir el progreso del análisis y mostrar el mapa de calor al terminar
+@callback(
+    [Output('analysis-progress', 'value'),
+     Output('analysis-progress', 'label'),
+     Output('analysis-progress', 'style', allow_duplicate=True),
+     Output('analysis-interval', 'disabled', allow_duplicate=True),
+     Output('bark-analysis-graph', 'figure'),
+     Output('bark-analysis-graph', 'style'),
+     Output('analysis-error', 'children', allow_duplicate=True)],
+    [Input('analysis-interval', 'n_intervals')],
+    [State('analysis-job', 'data')],
+    prevent_initial_call=True
+)
+def poll_bark_analysis(n_intervals, job):
+    status = job_queue.status(job['id']) if job else None
+    if status is None:
+        return 0, "", {'display': 'none'}, True, dash.no_update, dash.no_update, None
+
+    percent = round(status['progress'] * 100)
+    if status['status'] in ACTIVE_STATES:
+        return percent, f"{percent}%", {'display': 'flex'}, False, dash.no_update, dash.no_update, None
+
+    if status['status'] != DONE:
+        error = "Análisis cancelado." if status['status'] == CANCELLED else f"Error: {status['message']}"
+        return percent, "", {'display': 'none'}, True, dash.no_update, dash.no_update, error
+
+    # Los resultados ya están en la caché: construir la figura es inmediato
+    analyses = [
+        (title, analysis_to_cache(audio_store, analysis_cache, audio_id))
+        for title, audio_id in zip(job['titles'], status['result']['ids'])
+    ]
+    return 100, "", {'display': 'none'}, True, bark_heatmap_figure(analyses), {'display': 'block'}, None
+
+# Callback para cancelar el análisis en curso con el botón de detener
+@callback(
+    Output('analysis-error', 'children', allow_duplicate=True),
+    [Input('stop-button', 'n_clicks')],
+    [State('analysis-job', 'data')],
+    prevent_initial_call=True
+)
+def cancel_bark_analysis(n_clicks, job):
+    if job and job_queue.cancel(job['id']):
+        return "Cancelando análisis..."
+    return dash.no_update
+
+# Callback para encolar la medida del desfase entre canales del estímulo actual
+@callback(
+    [Output('xcorr-job', 'data'),
+     Output('xcorr-interval', 'disabled'),
+     Output('xcorr-error', 'children')],
+    [Input('xcorr-button', 'n_clicks')],
+    [State('download-stimulus-link', 'href')],
+    prevent_initial_call=True
+)
+def start_channel_lag(n_clicks, href):
+    if not href:
+        return None, True, "Error: Cargue primero las pistas del estímulo."
+    # El render y el análisis se ejecutan en la cola de trabajos; este callback solo los encola
+    return job_queue.submit('channel-lag', {'query': urlsplit(href).query}), False, "Midiendo el desfase..."
+
+# Callback para mostrar el desfase cuando termina el trabajo
+@callback(
+    [Output('xcorr-graph', 'figure'),
+     Output('xcorr-graph', 'style'),
+     Output('xcorr-interval', 'disabled', allow_duplicate=True),
+     Output('xcorr-error', 'children', allow_duplicate=True)],
+    [Input('xcorr-interval', 'n_intervals')],
+    [State('xcorr-job', 'data')],
+    prevent_initial_call=True
+)
+def poll_channel_lag(n_intervals, job_id):
+    status = job_queue.status(job_id) if job_id else None
+    if status is None:
+        return dash.no_update, dash.no_update, True, None
+    if status['status'] in ACTIVE_STATES:
+        return dash.no_update, dash.no_update, False, dash.no_update
+    if status['status'] != DONE:
+        return dash.no_update, {'display': 'none'}, True, f"Error: {status['message']}"
+
+    result = dict(status['result'])
+    nominal = result.pop('nominal_ms')
+    return lag_figure(result, nominal), {'display': 'block'}, True, None
+
+# Callback para buscar en el índice los clips más parecidos a cada pista cargada
+@callback(
+    [Output('similar-output', 'children'),
+     Output('similar-job', 'data'),
+     Output('similar-interval', 'disabled')],
+    [Input('similar-button', 'n_clicks'),
+     Input('similar-interval', 'n_intervals')],
+    [State({'type': 'audio-storage', 'index': ALL}, 'data'),
+     State('track-mode-selector', 'value'),
+     State('track-count', 'value'),
+     State('similar-job', 'data')],
+    prevent_initial_call=True
+)
+def find_similar_clips(n_clicks, n_intervals, audio, track_mode, track_count, job_id):
+    tracks = [(index, audio[index - 1]) for index in active_tracks(track_mode, track_count)]
+    tracks = [(index, track) for index, track in tracks if track is not None]
+    if not tracks:
+        return html.Span("Error: Cargue primero alguna pista.", className="text-danger"), None, True
+
+    # Sin índice construido con el CLI se indexan los clips incluidos en la cola de trabajos
+    if similarity_index.load() is None:
+        # Un clic vuelve a encolar la construcción si la anterior falló
+        polling = ctx.triggered_id == 'similar-interval' and job_id
+        status = job_queue.status(job_id) if polling else None
+        if status is not None and status['status'] in ACTIVE_STATES:
+            return dash.no_update, job_id, False
+        if status is not None:
+            message = status['message'] if status['status'] != DONE else "No se pudo leer el índice."
+            return html.Span(f"Error: {message}", className="text-danger"), None, True
+        return "Construyendo el índice de clips...", job_queue.submit('similarity-index', {}), False
+
+    sections = []
+    for index, track in tracks:
+        info = audio_store.info(track['id'])
+        # La huella se deriva del análisis por bandas, que queda en caché
+        analysis = analysis_to_cache(audio_store, analysis_cache, track['id'])
+        if info is None or analysis is None:
+            continue
+        results = similarity_index.query(fingerprint_from_energy(analysis['energy_db']), k=SIMILAR_CLIPS,
+                                         exclude_sha256=info['sha256'])
+        sections.append(html.Div([
+            html.H6(f"Pista {index}: {track['filename']}"),
+            dbc.Table([
+                html.Thead(html.Tr([html.Th("Clip"), html.Th("Similitud")])),
+                html.Tbody([
+                    html.Tr([html.Td(result['name']), html.Td(f"{result['similarity']:.3f}")])
+                    for result in results
+                ]),
+            ], bordered=True, size="sm", className="mb-3"),
+        ]))
+    return sections, None, True
+
+# Callback para registrar la respuesta del participante con el estímulo que sonaba
+@callback(
+    [Output('response-status', 'children'),
+     Output('response-word', 'value')],
+    [Input('submit-response', 'n_clicks'),
+     Input('response-word', 'n_submit')],
+    [State('response-word', 'value'),
+     State('participant-id', 'value'),
+     State('stimulus-params', 'data')],
+    prevent_initial_call=True
+)
+def submit_response(n_clicks, n_submit, word, participant, stimulus):
+    if not stimulus:
+        return html.Span("Error: Reproduzca un estímulo antes de responder.", className="text-danger"), dash.no_update
+    word = normalize_word(word or '')
+    if not word:
+        return html.Span("Error: Escriba la palabra que percibió.", className="text-danger"), dash.no_update
+    # Solo se encola: el hilo escritor la guarda en el siguiente lote
+    response_log.record(word, stimulus, participant)
+    return html.Span(f"Respuesta registrada: «{word}».", className="text-success"), ""
 
 # Registrar callbacks del lado del cliente para la reproducción de audio
 app.clientside_callback(
@@ -536,15 +1208,19 @@ app.clientside_callback(
         namespace='audio_processor',
         function_name='processAudioWithDelay'
     ),
-    Output('playback-status', 'children'),
+    [Output('playback-status', 'children'),
+     Output('stimulus-params', 'data')],
     [Input('play-button', 'n_clicks')],
     [State('delay-slider', 'value'),
      State('loop-count', 'value'),
-     State('audio-storage-1', 'children'),
-     State('audio-storage-2', 'children'),
+     State({'type': 'audio-storage', 'index': ALL}, 'data'),
      State('track-mode-selector', 'value'),
-     State('speed-slider-1', 'value'),
-     State('speed-slider-2', 'value')]
+     State({'type': 'speed-slider', 'index': ALL}, 'value'),
+     State('streaming-mode', 'value'),
+     State({'type': 'pan-slider', 'index': ALL}, 'value'),
+     State({'type': 'track-delay-slider', 'index': ALL}, 'value'),
+     State('track-count', 'value'),
+     State('preserve-pitch', 'value')]
 )
 
 app.clientside_callback(
@@ -557,6 +1233,21 @@ app.clientside_callback(
     prevent_initial_call=True
 )
 
+# Aplicar los cambios de retraso, velocidad y panorama a la reproducción en curso, sin reiniciarla
+app.clientside_callback(
+    ClientsideFunction(
+        namespace='audio_processor',
+        function_name='updateLiveParams'
+    ),
+    [Output('live-params', 'data'),
+     Output('stimulus-params', 'data', allow_duplicate=True)],
+    [Input('delay-slider', 'drag_value'),
+     Input({'type': 'speed-slider', 'index': ALL}, 'drag_value'),
+     Input({'type': 'pan-slider', 'index': ALL}, 'drag_value'),
+     Input({'type': 'track-delay-slider', 'index': ALL}, 'drag_value')],
+    prevent_initial_call=True
+)
+
 # Ejecutar la aplicación
 if __name__ == "__main__":
     app.run_server(debug=True)
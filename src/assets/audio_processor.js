@@ -2,270 +2,818 @@
  * Audio processor for Phantom Words effect
  * This file contains the client-side JavaScript code for processing audio
  * with a delay effect to create the phantom words illusion.
- * It supports both single and dual track modes with speed control and random channel assignment.
+ * It supports single, dual and multi-track modes with speed control and random channel assignment.
+ *
+ * Every mode is a list of voices: a voice plays one track through its own
+ * delay line and stereo panner, so single mode is one track panned hard left
+ * and again hard right with the delay, dual mode is two tracks panned to
+ * opposite sides, and multi-track mode spreads up to MAX_TRACKS tracks across
+ * the stereo field with per-track delay, speed and pan. All voices are mixed
+ * in one graph, so the cost grows linearly with the number of tracks.
+ *
+ * One AudioContext is created on the first play and reused afterwards
+ * (suspended on stop, resumed on play). Decoded AudioBuffers are kept in a
+ * bounded LRU keyed by the content id of each track. The delay/panner
+ * chains are rebuilt on each play and disconnected on stop, so a delay line
+ * never replays the tail of the previous stimulus when the context resumes.
+ *
+ * Sources are stopped with stop(when) on the audio clock, so the loop count
+ * is sample accurate. While audio plays, the delay, speed and pan sliders drive
+ * the delayTime, playbackRate and pan AudioParams with short smoothed ramps, and
+ * the stop time is recomputed from the position each source has reached.
+ *
+ * With "preserve pitch" on, speed changes do not use playbackRate (which also
+ * shifts the pitch): the server time-stretches each track once per speed with
+ * a phase vocoder and the voice plays that variant at rate 1. A live speed
+ * change fetches the variant for the new speed (usually already cached) and
+ * switches to it at the position the voice has reached.
+ *
+ * Each play publishes the parameters of the stimulus (track mode, tracks,
+ * delay, loops, speeds and the per-voice channel assignment, including the
+ * random one of dual mode) to the stimulus-params store, so the responses of
+ * the participants can be logged with the stimulus they heard. Live slider
+ * changes update that description too.
+ *
+ * In streaming mode tracks are not decoded whole: the server splits them into
+ * fixed-length PCM segments and a look-ahead scheduler fetches each segment
+ * and starts it on the audio clock just before it is due, so memory stays
+ * bounded by a few segments however long the recording is. Tracks the server
+ * cannot decode (415) fall back to a whole-file decodeAudioData.
  */
 
+// Upper bound for the decoded audio kept in memory (float32 samples)
+const BUFFER_CACHE_MAX_BYTES = 256 * 1024 * 1024;
+
+// Longest delay the graph supports, in seconds (the slider goes up to 500 ms)
+const MAX_DELAY_SECONDS = 1.0;
+
+// Time constant of the ramps applied to live parameter changes, in seconds
+const PARAM_RAMP_SECONDS = 0.02;
+
+// Streaming mode: how far ahead segments are started and fetched, and how often the scheduler runs
+const STREAM_LOOKAHEAD_SECONDS = 2.0;
+const STREAM_PREFETCH_SEGMENTS = 2;
+const STREAM_TICK_MS = 250;
+
+// Tracks taking part in multi-track mode (mirrors active_tracks in app.py)
+const MIN_MULTI_TRACKS = 2;
+const MAX_TRACKS = 8;
+const DEFAULT_MULTI_TRACKS = 4;
+
 // Global variables to store audio sources and context
 let audioSources = [];
 let currentAudioContext = null;
+// Delay/panner chains of the current playback, rebuilt on each play
+let playbackGraph = {chains: []};
 let isPlaying = false;
 
-// Function to stop all audio playback
-function stopAudioPlayback() {
-    if (audioSources.length > 0) {
-        audioSources.forEach(source => {
-            try {
-                source.stop();
-            } catch (e) {
-                // Source might already be stopped
+// State of the playback in progress, used to apply live parameter changes:
+// mode, loops, stop time and its voices. A voice plays one track through one
+// delay/panner chain, either from a whole AudioBuffer or from streamed
+// segments, and keeps its rate and the content position reached at the last
+// rate change (anchorTime / anchorPosition)
+let currentPlayback = null;
+let streamTimer = null;
+
+// Incremented on every play/stop so events from an earlier playback are ignored
+let playbackSession = 0;
+
+// Least-recently-used cache of decoded AudioBuffers.
+// Entries hold the decode promise, so concurrent requests for the same clip share one decode.
+class AudioBufferCache {
+    constructor(maxBytes) {
+        this.maxBytes = maxBytes;
+        this.entries = new Map();
+        this.bytes = 0;
+    }
+
+    get(key, load) {
+        const cached = this.entries.get(key);
+        if (cached) {
+            // Move to the most recently used position
+            this.entries.delete(key);
+            this.entries.set(key, cached);
+            return cached.promise;
+        }
+
+        const entry = {bytes: 0, promise: null};
+        entry.promise = load().then(audioBuffer => {
+            if (this.entries.get(key) === entry) {
+                entry.bytes = audioBuffer.length * audioBuffer.numberOfChannels * 4;
+                this.bytes += entry.bytes;
+                this.evict(key);
+            }
+            return audioBuffer;
+        }, error => {
+            // Failed decodes are not cached, so the next play retries
+            if (this.entries.get(key) === entry) {
+                this.entries.delete(key);
             }
+            throw error;
         });
-        audioSources = [];
+        this.entries.set(key, entry);
+        return entry.promise;
     }
 
-    if (currentAudioContext) {
-        currentAudioContext.close().catch(err => console.error('Error closing audio context:', err));
-        currentAudioContext = null;
+    evict(keepKey) {
+        for (const [key, entry] of this.entries) {
+            if (this.bytes <= this.maxBytes) {
+                break;
+            }
+            if (key !== keepKey) {
+                this.entries.delete(key);
+                this.bytes -= entry.bytes;
+            }
+        }
     }
+}
 
-    isPlaying = false;
+const audioBufferCache = new AudioBufferCache(BUFFER_CACHE_MAX_BYTES);
 
-    return "Reproducción de audio detenida.";
+// Return the shared AudioContext, creating it on first use
+function getAudioContext() {
+    if (!currentAudioContext) {
+        const AudioContext = window.AudioContext || window.webkitAudioContext;
+        currentAudioContext = new AudioContext();
+    }
+    return currentAudioContext;
 }
 
-// Function to process audio with delay effect
-function processAudioWithDelay(n_clicks, delayStr, loopsStr, audioData1Str, audioData2Str, trackMode, speed1Str, speed2Str) {
-    // Add debugging logs
-    console.log('processAudioWithDelay called with n_clicks:', n_clicks);
-    console.log('Parameters:', {
-        delayStr, loopsStr, audioData1Str: audioData1Str ? 'data present' : null,
-        audioData2Str: audioData2Str ? 'data present' : null, trackMode, speed1Str, speed2Str
-    });
+// Chain of voice i: delay line -> stereo panner -> destination.
+// The delay line downmixes its input to mono, so a stereo file is panned as
+// a single source, like the mono tracks the server renders.
+function getVoiceChain(audioContext, i) {
+    const chains = playbackGraph.chains;
+    while (chains.length <= i) {
+        const delayNode = audioContext.createDelay(MAX_DELAY_SECONDS);
+        delayNode.channelCount = 1;
+        delayNode.channelCountMode = 'explicit';
+        const panner = audioContext.createStereoPanner();
+        delayNode.connect(panner);
+        panner.connect(audioContext.destination);
+        chains.push({delay: delayNode, panner: panner});
+    }
+    return chains[i];
+}
 
-    if (!n_clicks) {
-        console.log('Returning early: n_clicks is falsy');
-        return "Listo para reproducir audio.";
+// Track numbers (from 1) used by a track mode
+function activeTracks(trackMode, trackCount) {
+    if (trackMode === 'single') {
+        return [1];
+    }
+    if (trackMode === 'multi') {
+        const count = Math.min(Math.max(parseInt(trackCount) || DEFAULT_MULTI_TRACKS, MIN_MULTI_TRACKS), MAX_TRACKS);
+        return Array.from({length: count}, (_, i) => i + 1);
     }
+    return [1, 2];
+}
 
-    // Check if we have the necessary data to play audio
-    if (!delayStr || !loopsStr || !audioData1Str || !trackMode || !speed1Str) {
-        console.log('Returning early: missing required parameters');
-        return "Error: Faltan parámetros requeridos. Por favor asegúrese de que todas las configuraciones estén completas.";
+// Voices of a track mode: {track, speed, delay (s), pan, liveDelay, livePan}.
+// liveDelay names the slider that drives the voice delay while playing
+// ('shared', 'track' or null); livePan says whether its pan slider does.
+function buildVoiceSpecs(trackMode, tracks, delay, speeds, pans, trackDelays) {
+    if (trackMode === 'single') {
+        // Left channel without delay, right channel delayed
+        return [
+            {track: 1, speed: speeds[0], delay: 0, pan: -1, liveDelay: null, livePan: false},
+            {track: 1, speed: speeds[0], delay: delay, pan: 1, liveDelay: 'shared', livePan: false},
+        ];
     }
-    if (trackMode === 'dual' && (!audioData2Str || !speed2Str)) {
-        console.log('Returning early: dual track mode but missing track 2 data');
-        return "Error: Modo de pistas duales seleccionado pero falta la Pista 2. Por favor suba un segundo archivo de audio.";
+    if (trackMode === 'dual') {
+        // Force a new random channel assignment each time
+        // true = track1 on left, track2 on right; false = track1 on right, track2 on left
+        const randomizeChannels = Math.random() >= 0.5;
+        console.log(`Channel assignment: Track 1 on ${randomizeChannels ? 'left' : 'right'}, Track 2 on ${randomizeChannels ? 'right' : 'left'}`);
+        // Both tracks delayed, each on the channel given by the random assignment
+        const pan1 = randomizeChannels ? -1 : 1;
+        return [
+            {track: 1, speed: speeds[0], delay: delay, pan: pan1, liveDelay: 'shared', livePan: false},
+            {track: 2, speed: speeds[1], delay: delay, pan: -pan1, liveDelay: 'shared', livePan: false},
+        ];
+    }
+    return tracks.map(track => ({
+        track: track,
+        speed: speeds[track - 1],
+        delay: trackDelays[track - 1] / 1000,
+        pan: pans[track - 1],
+        liveDelay: 'track',
+        livePan: true
+    }));
+}
+
+// Parameters of the stimulus as played, for the stimulus-params store.
+// swap_channels follows the renderer: true when dual mode put track 1 on the right.
+function describeStimulus(stimulus) {
+    const specs = stimulus.specs;
+    return {
+        track_mode: stimulus.mode,
+        tracks: stimulus.trackIds,
+        delay_ms: stimulus.delayMs,
+        loops: stimulus.loops,
+        speeds: stimulus.tracks.map(track => specs.find(spec => spec.track === track).speed),
+        preserve_pitch: stimulus.preservePitch,
+        streaming: stimulus.streaming,
+        swap_channels: stimulus.mode === 'dual' ? specs[0].pan > 0 : null,
+        voices: specs.map(spec => ({
+            track: spec.track,
+            speed: spec.speed,
+            delay_ms: Math.round(spec.delay * 1000),
+            pan: spec.pan
+        })),
+        live_changes: stimulus.liveChanges,
+        started_at: stimulus.startedAt
+    };
+}
+
+// Read a slider value that may be missing (null or undefined) as a number or null
+function sliderValue(values, i) {
+    const value = Array.isArray(values) ? values[i] : values;
+    return value === undefined || value === null ? null : Number(value);
+}
+
+// Decode (or fetch from the cache) the AudioBuffer of a stored track.
+// Library clips come as raw int16 PCM and skip decodeAudioData entirely;
+// uploaded files are fetched by URL and decoded by the browser.
+function loadAudioBuffer(audioContext, audioData) {
+    const key = (audioData.pcm ? 'pcm:' : 'file:') + (audioData.id || audioData.url);
+    return audioBufferCache.get(key, () => decodeAudio(audioContext, audioData));
+}
+
+function decodeAudio(audioContext, audioData) {
+    if (audioData.pcm) {
+        const pcm = audioData.pcm;
+        return fetch(pcm.url)
+            .then(response => response.arrayBuffer())
+            .then(arrayBuffer => pcmToAudioBuffer(audioContext, arrayBuffer, pcm.channels, pcm.sample_rate));
     }
+    return fetch(audioData.url)
+        .then(response => response.arrayBuffer())
+        .then(arrayBuffer => audioContext.decodeAudioData(arrayBuffer));
+}
+
+// Build an AudioBuffer from interleaved int16 PCM
+function pcmToAudioBuffer(audioContext, arrayBuffer, channels, sampleRate) {
+    const samples = new Int16Array(arrayBuffer);
+    const audioBuffer = audioContext.createBuffer(channels, samples.length / channels, sampleRate);
+    for (let channel = 0; channel < channels; channel++) {
+        const data = audioBuffer.getChannelData(channel);
+        for (let i = 0; i < data.length; i++) {
+            data[i] = samples[i * channels + channel] / 32768;
+        }
+    }
+    return audioBuffer;
+}
+
+// Pitch-preserving variant of a stored track at one speed, rendered by the server
+function loadStretchedBuffer(audioContext, audioData, speed) {
+    const key = `stretch:${audioData.id}:${speed.toFixed(2)}`;
+    return audioBufferCache.get(key, () => fetch(`/audio/${audioData.id}/stretch/${speed.toFixed(2)}.pcm`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Time-stretched audio unavailable (${response.status})`);
+            }
+            const sampleRate = parseInt(response.headers.get('X-Sample-Rate'));
+            return response.arrayBuffer().then(arrayBuffer => pcmToAudioBuffer(audioContext, arrayBuffer, 1, sampleRate));
+        }));
+}
+
+// Buffer a pitch-preserving voice plays at a speed (the original one at 1x)
+function loadVariant(audioContext, audioData, speed) {
+    return speed === 1 ? loadAudioBuffer(audioContext, audioData) : loadStretchedBuffer(audioContext, audioData, speed);
+}
+
+// Segment index of a stored track (small JSON, cached by the browser),
+// or null if the server cannot decode the track (415, e.g. M4A)
+function loadSegmentIndex(audioData) {
+    return fetch(`/audio/${audioData.id}/segments.json`).then(response => {
+        if (response.status === 415) {
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error(`Segment index unavailable (${response.status})`);
+        }
+        return response.json();
+    });
+}
 
-    // Stop any currently playing audio
-    stopAudioPlayback();
+// Disconnect the voice chains. A delay line still holds the last
+// MAX_DELAY_SECONDS of its input, which would play when the context resumes,
+// so each playback gets fresh chains.
+function releaseVoiceChains() {
+    playbackGraph.chains.forEach(chain => {
+        chain.delay.disconnect();
+        chain.panner.disconnect();
+    });
+    playbackGraph.chains = [];
+}
 
-    // Reset audio sources array
+// Stop and detach the current source nodes and their voice chains
+function releaseSources() {
+    if (streamTimer !== null) {
+        clearInterval(streamTimer);
+        streamTimer = null;
+    }
+    audioSources.forEach(source => {
+        source.onended = null;
+        try {
+            source.stop();
+        } catch (e) {
+            // Source might already be stopped
+        }
+        source.disconnect();
+    });
     audioSources = [];
+    releaseVoiceChains();
+    currentPlayback = null;
+}
 
-    const delay = parseInt(delayStr);
-    const loops = parseInt(loopsStr);
-    const speed1 = parseFloat(speed1Str);
-    const speed2 = parseFloat(speed2Str || "1.0");
-    const audioData1 = JSON.parse(audioData1Str);
-    let audioData2 = null;
+// Function to stop all audio playback
+function stopAudioPlayback() {
+    playbackSession++;
+    releaseSources();
 
-    if (trackMode === 'dual' && audioData2Str) {
-        audioData2 = JSON.parse(audioData2Str);
+    // Keep the context (and its decoded buffers) for the next play
+    if (currentAudioContext && currentAudioContext.state === 'running') {
+        currentAudioContext.suspend().catch(err => console.error('Error suspending audio context:', err));
     }
 
-    // Create audio context
-    const AudioContext = window.AudioContext || window.webkitAudioContext;
-    const audioContext = new AudioContext();
-    currentAudioContext = audioContext;
+    isPlaying = false;
 
-    // Set playing state to true
-    isPlaying = true;
+    return "Reproducción de audio detenida.";
+}
 
-    // Force a new random channel assignment each time
-    // true = track1 on left, track2 on right; false = track1 on right, track2 on left
-    const randomizeChannels = Math.random() >= 0.5;
+// Create a source for a buffer and connect it to one delay line of the graph
+function createSource(audioContext, audioBuffer, speed, loop, delayNode) {
+    const source = audioContext.createBufferSource();
+    source.buffer = audioBuffer;
+    source.playbackRate.value = speed;
+    source.loop = loop;
+    if (loop) {
+        source.loopEnd = audioBuffer.duration;
+    }
+    source.connect(delayNode);
+    audioSources.push(source);
+    return source;
+}
 
-    if (trackMode === 'single') {
-        // Single track mode
-        fetch(audioData1.content)
+function forgetSource(source) {
+    source.disconnect();
+    audioSources = audioSources.filter(other => other !== source);
+}
+
+// Audio-clock time at which a voice reaches a content position at its current rate
+function wallTime(voice, position) {
+    return voice.anchorTime + (position - voice.anchorPosition) / voice.rate;
+}
+
+// Voice that plays a whole decoded buffer, looping it if needed
+function bufferVoice(audioContext, track, audioBuffer, speed, loops, delayNode, startTime) {
+    return {
+        track: track,
+        duration: audioBuffer.duration,
+        rate: speed,
+        anchorTime: startTime,
+        anchorPosition: 0,
+        source: createSource(audioContext, audioBuffer, speed, loops > 1, delayNode)
+    };
+}
+
+// Voice that plays a pitch-preserving variant, which already lasts duration / speed.
+// The source runs at rate 1, but the voice keeps the original duration and the
+// speed as its rate, so stop times are computed as for the other voices.
+function stretchedVoice(audioContext, track, audioData, audioBuffer, speed, loops, delayNode, startTime) {
+    return {
+        track: track,
+        duration: audioBuffer.duration * speed,
+        rate: speed,
+        anchorTime: startTime,
+        anchorPosition: 0,
+        stretch: {audioData: audioData, speed: speed},
+        source: createSource(audioContext, audioBuffer, 1, loops > 1, delayNode)
+    };
+}
+
+// Voice that plays a track from streamed segments
+function streamVoice(track, audioData, index, speed, delayNode, startTime) {
+    return {
+        track: track,
+        duration: index.duration,
+        rate: speed,
+        anchorTime: startTime,
+        anchorPosition: 0,
+        stream: {
+            audioData: audioData,
+            index: index,
+            delayNode: delayNode,
+            segmentDuration: index.segment_frames / index.sample_rate,
+            nextSegment: 0,
+            fetches: new Map(),
+            ready: new Map(),
+            scheduled: []
+        }
+    };
+}
+
+// Content position where segment k starts; k keeps counting across loops
+function segmentStart(voice, k) {
+    const stream = voice.stream;
+    const pass = Math.floor(k / stream.index.segments);
+    return pass * voice.duration + (k % stream.index.segments) * stream.segmentDuration;
+}
+
+// Fetch the next segments of a stream voice that are not loaded yet
+function prefetchSegments(audioContext, voice, session) {
+    const stream = voice.stream;
+    for (let k = stream.nextSegment; k < stream.nextSegment + STREAM_PREFETCH_SEGMENTS; k++) {
+        const segment = k % stream.index.segments;
+        if (stream.ready.has(segment) || stream.fetches.has(segment)) {
+            continue;
+        }
+        const url = stream.index.url.replace('{index}', segment);
+        const request = fetch(url)
             .then(response => response.arrayBuffer())
-            .then(arrayBuffer => audioContext.decodeAudioData(arrayBuffer))
-            .then(audioBuffer => {
-                // Create two audio sources (left and right)
-                const sourceLeft = audioContext.createBufferSource();
-                const sourceRight = audioContext.createBufferSource();
-
-                // Add sources to global array for stop functionality
-                audioSources.push(sourceLeft, sourceRight);
-
-                sourceLeft.buffer = audioBuffer;
-                sourceRight.buffer = audioBuffer;
-
-                // Set playback speed
-                sourceLeft.playbackRate.value = speed1;
-                sourceRight.playbackRate.value = speed1;
-
-                // Set loop count
-                sourceLeft.loop = loops > 1;
-                sourceRight.loop = loops > 1;
-
-                if (loops > 1) {
-                    sourceLeft.loopEnd = audioBuffer.duration;
-                    sourceRight.loopEnd = audioBuffer.duration;
-
-                    // Stop after specified number of loops
-                    setTimeout(() => {
-                        try {
-                            sourceLeft.stop();
-                            sourceRight.stop();
-                        } catch (e) {
-                            // Sources might already be stopped
-                        }
-
-                        // Set playing state to false
-                        isPlaying = false;
-                    }, (audioBuffer.duration / speed1) * loops * 1000);
-                } else {
-                    // For single play, set timeout based on audio duration
-                    setTimeout(() => {
-                        isPlaying = false;
-                    }, (audioBuffer.duration / speed1) * 1000);
+            .then(arrayBuffer => {
+                if (session === playbackSession) {
+                    stream.ready.set(segment, pcmToAudioBuffer(audioContext, arrayBuffer, 1, stream.index.sample_rate));
                 }
+            })
+            .catch(error => console.error('Error loading audio segment:', error))
+            .finally(() => stream.fetches.delete(segment));
+        stream.fetches.set(segment, request);
+    }
+}
 
-                // Create channel merger for stereo output
-                const merger = audioContext.createChannelMerger(2);
+// Start every loaded segment that is due within the look-ahead window
+function scheduleSegments(audioContext, playback, voice, now) {
+    const stream = voice.stream;
+    while (true) {
+        const k = stream.nextSegment;
+        const position = segmentStart(voice, k);
+        const startTime = wallTime(voice, position);
+        const segment = k % stream.index.segments;
+        const audioBuffer = stream.ready.get(segment);
+        if (startTime >= playback.stopTime || startTime - now > STREAM_LOOKAHEAD_SECONDS || !audioBuffer) {
+            return;
+        }
+        stream.ready.delete(segment);
+
+        const source = createSource(audioContext, audioBuffer, voice.rate, false, stream.delayNode);
+        const entry = {source: source, segment: k, buffer: audioBuffer, position: position, startTime: startTime};
+        source.onended = () => {
+            forgetSource(source);
+            stream.scheduled = stream.scheduled.filter(other => other !== entry);
+        };
+        if (startTime >= now) {
+            source.start(startTime);
+        } else {
+            // The segment arrived late: start now from the point it should have reached
+            source.start(now, Math.min((now - startTime) * voice.rate, audioBuffer.duration));
+        }
+        source.stop(playback.stopTime);
+        stream.scheduled.push(entry);
+        stream.nextSegment = k + 1;
+    }
+}
 
-                // Create delay node
-                const delayNode = audioContext.createDelay();
-                delayNode.delayTime.value = delay / 1000; // Convert ms to seconds
+// Voices of a playback that play streamed segments
+function streamVoices(playback) {
+    return playback.voices.filter(voice => voice.stream);
+}
 
-                // Connect nodes for left channel (no delay)
-                sourceLeft.connect(merger, 0, 0); // Connect to left channel
+// One pass of the streaming scheduler
+function streamTick(audioContext, playback, session) {
+    if (session !== playbackSession) {
+        return;
+    }
+    const now = audioContext.currentTime;
+    if (now >= playback.stopTime) {
+        clearInterval(streamTimer);
+        streamTimer = null;
+        isPlaying = false;
+        currentPlayback = null;
+        return;
+    }
+    streamVoices(playback).forEach(voice => {
+        scheduleSegments(audioContext, playback, voice, now);
+        prefetchSegments(audioContext, voice, session);
+    });
+}
 
-                // Connect nodes for right channel (with delay)
-                sourceRight.connect(delayNode);
-                delayNode.connect(merger, 0, 1); // Connect to right channel
+// Change the rate of a voice from now on
+function setVoiceRate(voice, speed, now) {
+    voice.anchorPosition += (now - voice.anchorTime) * voice.rate;
+    voice.anchorTime = now;
+    voice.rate = speed;
 
-                // Connect merger to output
-                merger.connect(audioContext.destination);
+    if (!voice.stream) {
+        voice.source.playbackRate.setTargetAtTime(speed, now, PARAM_RAMP_SECONDS);
+        return;
+    }
 
-                // Start playback
-                sourceLeft.start();
-                sourceRight.start();
-            })
-            .catch(error => {
-                console.error('Error processing audio:', error);
+    // Segments already playing ramp to the new rate; those still waiting are
+    // unscheduled and started again at the time the new rate gives them
+    const stream = voice.stream;
+    stream.scheduled = stream.scheduled.filter(entry => {
+        if (entry.startTime <= now) {
+            entry.source.playbackRate.setTargetAtTime(speed, now, PARAM_RAMP_SECONDS);
+            return true;
+        }
+        entry.source.onended = null;
+        entry.source.stop();
+        forgetSource(entry.source);
+        stream.ready.set(entry.segment % stream.index.segments, entry.buffer);
+        stream.nextSegment = Math.min(stream.nextSegment, entry.segment);
+        return false;
+    });
+}
+
+// Switch a pitch-preserving voice to the variant for a new speed, at the
+// position it has reached once that variant is loaded
+function switchStretchedVoice(audioContext, playback, voice, speed) {
+    voice.stretch.speed = speed;
+    loadVariant(audioContext, voice.stretch.audioData, speed)
+        .then(audioBuffer => {
+            // A newer speed, play or stop happened while loading
+            const now = audioContext.currentTime;
+            if (currentPlayback !== playback || voice.stretch.speed !== speed || now >= playback.stopTime) {
+                return;
+            }
+            voice.anchorPosition += (now - voice.anchorTime) * voice.rate;
+            voice.anchorTime = now;
+            voice.rate = speed;
+
+            const previous = voice.source;
+            previous.onended = null;
+            previous.stop(now);
+            forgetSource(previous);
+            voice.source = createSource(audioContext, audioBuffer, 1, playback.loops > 1, voice.chain.delay);
+            voice.source.start(now, (voice.anchorPosition % voice.duration) / speed);
+            watchEnd(playbackSession, playback.voices.map(other => other.source));
+            scheduleStop(playback, now);
+        })
+        .catch(error => console.error('Error loading time-stretched audio:', error));
+}
+
+// Schedule the end of the playback on the audio clock.
+// The stimulus lasts as long as the slowest track takes to play all its loops;
+// every source stops at that instant, whatever the speeds are by then.
+function scheduleStop(playback, now) {
+    let remaining = 0;
+    playback.voices.forEach(voice => {
+        const position = voice.anchorPosition + (now - voice.anchorTime) * voice.rate;
+        const left = (voice.duration * playback.loops - position) / voice.rate;
+        remaining = Math.max(remaining, left);
+    });
+    playback.stopTime = now + Math.max(remaining, 0);
+
+    playback.voices.forEach(voice => {
+        const sources = voice.stream ? voice.stream.scheduled.map(entry => entry.source) : [voice.source];
+        sources.forEach(source => {
+            try {
+                source.stop(playback.stopTime);
+            } catch (e) {
+                // Source already ended
+            }
+        });
+    });
+}
+
+// Mark playback as finished when the last source ends
+function watchEnd(session, sources) {
+    let active = sources.length;
+    sources.forEach(source => {
+        source.onended = () => {
+            active--;
+            if (active === 0 && session === playbackSession) {
                 isPlaying = false;
-                return "Error al procesar el audio. Por favor verifique su archivo de audio e intente nuevamente.";
-            });
-    } else {
-        // Dual track mode
-        console.log(`Channel assignment: Track 1 on ${randomizeChannels ? 'left' : 'right'}, Track 2 on ${randomizeChannels ? 'right' : 'left'}`);
+                currentPlayback = null;
+            }
+        };
+    });
+}
 
-        Promise.all([
-            // Fetch and decode the first audio file
-            fetch(audioData1.content)
-                .then(response => response.arrayBuffer())
-                .then(arrayBuffer => audioContext.decodeAudioData(arrayBuffer)),
-
-            // Fetch and decode the second audio file
-            fetch(audioData2.content)
-                .then(response => response.arrayBuffer())
-                .then(arrayBuffer => audioContext.decodeAudioData(arrayBuffer))
-        ])
-        .then(([audioBuffer1, audioBuffer2]) => {
-            // Create audio sources for both tracks
-            const source1 = audioContext.createBufferSource();
-            const source2 = audioContext.createBufferSource();
-
-            // Add sources to global array for stop functionality
-            audioSources.push(source1, source2);
-
-            source1.buffer = audioBuffer1;
-            source2.buffer = audioBuffer2;
-
-            // Set playback speed
-            source1.playbackRate.value = speed1;
-            source2.playbackRate.value = speed2;
-
-            // Set loop count
-            source1.loop = loops > 1;
-            source2.loop = loops > 1;
-
-            // Find the duration for timeout
-            const duration1 = audioBuffer1.duration / speed1;
-            const duration2 = audioBuffer2.duration / speed2;
-            const maxDuration = Math.max(duration1, duration2);
-
-            if (loops > 1) {
-                source1.loopEnd = audioBuffer1.duration;
-                source2.loopEnd = audioBuffer2.duration;
-
-                // Stop after specified number of loops
-                setTimeout(() => {
-                    try {
-                        source1.stop();
-                        source2.stop();
-                    } catch (e) {
-                        // Sources might already be stopped
-                    }
+// Apply slider changes to the playback in progress without restarting it.
+// Speeds, pans and track delays come as one value per track card.
+// Returns the applied values and the updated stimulus description.
+function updateLiveParams(delayValue, speedValues, panValues, trackDelayValues) {
+    const params = {
+        delay: sliderValue(delayValue),
+        speeds: (speedValues || []).map((_, i) => sliderValue(speedValues, i)),
+        pans: (panValues || []).map((_, i) => sliderValue(panValues, i)),
+        trackDelays: (trackDelayValues || []).map((_, i) => sliderValue(trackDelayValues, i)),
+        applied: false
+    };
+    const playback = currentPlayback;
+    if (!playback || !currentAudioContext) {
+        return [params, window.dash_clientside.no_update];
+    }
 
-                    // Set playing state to false
-                    isPlaying = false;
-                }, maxDuration * loops * 1000);
-            } else {
-                // For single play, set timeout based on audio duration
-                setTimeout(() => {
-                    isPlaying = false;
-                }, maxDuration * 1000);
+    const now = currentAudioContext.currentTime;
+    const stimulus = playback.stimulus;
+    let speedChanged = false;
+    let changed = false;
+    playback.voices.forEach(voice => {
+        const i = voice.track - 1;
+        const spec = voice.spec;
+        const delay = voice.liveDelay === 'shared' ? params.delay
+            : voice.liveDelay === 'track' ? sliderValue(params.trackDelays, i) : null;
+        if (delay !== null) {
+            voice.chain.delay.delayTime.setTargetAtTime(delay / 1000, now, PARAM_RAMP_SECONDS);
+            changed = changed || Math.round(spec.delay * 1000) !== delay;
+            spec.delay = delay / 1000;
+            if (voice.liveDelay === 'shared') {
+                stimulus.delayMs = delay;
             }
+        }
+        const pan = voice.livePan ? sliderValue(params.pans, i) : null;
+        if (pan !== null) {
+            voice.chain.panner.pan.setTargetAtTime(pan, now, PARAM_RAMP_SECONDS);
+            changed = changed || spec.pan !== pan;
+            spec.pan = pan;
+        }
+
+        const speed = sliderValue(params.speeds, i);
+        if (speed === null || !(speed > 0) || speed === (voice.stretch ? voice.stretch.speed : voice.rate)) {
+            return;
+        }
+        spec.speed = speed;
+        changed = true;
+        if (voice.stretch) {
+            // The new variant replaces the source once loaded, and reschedules the stop itself
+            switchStretchedVoice(currentAudioContext, playback, voice, speed);
+            return;
+        }
+        setVoiceRate(voice, speed, now);
+        speedChanged = true;
+    });
+    if (speedChanged) {
+        scheduleStop(playback, now);
+        if (playback.streaming) {
+            streamVoices(playback).forEach(voice => scheduleSegments(currentAudioContext, playback, voice, now));
+        }
+    }
 
-            // Create channel merger for stereo output
-            const merger = audioContext.createChannelMerger(2);
+    params.applied = true;
+    if (!changed) {
+        return [params, window.dash_clientside.no_update];
+    }
+    stimulus.liveChanges++;
+    return [params, describeStimulus(stimulus)];
+}
 
-            // Create delay nodes for both tracks
-            const delayNode1 = audioContext.createDelay();
-            const delayNode2 = audioContext.createDelay();
-            delayNode1.delayTime.value = delay / 1000; // Convert ms to seconds
-            delayNode2.delayTime.value = delay / 1000; // Convert ms to seconds
+// Function to process audio with delay effect.
+// audioDataList, speeds, pans and trackDelays hold one value per track card.
+function processAudioWithDelay(n_clicks, delayStr, loopsStr, audioDataList, trackMode, speeds, streaming, pans, trackDelays, trackCount, preservePitch) {
+    const tracks = activeTracks(trackMode, trackCount);
+    audioDataList = audioDataList || [];
 
-            // Connect nodes based on random channel assignment
-            if (randomizeChannels) {
-                // Track 1 to left channel (with delay)
-                source1.connect(delayNode1);
-                delayNode1.connect(merger, 0, 0); // Connect to left channel
+    // Add debugging logs
+    console.log('processAudioWithDelay called with n_clicks:', n_clicks);
+    console.log('Parameters:', {
+        delayStr, loopsStr, trackMode, tracks, speeds, pans, trackDelays, streaming, preservePitch,
+        audioData: tracks.map(track => audioDataList[track - 1] ? audioDataList[track - 1].url : null)
+    });
 
-                // Track 2 to right channel (with delay)
-                source2.connect(delayNode2);
-                delayNode2.connect(merger, 0, 1); // Connect to right channel
-            } else {
-                // Track 2 to left channel (with delay)
-                source2.connect(delayNode1);
-                delayNode1.connect(merger, 0, 0); // Connect to left channel
+    if (!n_clicks) {
+        console.log('Returning early: n_clicks is falsy');
+        return ["Listo para reproducir audio.", window.dash_clientside.no_update];
+    }
 
-                // Track 1 to right channel (with delay)
-                source1.connect(delayNode2);
-                delayNode2.connect(merger, 0, 1); // Connect to right channel
-            }
+    // Check if we have the necessary data to play audio
+    if (!delayStr || !loopsStr || !audioDataList[0] || !trackMode || !speeds || !speeds[0]) {
+        console.log('Returning early: missing required parameters');
+        return ["Error: Faltan parámetros requeridos. Por favor asegúrese de que todas las configuraciones estén completas.", window.dash_clientside.no_update];
+    }
+    const missing = tracks.filter(track => !audioDataList[track - 1] || !speeds[track - 1]);
+    if (trackMode === 'dual' && missing.length) {
+        console.log('Returning early: dual track mode but missing track 2 data');
+        return ["Error: Modo de pistas duales seleccionado pero falta la Pista 2. Por favor suba un segundo archivo de audio.", window.dash_clientside.no_update];
+    }
+    if (missing.length) {
+        console.log('Returning early: multi-track mode but missing tracks', missing);
+        return [
+            `Error: Modo multipista seleccionado pero faltan pistas (${missing.map(track => `Pista ${track}`).join(', ')}). Por favor súbalas o elíjalas de la biblioteca.`,
+            window.dash_clientside.no_update
+        ];
+    }
+
+    // Stop any currently playing audio, keeping the context
+    playbackSession++;
+    releaseSources();
+    const session = playbackSession;
+
+    const delay = parseInt(delayStr) / 1000; // Convert ms to seconds
+    const loops = parseInt(loopsStr);
+    const voiceSpecs = buildVoiceSpecs(
+        trackMode, tracks, delay,
+        speeds.map(speed => parseFloat(speed || "1.0")),
+        (pans || []).map(pan => parseFloat(pan || 0)),
+        (trackDelays || []).map(trackDelay => parseInt(trackDelay || 0)));
 
-            // Connect merger to output
-            merger.connect(audioContext.destination);
+    // Reuse the audio context; it is suspended while nothing plays
+    const audioContext = getAudioContext();
+    const resumed = audioContext.resume();
+
+    // Set playing state to true
+    isPlaying = true;
+
+    // Point each voice chain at the delay and position of its voice
+    voiceSpecs.forEach((spec, i) => {
+        spec.chain = getVoiceChain(audioContext, i);
+        spec.chain.delay.delayTime.value = spec.delay;
+        spec.chain.panner.pan.value = spec.pan;
+    });
 
-            // Start playback
-            source1.start();
-            source2.start();
+    // Whole buffers come from the decoded cache; streams only need their segment index.
+    // Pitch preservation applies to whole buffers: streamed segments keep playbackRate.
+    const stretch = Boolean(preservePitch) && !streaming;
+
+    // Description of the stimulus, kept up to date by live changes
+    const stimulus = {
+        mode: trackMode,
+        tracks: tracks,
+        trackIds: tracks.map(track => audioDataList[track - 1].id),
+        delayMs: parseInt(delayStr),
+        loops: loops,
+        preservePitch: stretch,
+        streaming: Boolean(streaming),
+        specs: voiceSpecs,
+        liveChanges: 0,
+        startedAt: new Date().toISOString()
+    };
+    // A track the server cannot split into segments is decoded whole by the browser
+    const load = streaming
+        ? spec => loadSegmentIndex(audioDataList[spec.track - 1])
+            .then(index => index || loadAudioBuffer(audioContext, audioDataList[spec.track - 1]))
+        : stretch
+            ? spec => loadVariant(audioContext, audioDataList[spec.track - 1], spec.speed)
+            : spec => loadAudioBuffer(audioContext, audioDataList[spec.track - 1]);
+
+    Promise.all([...voiceSpecs.map(load), resumed])
+        .then(loaded => {
+            // A newer play or a stop happened while loading
+            if (session !== playbackSession) {
+                return;
+            }
+
+            // Start all voices on the same audio-clock instant
+            const startTime = audioContext.currentTime;
+            const playback = {
+                mode: trackMode,
+                loops: loops,
+                streaming: Boolean(streaming),
+                stopTime: Infinity,
+                stimulus: stimulus,
+                voices: voiceSpecs.map((spec, i) => {
+                    const audioData = audioDataList[spec.track - 1];
+                    const streamed = streaming && loaded[i].segment_frames !== undefined;
+                    const voice = streamed
+                        ? streamVoice(spec.track, audioData, loaded[i], spec.speed, spec.chain.delay, startTime)
+                        : stretch
+                            ? stretchedVoice(audioContext, spec.track, audioData, loaded[i], spec.speed, loops, spec.chain.delay, startTime)
+                            : bufferVoice(audioContext, spec.track, loaded[i], spec.speed, loops, spec.chain.delay, startTime);
+                    voice.chain = spec.chain;
+                    voice.spec = spec;
+                    voice.liveDelay = spec.liveDelay;
+                    voice.livePan = spec.livePan;
+                    return voice;
+                })
+            };
+            currentPlayback = playback;
+
+            if (streaming) {
+                // Give the first segments a moment to arrive before they are due;
+                // whole-buffer fallback voices start at the same instant
+                playback.voices.forEach(voice => {
+                    voice.anchorTime += STREAM_TICK_MS / 1000;
+                    if (!voice.stream) {
+                        voice.source.start(voice.anchorTime);
+                    }
+                });
+                scheduleStop(playback, startTime);
+                streamVoices(playback).forEach(voice => prefetchSegments(audioContext, voice, session));
+                streamTimer = setInterval(() => streamTick(audioContext, playback, session), STREAM_TICK_MS);
+            } else {
+                const sources = playback.voices.map(voice => voice.source);
+                watchEnd(session, sources);
+                sources.forEach(source => source.start(startTime));
+                scheduleStop(playback, startTime);
+            }
         })
         .catch(error => {
             console.error('Error processing audio:', error);
             isPlaying = false;
-            return "Error al procesar el audio. Por favor verifique sus archivos de audio e intente nuevamente.";
+            return "Error al procesar el audio. Por favor verifique su archivo de audio e intente nuevamente.";
         });
-    }
 
-    return trackMode === 'single' 
-        ? "Reproduciendo pista única con efecto de palabras fantasma..." 
-        : "Reproduciendo pistas duales con efecto de palabras fantasma...";
+    const description = describeStimulus(stimulus);
+    if (trackMode === 'single') {
+        return ["Reproduciendo pista única con efecto de palabras fantasma...", description];
+    }
+    if (trackMode === 'dual') {
+        return ["Reproduciendo pistas duales con efecto de palabras fantasma...", description];
+    }
+    return [`Reproduciendo ${tracks.length} pistas con efecto de palabras fantasma...`, description];
 }
 
 
@@ -274,6 +822,7 @@ window.dash_clientside = window.dash_clientside || {};
 window.dash_clientside.audio_processor = {
     processAudioWithDelay: processAudioWithDelay,
     stopAudioPlayback: stopAudioPlayback,
+    updateLiveParams: updateLiveParams,
     isAudioPlaying: function() {
         return isPlaying;
     }
@@ -0,0 +1,11 @@
+/**
+ * Registers the service worker that keeps the dashboard shell and the audio
+ * in local caches (src/assets/service-worker.js, served from /service-worker.js).
+ * Browsers only allow it on HTTPS or localhost; elsewhere the app works as before.
+ */
+if ('serviceWorker' in navigator && window.isSecureContext) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/service-worker.js', {scope: '/'})
+            .catch(error => console.warn('Service worker registration failed:', error));
+    });
+}
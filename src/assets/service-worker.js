@@ -0,0 +1,262 @@
+/**
+ * Service worker for the Phantom Words dashboard.
+ *
+ * Served from /service-worker.js (see src/offline.py) so its scope is the
+ * whole app; Dash does not load this file as a regular asset (assets_ignore).
+ *
+ * - Shell cache (versioned): the page, the Dash component bundles, the assets
+ *   and the Bootstrap theme are precached on install. Fingerprinted URLs are
+ *   served cache-first; the page and the Dash layout/dependencies are
+ *   network-first with the cached copy as the offline fallback.
+ * - Audio cache: content-addressed audio, library PCM, segments, time-stretch
+ *   variants and rendered stimuli are served cache-first from a size-capped
+ *   LRU. Range requests (from <audio> elements) are answered by slicing the
+ *   cached file.
+ *
+ * Dash callbacks, uploads, jobs and responses always go to the network.
+ */
+
+// Replaced by the server: changes whenever this file, Dash or the assets change
+const CACHE_VERSION = '__CACHE_VERSION__';
+const AUDIO_CACHE_MAX_BYTES = Number('__AUDIO_CACHE_MAX_BYTES__');
+
+const CACHE_PREFIX = 'phantomwords-';
+const SHELL_CACHE = `${CACHE_PREFIX}shell-${CACHE_VERSION}`;
+// Audio is addressed by content, so it survives app updates; bump only if the format changes
+const AUDIO_CACHE = `${CACHE_PREFIX}audio-v1`;
+// LRU bookkeeping (url -> size and last use), stored next to the audio
+const AUDIO_INDEX_URL = '/__service-worker/audio-index.json';
+// A single file may not take more than this share of the audio cache
+const AUDIO_MAX_ENTRY_FRACTION = 0.5;
+
+const AUDIO_PATHS = [
+    /^\/audio\/[0-9a-f]+$/,
+    /^\/audio\/[0-9a-f]+\/segments\.json$/,
+    /^\/audio\/[0-9a-f]+\/segments\/\d+\.pcm$/,
+    /^\/audio\/[0-9a-f]+\/stretch\/[^/]+\.pcm$/,
+    /^\/library\/[0-9a-f]+\.pcm$/,
+    /^\/render\/stimulus\.wav$/
+];
+const SHELL_NETWORK_FIRST = ['/', '/_dash-layout', '/_dash-dependencies', '/library/index.json'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(precacheShell().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.startsWith(CACHE_PREFIX) && name !== SHELL_CACHE && name !== AUDIO_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        if (AUDIO_PATHS.some(pattern => pattern.test(url.pathname))) {
+            event.respondWith(audioResponse(event, request));
+        } else if (SHELL_NETWORK_FIRST.includes(url.pathname)) {
+            // Other navigations (CSV export, /metrics...) go straight to the network
+            event.respondWith(networkFirst(request));
+        } else if (url.pathname.startsWith('/_dash-component-suites/') || url.pathname.startsWith('/assets/')) {
+            event.respondWith(cacheFirst(request));
+        }
+    } else if (request.destination === 'style' || request.destination === 'script') {
+        // Bootstrap theme and other versioned CDN files
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+// ---------------------------------------------------------------------------
+// Shell
+// ---------------------------------------------------------------------------
+
+// Cache the page and every script and stylesheet it references
+async function precacheShell() {
+    const cache = await caches.open(SHELL_CACHE);
+    const page = await fetch('/', {cache: 'no-cache'});
+    if (!page.ok) {
+        return;
+    }
+    const html = await page.clone().text();
+    await cache.put('/', page);
+
+    const urls = new Set(['/_dash-layout', '/_dash-dependencies']);
+    const pattern = /<(?:script[^>]*\ssrc|link[^>]*\shref)="([^"]+)"/g;
+    for (const match of html.matchAll(pattern)) {
+        const url = new URL(match[1].replace(/&amp;/g, '&'), self.location.origin);
+        if (url.protocol.startsWith('http')) {
+            urls.add(url.href);
+        }
+    }
+    // A failing URL (e.g. the CDN while offline) must not abort the install
+    await Promise.all([...urls].map(url =>
+        fetch(url, {cache: 'no-cache'})
+            .then(response => (response.ok ? cache.put(url, response) : null))
+            .catch(() => null)));
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    // Navigations to the page and its own requests share the precached '/' entry
+    const key = new URL(request.url).pathname === '/' ? '/' : request;
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            await cache.put(key, response.clone());
+        }
+        return response;
+    } catch (e) {
+        const cached = await cache.match(key);
+        if (cached) {
+            return cached;
+        }
+        throw e;
+    }
+}
+
+// ---------------------------------------------------------------------------
+// Audio LRU
+// ---------------------------------------------------------------------------
+
+let audioIndex = null;
+let audioIndexWrite = Promise.resolve();
+
+// Whole-file downloads in flight, so a burst of Range requests fetches each file once
+const pendingAudio = new Map();
+
+async function loadAudioIndex(cache) {
+    if (audioIndex === null) {
+        const stored = await cache.match(AUDIO_INDEX_URL);
+        const index = stored ? await stored.json().catch(() => null) : null;
+        if (index === null) {
+            // Without bookkeeping the cached files could never be evicted: start over
+            const keys = await cache.keys();
+            await Promise.all(keys.map(key => cache.delete(key)));
+        }
+        audioIndex = audioIndex || index || {};
+    }
+    return audioIndex;
+}
+
+// Writes are chained so concurrent updates never interleave
+function saveAudioIndex(cache) {
+    audioIndexWrite = audioIndexWrite.then(() => cache.put(
+        AUDIO_INDEX_URL,
+        new Response(JSON.stringify(audioIndex), {headers: {'Content-Type': 'application/json'}})
+    )).catch(() => null);
+    return audioIndexWrite;
+}
+
+async function audioResponse(event, request) {
+    const cache = await caches.open(AUDIO_CACHE);
+    const index = await loadAudioIndex(cache);
+    const key = request.url;
+    const cached = await cache.match(key);
+
+    if (cached) {
+        if (index[key]) {
+            index[key].used = Date.now();
+            event.waitUntil(saveAudioIndex(cache));
+        }
+        const range = request.headers.get('Range');
+        return range ? sliceResponse(cached, range) : cached;
+    }
+
+    if (request.headers.has('Range')) {
+        // Let the media element stream this play; fetch the whole file for the next one
+        if (!pendingAudio.has(key)) {
+            pendingAudio.set(key, fetch(key)
+                .then(response => storeAudio(cache, key, response))
+                .catch(() => null)
+                .finally(() => pendingAudio.delete(key)));
+        }
+        event.waitUntil(pendingAudio.get(key));
+        return fetch(request);
+    }
+
+    const response = await fetch(request);
+    event.waitUntil(storeAudio(cache, key, response.clone()).catch(() => null));
+    return response;
+}
+
+async function storeAudio(cache, key, response) {
+    if (response.status !== 200) {
+        return;
+    }
+    const body = await response.blob();
+    const size = body.size;
+    if (size > AUDIO_CACHE_MAX_BYTES * AUDIO_MAX_ENTRY_FRACTION) {
+        return;
+    }
+    const index = await loadAudioIndex(cache);
+    // The body is already decoded: drop the transfer headers of the original response
+    const headers = new Headers(response.headers);
+    headers.delete('Content-Encoding');
+    headers.set('Content-Length', String(size));
+    await cache.put(key, new Response(body, {status: 200, statusText: 'OK', headers: headers}));
+    index[key] = {size: size, used: Date.now()};
+
+    // Evict the least recently used files until the cache fits again
+    let total = Object.values(index).reduce((sum, entry) => sum + entry.size, 0);
+    const oldest = Object.keys(index).sort((a, b) => index[a].used - index[b].used);
+    for (const url of oldest) {
+        if (total <= AUDIO_CACHE_MAX_BYTES) {
+            break;
+        }
+        if (url === key) {
+            continue;
+        }
+        total -= index[url].size;
+        delete index[url];
+        await cache.delete(url);
+    }
+    await saveAudioIndex(cache);
+}
+
+// Answer "Range: bytes=start-end" from a cached full response
+async function sliceResponse(response, range) {
+    const body = await response.blob();
+    const match = /^bytes=(\d*)-(\d*)$/.exec(range.trim());
+    if (!match || (match[1] === '' && match[2] === '')) {
+        return new Response(null, {status: 416, headers: {'Content-Range': `bytes */${body.size}`}});
+    }
+    let start, end;
+    if (match[1] === '') {
+        // Suffix range: the last N bytes
+        start = Math.max(body.size - Number(match[2]), 0);
+        end = body.size - 1;
+    } else {
+        start = Number(match[1]);
+        end = match[2] === '' ? body.size - 1 : Math.min(Number(match[2]), body.size - 1);
+    }
+    if (start >= body.size || start > end) {
+        return new Response(null, {status: 416, headers: {'Content-Range': `bytes */${body.size}`}});
+    }
+    const headers = new Headers(response.headers);
+    headers.set('Content-Range', `bytes ${start}-${end}/${body.size}`);
+    headers.set('Content-Length', String(end - start + 1));
+    headers.set('Accept-Ranges', 'bytes');
+    return new Response(body.slice(start, end + 1), {status: 206, statusText: 'Partial Content', headers: headers});
+}
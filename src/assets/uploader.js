@@ -0,0 +1,96 @@
+/**
+ * Chunked uploader for the content-addressed audio store.
+ * The file selected in dcc.Upload is converted back to a Blob in the browser
+ * and sent to the server in fixed-size chunks (the size comes from the
+ * server when the upload starts), so the base64 data URI never
+ * travels through a Dash callback. Only a short reference (id + URL) is
+ * returned to the stores.
+ */
+
+const UPLOAD_MAX_RETRIES = 3;
+
+// Compute the SHA-256 of a blob when SubtleCrypto is available (secure contexts only)
+async function sha256Hex(blob) {
+    if (!(window.crypto && window.crypto.subtle)) {
+        return null;
+    }
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest))
+        .map(b => b.toString(16).padStart(2, '0'))
+        .join('');
+}
+
+// Send one chunk, retrying transient failures from the same offset
+async function putChunk(token, offset, chunk) {
+    let lastError = null;
+    for (let attempt = 0; attempt < UPLOAD_MAX_RETRIES; attempt++) {
+        try {
+            const response = await fetch(`/audio/uploads/${token}?offset=${offset}`, {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/octet-stream'},
+                body: chunk
+            });
+            if (response.ok) {
+                return;
+            }
+            const body = await response.json().catch(() => ({}));
+            lastError = new Error(body.error || `HTTP ${response.status}`);
+            // Client errors (size limit, bad token) will not improve with a retry
+            if (response.status < 500) {
+                break;
+            }
+        } catch (e) {
+            lastError = e;
+        }
+    }
+    throw lastError;
+}
+
+async function uploadBlob(blob, filename) {
+    // Skip the transfer entirely if the server already has this exact clip
+    const hash = await sha256Hex(blob).catch(() => null);
+    if (hash) {
+        const existing = await fetch(`/audio/by-hash/${hash}?filename=${encodeURIComponent(filename)}`);
+        if (existing.ok) {
+            return existing.json();
+        }
+    }
+
+    const begin = await fetch('/audio/uploads', {method: 'POST'});
+    const {token, chunk_size: chunkSize} = await begin.json();
+
+    for (let offset = 0; offset < blob.size; offset += chunkSize) {
+        await putChunk(token, offset, blob.slice(offset, offset + chunkSize));
+    }
+
+    const complete = await fetch(`/audio/uploads/${token}/complete`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({filename: filename})
+    });
+    const body = await complete.json();
+    if (!complete.ok) {
+        throw new Error(body.error || `HTTP ${complete.status}`);
+    }
+    return body;
+}
+
+// Clientside callback: upload the selected file and return its reference
+async function uploadToStore(contents, filename) {
+    if (!contents) {
+        return window.dash_clientside.no_update;
+    }
+    try {
+        // Decoding the data URI happens locally; no network traffic is involved
+        const blob = await (await fetch(contents)).blob();
+        return await uploadBlob(blob, filename);
+    } catch (error) {
+        console.error('Error uploading audio:', error);
+        return {filename: filename, error: error.message || String(error)};
+    }
+}
+
+window.dash_clientside = window.dash_clientside || {};
+window.dash_clientside.uploader = {
+    uploadToStore: uploadToStore
+};
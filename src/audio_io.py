@@ -0,0 +1,265 @@
+"""
+Lectura, remuestreo y escritura de audio en el servidor.
+
+La decodificación usa soundfile (libsndfile), que soporta WAV, OGG, FLAC y
+MP3. Las señales se manejan como arreglos NumPy float32 en el rango [-1, 1].
+"""
+import glob
+import os
+import threading
+import wave
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from src.config import ACCEPTED_EXTENSIONS, DECODED_CACHE_MAX_BYTES
+
+
+class UndecodableAudio(RuntimeError):
+    """soundfile no puede decodificar el archivo (p. ej. un M4A)."""
+
+
+def _open_error(path, error):
+    return UndecodableAudio(f"El servidor no puede decodificar {os.path.basename(path)}: {error}")
+
+
+def find_clips(directory):
+    """Devuelve los archivos de audio de ``directory`` ordenados por nombre."""
+    return sorted(
+        path for path in glob.glob(os.path.join(directory, '*'))
+        if path.lower().endswith(ACCEPTED_EXTENSIONS)
+    )
+
+
+def to_mono(samples):
+    """
+    Mezcla una señal multicanal a mono promediando los canales.
+
+    Parámetros:
+    samples (np.ndarray): Señal de forma (n,) o (n, canales)
+
+    Retorna:
+    np.ndarray: Señal mono float32 de forma (n,)
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def _lowpass_kernel(cutoff, taps=63):
+    """Filtro FIR pasa-bajos de sinc enventanado; ``cutoff`` relativo a Nyquist."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = cutoff * np.sinc(cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+# Muestras originales que read_range lee de más a cada lado (mayor que medio filtro)
+_RANGE_MARGIN = 64
+
+
+def resample(samples, sample_rate, target_rate):
+    """
+    Cambia la frecuencia de muestreo de una señal mono.
+
+    Al reducir la frecuencia se aplica antes un filtro anti-aliasing; después
+    se interpola linealmente sobre la nueva malla temporal.
+
+    Parámetros:
+    samples (np.ndarray): Señal mono
+    sample_rate (int): Frecuencia de muestreo original en Hz
+    target_rate (int): Frecuencia de muestreo deseada en Hz
+
+    Retorna:
+    np.ndarray: Señal remuestreada en float32
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    if target_rate < sample_rate:
+        samples = np.convolve(samples, _lowpass_kernel(target_rate / sample_rate), mode='same')
+    n_out = int(round(len(samples) * target_rate / sample_rate))
+    positions = np.arange(n_out, dtype=np.float64) * (sample_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class _DecodedCache:
+    """
+    Caché LRU en memoria de señales decodificadas, acotada por bytes.
+
+    Las señales mayores que el límite no se guardan, de modo que una pista
+    larga no desaloja a todas las demás.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        nbytes = entry[0].nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[0].nbytes
+            self._entries[key] = entry
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[0].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_decoded_cache = _DecodedCache(DECODED_CACHE_MAX_BYTES)
+
+
+def _decode(path, sample_rate):
+    try:
+        data, native_rate = sf.read(path, dtype='float32', always_2d=True)
+    except sf.LibsndfileError as error:
+        raise _open_error(path, error) from error
+    mono = to_mono(data)
+    if sample_rate is not None:
+        mono = resample(mono, native_rate, sample_rate)
+        native_rate = sample_rate
+    mono.setflags(write=False)
+    return mono, native_rate
+
+
+def load_audio(path, sample_rate=None):
+    """
+    Decodifica un archivo de audio a mono float32.
+
+    Los resultados se guardan en una caché en memoria acotada por
+    DECODED_CACHE_MAX_BYTES, por lo que el arreglo devuelto es de solo
+    lectura. Lanza UndecodableAudio si soundfile no puede decodificar el
+    archivo.
+
+    Parámetros:
+    path (str): Ruta del archivo
+    sample_rate (int o None): Frecuencia deseada; None conserva la original
+
+    Retorna:
+    tuple: (señal mono de solo lectura, frecuencia de muestreo)
+    """
+    key = (path, sample_rate)
+    entry = _decoded_cache.get(key)
+    if entry is None:
+        entry = _decode(path, sample_rate)
+        _decoded_cache.put(key, entry)
+    return entry
+
+
+def is_decodable(path):
+    """
+    Indica si soundfile puede decodificar un archivo (p. ej. no los M4A).
+
+    Solo lee la cabecera, así que cuesta lo mismo sea cual sea el tamaño.
+
+    Parámetros:
+    path (str): Ruta del archivo
+
+    Retorna:
+    bool: True si el servidor puede decodificarlo
+    """
+    try:
+        sf.info(path)
+    except sf.LibsndfileError:
+        return False
+    return True
+
+
+def audio_frames(path, sample_rate=None):
+    """
+    Número de muestras de un archivo, sin decodificarlo.
+
+    Lanza UndecodableAudio si soundfile no puede leer su cabecera.
+
+    Parámetros:
+    path (str): Ruta del archivo
+    sample_rate (int o None): Frecuencia a la que se contarían; None usa la original
+
+    Retorna:
+    tuple: (número de muestras, frecuencia de muestreo)
+    """
+    try:
+        info = sf.info(path)
+    except sf.LibsndfileError as error:
+        raise _open_error(path, error) from error
+    if sample_rate is None or sample_rate == info.samplerate:
+        return info.frames, info.samplerate
+    return int(round(info.frames * sample_rate / info.samplerate)), sample_rate
+
+
+def read_range(path, start, stop, sample_rate):
+    """
+    Decodifica solo el rango [start, stop) de un archivo, en mono y a ``sample_rate``.
+
+    Se lee el tramo original correspondiente más un margen a cada lado para
+    que el filtro anti-aliasing y la interpolación den exactamente las mismas
+    muestras que resample() sobre el archivo completo, sin cortes en los bordes
+    al concatenar rangos consecutivos.
+
+    Parámetros:
+    path (str): Ruta del archivo
+    start (int): Primera muestra, en la malla de salida
+    stop (int): Muestra final (excluida), en la malla de salida
+    sample_rate (int): Frecuencia de salida en Hz
+
+    Retorna:
+    np.ndarray: Señal mono float32 de longitud stop - start (o menos al final del archivo)
+    """
+    with sf.SoundFile(path) as f:
+        native_rate, total = f.samplerate, f.frames
+        ratio = native_rate / sample_rate
+        positions = np.arange(start, stop, dtype=np.float64) * ratio
+        positions = positions[positions <= total - 1]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.float32)
+        margin = _RANGE_MARGIN if native_rate != sample_rate else 0
+        first = max(int(positions[0]) - margin, 0)
+        last = min(int(positions[-1]) + 2 + margin, total)
+        f.seek(first)
+        mono = to_mono(f.read(last - first, dtype='float32', always_2d=True))
+    if sample_rate < native_rate:
+        mono = np.convolve(mono, _lowpass_kernel(sample_rate / native_rate), mode='same')
+    return np.interp(positions - first, np.arange(len(mono)), mono).astype(np.float32)
+
+
+def to_int16(samples):
+    """Convierte una señal float en [-1, 1] a PCM int16 con saturación."""
+    clipped = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (clipped * 32767).astype(np.int16)
+
+
+def write_wav(path, samples, sample_rate):
+    """
+    Escribe una señal como WAV PCM de 16 bits.
+
+    Parámetros:
+    path (str o file-like): Destino del archivo
+    samples (np.ndarray): Señal de forma (n,) o (n, canales)
+    sample_rate (int): Frecuencia de muestreo en Hz
+    """
+    pcm = to_int16(samples)
+    channels = 1 if pcm.ndim == 1 else pcm.shape[1]
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(int(sample_rate))
+        wav.writeframes(np.ascontiguousarray(pcm).astype('<i2').tobytes())
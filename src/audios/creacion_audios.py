@@ -1,6 +1,267 @@
-from gtts import gTTS
-frases = ["¿Lo ves, Ana?", "No ve nada", "Mamá llama", "Una vez más", "Sabe mal", "No lo es"]
-for f in frases:
-    tts = gTTS(f, lang="es")
-    nombre = f.replace(" ", "_").replace("¿","").replace("?","") + ".mp3"
-    tts.save(nombre)
+"""
+Generación del corpus de frases habladas para el efecto de palabras fantasma.
+
+Las frases se leen de un archivo de texto (una por línea) y se sintetizan en
+paralelo en un pool de hilos acotado. Un manifiesto guarda el hash de
+(texto, idioma, motor) de cada archivo generado, de modo que al volver a
+ejecutar el script solo se sintetizan las frases nuevas o modificadas y una
+ejecución interrumpida se puede reanudar.
+
+Los motores son intercambiables: ``gtts`` usa Google Text-to-Speech y ``tone``
+es un sintetizador determinista de tonos y ruido que funciona sin conexión,
+útil para construir y probar corpus grandes.
+
+Uso:
+    poetry run build-corpus --phrases src/audios/frases.txt --engine gtts
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from src.audio_io import write_wav
+
+AUDIO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PHRASES_FILE = os.path.join(AUDIO_DIR, "frases.txt")
+MANIFEST_NAME = "manifest.json"
+
+# Cada cuántas frases terminadas se guarda el manifiesto en disco
+_MANIFEST_SAVE_EVERY = 50
+
+
+class TTSEngine(ABC):
+    """
+    Interfaz de los motores de síntesis.
+
+    Las subclases definen ``name``, ``extension`` y ``synthesize``. Deben poder
+    usarse desde varios hilos a la vez.
+    """
+    name = None
+    extension = None
+
+    @abstractmethod
+    def synthesize(self, text, lang, path):
+        """
+        Sintetiza ``text`` en el idioma ``lang`` y lo guarda en ``path``.
+
+        Parámetros:
+        text (str): Frase a sintetizar
+        lang (str): Código de idioma (por ejemplo "es")
+        path (str): Archivo de destino
+        """
+
+
+class GTTSEngine(TTSEngine):
+    """Motor basado en Google Text-to-Speech (requiere conexión a internet)."""
+    name = "gtts"
+    extension = ".mp3"
+
+    def synthesize(self, text, lang, path):
+        from gtts import gTTS
+        gTTS(text, lang=lang).save(path)
+
+
+class ToneEngine(TTSEngine):
+    """
+    Sintetizador sin conexión de tonos y ruido, determinista por frase.
+
+    Cada carácter produce un segmento corto: las vocales un tono armónico, las
+    consonantes ruido filtrado y los espacios silencio. La misma frase genera
+    siempre exactamente las mismas muestras.
+    """
+    name = "tone"
+    extension = ".wav"
+    sample_rate = 24000
+    segment_seconds = 0.08
+
+    def synthesize(self, text, lang, path):
+        seed = int.from_bytes(hashlib.sha256(f"{lang}:{text}".encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        n = int(self.sample_rate * self.segment_seconds)
+        t = np.arange(n) / self.sample_rate
+        envelope = np.hanning(n).astype(np.float32)
+
+        chars = [c for c in text.lower() if c.isalpha() or c.isspace()]
+        segments = np.zeros((len(chars), n), dtype=np.float32)
+        for i, char in enumerate(chars):
+            if char.isspace():
+                continue
+            if char in "aeiouáéíóúü":
+                f0 = 110 + (ord(char) % 12) * 15
+                harmonics = np.arange(1, 6)[:, None]
+                segments[i] = (np.sin(2 * np.pi * f0 * harmonics * t) / harmonics).sum(axis=0)
+            else:
+                noise = rng.standard_normal(n)
+                width = 2 + ord(char) % 6
+                segments[i] = np.convolve(noise, np.ones(width) / width, mode="same")
+        samples = (segments * envelope).ravel()
+        peak = np.abs(samples).max() if samples.size else 0
+        if peak > 0:
+            samples = 0.8 * samples / peak
+        write_wav(path, samples, self.sample_rate)
+
+
+ENGINES = {engine.name: engine for engine in (GTTSEngine, ToneEngine)}
+
+
+def load_phrases(path):
+    """
+    Lee las frases de un archivo de texto UTF-8.
+
+    Parámetros:
+    path (str): Archivo con una frase por línea
+
+    Retorna:
+    list: Frases sin duplicados, en el orden del archivo
+    """
+    phrases = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and line not in phrases:
+                phrases.append(line)
+    return phrases
+
+
+def phrase_filename(text, extension):
+    """Nombre de archivo para una frase, p. ej. "¿Lo ves, Ana?" -> "Lo_ves,_Ana.mp3"."""
+    stem = text.replace(" ", "_").replace("¿", "").replace("?", "")
+    # Un separador de ruta escribiría fuera del directorio de salida
+    stem = stem.replace("/", "_").replace("\\", "_").strip(".")
+    return stem + extension
+
+
+def phrase_filenames(phrases, extension):
+    """
+    Asigna un nombre de archivo distinto a cada frase.
+
+    Las frases cuyo nombre coincidiría con el de otra (p. ej. "¿Lo ves?" y
+    "Lo ves", o dos que solo difieren en mayúsculas) llevan además un hash
+    corto de su texto, así que el nombre no depende del orden de las frases.
+
+    Parámetros:
+    phrases (list): Frases sin duplicados
+    extension (str): Extensión de los archivos, con el punto
+
+    Retorna:
+    dict: Nombre de archivo de cada frase
+    """
+    names = {text: phrase_filename(text, extension) for text in phrases}
+    counts = {}
+    for name in names.values():
+        counts[name.lower()] = counts.get(name.lower(), 0) + 1
+    for text, name in names.items():
+        if counts[name.lower()] > 1 or name == extension:
+            short = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+            names[text] = name[:len(name) - len(extension)] + "_" + short + extension
+    return names
+
+
+def phrase_hash(text, lang, engine_name):
+    """Hash que identifica el contenido de un archivo generado."""
+    return hashlib.sha256(json.dumps([text, lang, engine_name]).encode("utf-8")).hexdigest()
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_corpus(phrases, output_dir, engine, lang="es", workers=4, force=False):
+    """
+    Sintetiza las frases que falten o hayan cambiado desde la última ejecución.
+
+    Parámetros:
+    phrases (list): Frases a sintetizar
+    output_dir (str): Directorio de salida (también guarda el manifiesto)
+    engine (TTSEngine): Motor de síntesis
+    lang (str): Código de idioma
+    workers (int): Número máximo de síntesis simultáneas
+    force (bool): Si es True, regenera todas las frases
+
+    Retorna:
+    dict: Conteo de frases ``generated``, ``skipped`` y ``failed``
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    lock = threading.Lock()
+    summary = {"generated": 0, "skipped": 0, "failed": 0}
+
+    pending = []
+    for text, filename in phrase_filenames(phrases, engine.extension).items():
+        digest = phrase_hash(text, lang, engine.name)
+        entry = manifest.get(filename)
+        if (not force and entry and entry.get("hash") == digest
+                and os.path.exists(os.path.join(output_dir, filename))):
+            summary["skipped"] += 1
+        else:
+            pending.append((text, filename, digest))
+
+    def synthesize(text, filename):
+        # Escribir a un temporal evita dejar archivos a medias si se interrumpe
+        path = os.path.join(output_dir, filename)
+        tmp_path = path + ".part" + engine.extension
+        engine.synthesize(text, lang, tmp_path)
+        os.replace(tmp_path, path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(synthesize, text, filename): (text, filename, digest)
+                       for text, filename, digest in pending}
+            for future in as_completed(futures):
+                text, filename, digest = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    summary["failed"] += 1
+                    print(f"Error al sintetizar {text!r}: {error}", file=sys.stderr)
+                    continue
+                with lock:
+                    manifest[filename] = {"hash": digest, "text": text, "lang": lang, "engine": engine.name}
+                    summary["generated"] += 1
+                    if summary["generated"] % _MANIFEST_SAVE_EVERY == 0:
+                        _save_manifest(manifest_path, manifest)
+    finally:
+        _save_manifest(manifest_path, manifest)
+
+    return summary
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos (``poetry run build-corpus``)."""
+    parser = argparse.ArgumentParser(description="Genera el corpus de frases habladas.")
+    parser.add_argument("--phrases", default=DEFAULT_PHRASES_FILE, help="Archivo con una frase por línea")
+    parser.add_argument("--output", default=AUDIO_DIR, help="Directorio de salida")
+    parser.add_argument("--lang", default="es", help="Código de idioma")
+    parser.add_argument("--engine", default="gtts", choices=sorted(ENGINES), help="Motor de síntesis")
+    parser.add_argument("--workers", type=int, default=4, help="Síntesis simultáneas")
+    parser.add_argument("--force", action="store_true", help="Regenerar todas las frases")
+    args = parser.parse_args(argv)
+
+    summary = build_corpus(
+        load_phrases(args.phrases), args.output, ENGINES[args.engine](),
+        lang=args.lang, workers=args.workers, force=args.force,
+    )
+    print(f"Generadas: {summary['generated']}, omitidas: {summary['skipped']}, con error: {summary['failed']}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Escala de Bark: fórmula, bandas críticas y figura de ejemplo.
+
+La figura de Plotly y la tabla de bandas críticas se derivan de
+``BARK_BAND_EDGES`` y se guardan serializadas en ``bark_scale.json`` junto al
+paquete. Al arrancar solo se lee ese JSON; la figura se vuelve a generar
+únicamente si cambian las bandas o el diseño de la figura.
+"""
+import functools
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+# Frecuencias límite (Hz) de las 24 bandas críticas de Bark
+BARK_BAND_EDGES = np.array([
+    0, 100, 200, 300, 400, 510, 630, 770, 920, 1080, 1270, 1480,
+    1720, 2000, 2320, 2700, 3150, 3700, 4400, 5300, 6400, 7700, 9500, 12000, 15500
+])
+
+# Frecuencias centrales publicadas por Zwicker para cada banda (no son el punto medio)
+BARK_BAND_CENTERS = np.array([
+    50, 150, 250, 350, 450, 570, 700, 840, 1000, 1170, 1370, 1600,
+    1850, 2150, 2500, 2900, 3400, 4000, 4800, 5800, 7000, 8500, 10500, 13500
+])
+
+# Archivo con la figura y la tabla precalculadas
+BARK_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bark_scale.json")
+
+# Incrementar al cambiar el diseño de la figura para invalidar el JSON guardado
+_FIGURE_VERSION = 1
+
+
+# Función para calcular la escala de Bark
+def bark_scale(f):
+    """
+    Calcula el valor en la escala de Bark para una frecuencia dada en Hz.
+
+    Parámetros:
+    f (float o array): Frecuencia en Hz
+
+    Retorna:
+    float o array: Valor correspondiente en la escala de Bark
+    """
+    return 13 * np.arctan(0.00076 * f) + 3.5 * np.arctan((f/7500)**2)
+
+
+# Función para generar la gráfica de la escala de Bark
+def generate_bark_scale_figure():
+    """
+    Genera una figura de Plotly que muestra la relación entre frecuencia (Hz) y la escala de Bark.
+
+    Retorna:
+    plotly.graph_objs.Figure: Figura con la gráfica de la escala de Bark
+    """
+    import plotly.graph_objs as go
+
+    # Generar un rango de frecuencias de 20 Hz a 20 kHz (rango audible humano)
+    frequencies = np.logspace(np.log10(20), np.log10(20000), 1000)
+
+    # Calcular los valores correspondientes en la escala de Bark
+    bark_values = bark_scale(frequencies)
+
+    # Crear la figura
+    fig = go.Figure()
+
+    # Añadir la línea de la escala de Bark
+    fig.add_trace(go.Scatter(
+        x=frequencies,
+        y=bark_values,
+        mode='lines',
+        name='Escala de Bark',
+        line=dict(color='blue', width=2)
+    ))
+
+    # Añadir puntos rojos para las bandas críticas
+    fig.add_trace(go.Scatter(
+        x=BARK_BAND_EDGES,
+        y=bark_scale(BARK_BAND_EDGES),
+        mode='markers',
+        name='Bandas Críticas',
+        marker=dict(
+            color='red',
+            size=8,
+            symbol='circle'
+        )
+    ))
+
+    # Configurar el diseño de la gráfica
+    fig.update_layout(
+        title='Relación entre Frecuencia y Escala de Bark',
+        xaxis=dict(
+            title='Frecuencia (Hz)',
+            type='log',
+            tickformat='.0f',
+            gridcolor='lightgray'
+        ),
+        yaxis=dict(
+            title='Escala de Bark (z)',
+            gridcolor='lightgray'
+        ),
+        plot_bgcolor='white',
+        margin=dict(l=40, r=40, t=50, b=40),
+        height=500,
+        width=700,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+
+    return fig
+
+
+def bark_band_table():
+    """
+    Filas de la tabla de bandas críticas derivadas de ``BARK_BAND_EDGES``.
+
+    Retorna:
+    list: Filas [banda, rango, ancho de banda, frecuencia central] como texto
+    """
+    low, high = BARK_BAND_EDGES[:-1], BARK_BAND_EDGES[1:]
+    return [
+        [str(band), f"{lo} - {hi}", str(hi - lo), str(center)]
+        for band, lo, hi, center in zip(range(1, len(low) + 1), low, high, BARK_BAND_CENTERS)
+    ]
+
+
+def _cache_key():
+    payload = json.dumps([BARK_BAND_EDGES.tolist(), BARK_BAND_CENTERS.tolist(), _FIGURE_VERSION])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def load_bark_data():
+    """
+    Devuelve la figura (como dict de Plotly) y la tabla de bandas críticas.
+
+    Lee ``bark_scale.json`` si está al día; si no, genera la figura y la tabla
+    y reemplaza el archivo de forma atómica, así que otro proceso que lo lea
+    a la vez nunca ve un JSON a medias.
+
+    Retorna:
+    dict: Claves 'figure' y 'table'
+    """
+    key = _cache_key()
+    try:
+        with open(BARK_CACHE_PATH, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('key') == key:
+            return data
+    except (OSError, ValueError):
+        pass
+
+    data = {
+        'key': key,
+        'figure': json.loads(generate_bark_scale_figure().to_json()),
+        'table': bark_band_table(),
+    }
+    tmp_path = f"{BARK_CACHE_PATH}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, BARK_CACHE_PATH)
+    except OSError:
+        # En instalaciones de solo lectura se usa la versión en memoria
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return data
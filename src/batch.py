@@ -0,0 +1,174 @@
+"""
+Renderizado por lotes de la rejilla completa de estímulos retraso × velocidad.
+
+Recorre todos los pares de clips, retrasos y combinaciones de velocidades que
+permiten los controles del panel, reparte el trabajo en un pool de procesos y
+escribe cada estímulo directamente en un único ``.npy`` preasignado y mapeado
+en memoria, junto con un manifiesto CSV. La memoria usada es la de los clips
+decodificados más un estímulo por proceso, sin importar el tamaño de la rejilla.
+
+Uso:
+    poetry run render-grid --output data/grid
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.audio_io import find_clips, load_audio, to_int16
+from src.config import BUNDLED_AUDIO_DIR, GRID_OUTPUT_DIR
+from src.renderer import apply_speed, assemble_stimulus, delay_samples, stimulus_length
+
+# Frecuencia de muestreo común de la rejilla (la de los clips incluidos)
+DEFAULT_SAMPLE_RATE = 24000
+
+MANIFEST_FIELDS = ['index', 'clip1', 'clip2', 'delay_ms', 'speed1', 'speed2', 'loops', 'length']
+
+# Estado de cada proceso trabajador, creado una sola vez en _init_worker
+_worker = {}
+
+
+def parse_range(spec):
+    """
+    Interpreta un rango ``inicio:fin:paso`` (fin incluido) o una lista separada por comas.
+
+    Parámetros:
+    spec (str): Por ejemplo "0:500:10" o "0.5,1.0,2.0"
+
+    Retorna:
+    list: Valores del rango redondeados a 4 decimales
+    """
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        values = start + step * np.arange(count)
+    else:
+        values = [float(x) for x in spec.split(',')]
+    return [round(float(v), 4) for v in values]
+
+
+def build_grid(n_clips, delays):
+    """
+    Enumera las tareas de la rejilla: una por cada (par de clips, retraso).
+
+    Cada tarea agrupa las ``len(speeds) ** 2`` combinaciones de velocidad, que
+    ocupan filas consecutivas del conjunto de datos.
+
+    Parámetros:
+    n_clips (int): Número de clips
+    delays (list): Retrasos en milisegundos
+
+    Retorna:
+    list: Tareas ``(indice_clip1, indice_clip2, retraso)``
+    """
+    pairs = itertools.combinations(range(n_clips), 2)
+    return [(i, j, delay) for (i, j) in pairs for delay in delays]
+
+
+def _init_worker(clips, sample_rate, speeds, loops, dataset_path):
+    # Cada proceso decodifica los clips y precalcula sus versiones remuestreadas una vez
+    tracks = [load_audio(path, sample_rate)[0] for path in clips]
+    _worker['sped'] = [[apply_speed(track, speed) for speed in speeds] for track in tracks]
+    _worker['sample_rate'] = sample_rate
+    _worker['loops'] = loops
+    _worker['dataset'] = np.load(dataset_path, mmap_mode='r+')
+
+
+def _render_task(args):
+    task_index, (i, j, delay_ms) = args
+    sped, dataset = _worker['sped'], _worker['dataset']
+    delay = delay_samples(delay_ms, _worker['sample_rate'])
+    n_speeds = len(sped[i])
+    row = task_index * n_speeds * n_speeds
+    for first, second in itertools.product(sped[i], sped[j]):
+        stimulus = assemble_stimulus(first, delay, _worker['loops'], second)
+        dataset[row, :len(stimulus)] = to_int16(stimulus)
+        row += 1
+    dataset.flush()
+    return task_index
+
+
+def render_grid(clips, output_dir, delays, speeds, loops=1, sample_rate=DEFAULT_SAMPLE_RATE, workers=None):
+    """
+    Renderiza la rejilla completa en ``output_dir/stimuli.npy`` y ``manifest.csv``.
+
+    El arreglo tiene forma (variantes, muestras, 2) en int16; cada fila ocupa
+    ``length`` muestras (columna del manifiesto) y el resto queda en cero.
+
+    Parámetros:
+    clips (list): Rutas de los clips
+    output_dir (str): Directorio de salida
+    delays (list): Retrasos en milisegundos
+    speeds (list): Velocidades de cada pista
+    loops (int): Repeticiones de cada estímulo
+    sample_rate (int): Frecuencia de muestreo común
+    workers (int o None): Procesos del pool (None = todos los núcleos)
+
+    Retorna:
+    str: Ruta del archivo .npy generado
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    lengths = [len(load_audio(path, sample_rate)[0]) for path in clips]
+    names = [os.path.basename(path) for path in clips]
+    tasks = build_grid(len(clips), delays)
+
+    # El manifiesto se conoce de antemano: las longitudes se calculan sin renderizar
+    rows = []
+    for i, j, delay_ms in tasks:
+        for speed1, speed2 in itertools.product(speeds, speeds):
+            length = stimulus_length(lengths[i], sample_rate, delay_ms, loops, speed1, lengths[j], speed2)
+            rows.append([len(rows), names[i], names[j], delay_ms, speed1, speed2, loops, length])
+    max_length = max(row[-1] for row in rows)
+
+    dataset_path = os.path.join(output_dir, 'stimuli.npy')
+    np.lib.format.open_memmap(dataset_path, mode='w+', dtype=np.int16, shape=(len(rows), max_length, 2)).flush()
+
+    with open(os.path.join(output_dir, 'manifest.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_FIELDS + ['sample_rate'])
+        writer.writerows(row + [sample_rate] for row in rows)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(clips, sample_rate, speeds, loops, dataset_path),
+    ) as pool:
+        for done, _ in enumerate(pool.map(_render_task, enumerate(tasks), chunksize=4), start=1):
+            if done % 50 == 0 or done == len(tasks):
+                print(f"{done}/{len(tasks)} tareas ({time.perf_counter() - start:.1f} s)", file=sys.stderr)
+
+    return dataset_path
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos (``poetry run render-grid``)."""
+    parser = argparse.ArgumentParser(description="Renderiza la rejilla de estímulos retraso × velocidad.")
+    parser.add_argument('--clips', default=BUNDLED_AUDIO_DIR, help="Directorio con los clips de audio")
+    parser.add_argument('--output', default=GRID_OUTPUT_DIR, help="Directorio de salida")
+    parser.add_argument('--delays', default='0:500:10', help="Retrasos en ms (inicio:fin:paso o lista)")
+    parser.add_argument('--speeds', default='0.5:2.0:0.1', help="Velocidades (inicio:fin:paso o lista)")
+    parser.add_argument('--loops', type=int, default=1, help="Repeticiones de cada estímulo")
+    parser.add_argument('--sample-rate', type=int, default=DEFAULT_SAMPLE_RATE, help="Frecuencia de muestreo en Hz")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args(argv)
+
+    clips = find_clips(args.clips)
+    if len(clips) < 2:
+        parser.error(f"Se necesitan al menos dos clips en {args.clips}")
+
+    path = render_grid(
+        clips, args.output,
+        delays=parse_range(args.delays), speeds=parse_range(args.speeds),
+        loops=args.loops, sample_rate=args.sample_rate, workers=args.workers,
+    )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
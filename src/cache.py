@@ -0,0 +1,111 @@
+"""
+Caché en disco con política LRU y tamaño máximo.
+
+Cada entrada es un archivo cuyo nombre es el SHA-256 de la clave. La fecha de
+modificación se actualiza en cada acierto y, cuando el total supera el límite,
+se eliminan primero las entradas usadas hace más tiempo.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+
+def make_key(*parts):
+    """
+    Construye una clave estable a partir de valores serializables en JSON.
+
+    Parámetros:
+    *parts: Valores que identifican la entrada (hashes, parámetros, ...)
+
+    Retorna:
+    str: SHA-256 hexadecimal de la representación JSON canónica
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Caché de archivos en disco acotada en bytes.
+
+    Parámetros:
+    root (str): Directorio de la caché
+    max_bytes (int): Tamaño total máximo antes de expulsar entradas
+    suffix (str): Extensión de los archivos guardados (por ejemplo '.wav')
+    """
+
+    def __init__(self, root, max_bytes, suffix=''):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key):
+        """Devuelve la ruta donde se guarda (o guardaría) la entrada ``key``."""
+        return os.path.join(self.root, key + self.suffix)
+
+    def get(self, key):
+        """
+        Busca una entrada y la marca como usada recientemente.
+
+        Parámetros:
+        key (str): Clave devuelta por make_key
+
+        Retorna:
+        str o None: Ruta del archivo en caché, o None si no existe
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, write):
+        """
+        Crea una entrada escribiendo primero en un archivo temporal.
+
+        Parámetros:
+        key (str): Clave de la entrada
+        write (callable): Función que recibe la ruta temporal y escribe el contenido
+
+        Retorna:
+        str: Ruta definitiva de la entrada
+        """
+        path = self.path_for(key)
+        tmp_path = os.path.join(self.root, f".{uuid.uuid4().hex}.tmp{self.suffix}")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=path)
+        return path
+
+    def get_or_create(self, key, write):
+        """Devuelve la entrada ``key``, creándola con ``write`` si no existe."""
+        return self.get(key) or self.put(key, write)
+
+    def _evict(self, keep=None):
+        with self._lock:
+            entries = []
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.startswith('.') and entry.path != keep:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            if keep is not None and os.path.exists(keep):
+                total += os.path.getsize(keep)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
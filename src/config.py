@@ -0,0 +1,92 @@
+"""
+Configuración del Panel de Palabras Fantasma.
+
+Los valores se leen de variables de entorno para poder ajustarlos en cada
+despliegue sin modificar el código.
+"""
+import os
+
+# Directorio raíz del proyecto (un nivel por encima del paquete src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Directorio donde se guardan los datos generados por la aplicación
+DATA_DIR = os.environ.get("PHANTOMWORDS_DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Almacén de audio direccionado por contenido (SHA-256)
+AUDIO_STORE_DIR = os.path.join(DATA_DIR, "audio")
+
+# Tamaño máximo de un archivo de audio subido, común a todas las pistas
+MAX_UPLOAD_MB = int(os.environ.get("PHANTOMWORDS_MAX_UPLOAD_MB", "30"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+# Tamaño de cada fragmento que el navegador envía a la ruta de carga
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Extensiones de audio aceptadas
+ACCEPTED_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a')
+
+# Ingesta de las subidas (src/transcode.py): frecuencia de voz, formato ('flac' u 'ogg')
+# y si se conservan los originales tras transcodificarlos
+TRANSCODE_SAMPLE_RATE = int(os.environ.get("PHANTOMWORDS_TRANSCODE_RATE", "24000"))
+TRANSCODE_FORMAT = os.environ.get("PHANTOMWORDS_TRANSCODE_FORMAT", "flac")
+KEEP_ORIGINALS = os.environ.get("PHANTOMWORDS_KEEP_ORIGINALS", "0") == "1"
+
+# Duración máxima de un estímulo renderizado en el servidor (repeticiones incluidas)
+MAX_STIMULUS_SECONDS = float(os.environ.get("PHANTOMWORDS_MAX_STIMULUS_SECONDS", "600"))
+
+# Caché en disco de estímulos renderizados en el servidor
+RENDER_CACHE_DIR = os.path.join(DATA_DIR, "renders")
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_RENDER_CACHE_MB", "512")) * 1024 * 1024
+
+# Reproducción por segmentos: duración y frecuencia de los segmentos PCM, y
+# caché en disco de los segmentos ya decodificados
+STREAM_SEGMENT_SECONDS = 5
+STREAM_SAMPLE_RATE = 24000
+STREAM_CACHE_DIR = os.path.join(DATA_DIR, "segments")
+STREAM_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_STREAM_CACHE_MB", "256")) * 1024 * 1024
+
+# Variantes de velocidad que conservan el tono (vocoder de fase): frecuencia
+# de muestreo y caché en disco por (hash del audio, velocidad)
+STRETCH_SAMPLE_RATE = 24000
+STRETCH_CACHE_DIR = os.path.join(DATA_DIR, "stretch")
+STRETCH_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_STRETCH_CACHE_MB", "256")) * 1024 * 1024
+
+# Caché en memoria (por proceso) de las señales ya decodificadas por load_audio
+DECODED_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_DECODED_CACHE_MB", "64")) * 1024 * 1024
+
+# Caché en disco del análisis por bandas de Bark de cada audio
+ANALYSIS_CACHE_DIR = os.path.join(DATA_DIR, "analysis")
+ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_ANALYSIS_CACHE_MB", "64")) * 1024 * 1024
+
+# Caché en disco de las pirámides de mínimos y máximos de la forma de onda
+WAVEFORM_CACHE_DIR = os.path.join(DATA_DIR, "waveforms")
+WAVEFORM_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_WAVEFORM_CACHE_MB", "64")) * 1024 * 1024
+
+# Índice de similitud por huellas en bandas de Bark (src/similarity.py)
+SIMILARITY_INDEX_DIR = os.path.join(DATA_DIR, "similarity")
+
+# Tamaño máximo del audio que el service worker guarda en el navegador
+SW_AUDIO_CACHE_MAX_BYTES = int(os.environ.get("PHANTOMWORDS_SW_AUDIO_CACHE_MB", "256")) * 1024 * 1024
+
+# Cola de trabajos en segundo plano (SQLite) e hilos que la atienden en cada proceso
+JOBS_DB_PATH = os.path.join(DATA_DIR, "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("PHANTOMWORDS_JOB_WORKERS", "2"))
+
+# Respuestas de los participantes (SQLite, escritas por lotes)
+RESPONSES_DB_PATH = os.path.join(DATA_DIR, "responses.sqlite3")
+
+# Clips de ejemplo incluidos en el repositorio
+BUNDLED_AUDIO_DIR = os.path.join(BASE_DIR, "src", "audios")
+
+# Directorio de salida por defecto de la rejilla de estímulos (src/batch.py)
+GRID_OUTPUT_DIR = os.path.join(DATA_DIR, "grid")
+
+# Biblioteca de clips incluidos, decodificados a PCM int16
+LIBRARY_DIR = os.path.join(DATA_DIR, "library")
+LIBRARY_SAMPLE_RATE = 24000
+
+# Perfilado con cProfile de una fracción de las peticiones (0 lo desactiva);
+# se guardan los perfiles de las que tardan más de PROFILE_SLOW_MS
+PROFILE_SAMPLE_RATE = float(os.environ.get("PHANTOMWORDS_PROFILE_SAMPLE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("PHANTOMWORDS_PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
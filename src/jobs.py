@@ -0,0 +1,318 @@
+"""
+Cola de trabajos en segundo plano para el trabajo pesado del servidor.
+
+Los trabajos (análisis, renderizado) se guardan en una base SQLite en modo WAL
+y los ejecuta un grupo acotado de hilos, fuera de los callbacks de Dash: el
+callback solo encola el trabajo y después consulta su progreso. Como la cola
+está en disco, con varios procesos (gunicorn) cualquiera de ellos puede
+ejecutar un trabajo encolado por otro.
+
+Un trabajo idéntico (mismo tipo y parámetros) a otro que aún está en cola o
+en ejecución no se duplica: se devuelve el existente. La cancelación es
+cooperativa: la función del trabajo informa de su progreso con ``report``,
+que lanza JobCancelled si el trabajo se ha cancelado.
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import Blueprint, abort, jsonify, request
+
+from src.cache import make_key
+
+# Estados de un trabajo
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Un trabajo en ejecución sin actualizar durante este tiempo se considera
+# abandonado (su proceso terminó) y vuelve a la cola
+STALE_JOB_SECONDS = 300
+
+# Intervalo con el que un trabajo en ejecución marca que sigue vivo, aunque
+# su función no llame a ``report`` durante un paso largo
+HEARTBEAT_SECONDS = 30
+
+# Los trabajos terminados se borran de la base pasado este tiempo
+JOB_RETENTION_SECONDS = 24 * 3600
+
+# Intervalo con el que los hilos buscan trabajos encolados por otros procesos
+POLL_SECONDS = 0.5
+
+# Intervalo mínimo entre escrituras de progreso de un mismo trabajo
+_REPORT_INTERVAL = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status);
+"""
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se ejecutaba."""
+
+
+class JobQueue:
+    """
+    Cola de trabajos persistente con un grupo acotado de hilos.
+
+    Parámetros:
+    db_path (str): Ruta de la base de datos SQLite
+    workers (int): Hilos que ejecutan trabajos en cada proceso
+    """
+
+    def __init__(self, db_path, workers=2):
+        self.db_path = db_path
+        self.workers = workers
+        self.handlers = {}
+        self._pid = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self, immediate=False):
+        # Una conexión por operación: sqlite3 no comparte conexiones entre hilos.
+        # Con immediate=True todo el bloque es una transacción con bloqueo de escritura.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if immediate:
+                conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def register(self, kind, func):
+        """
+        Registra la función que ejecuta los trabajos de un tipo.
+
+        Parámetros:
+        kind (str): Tipo de trabajo
+        func (callable): Recibe (params, report) y devuelve un resultado serializable
+        en JSON; ``report(fraction, message=None)`` informa del progreso
+        """
+        self.handlers[kind] = func
+
+    def submit(self, kind, params):
+        """
+        Encola un trabajo, o devuelve el idéntico que ya esté en cola o en ejecución.
+
+        De paso borra los trabajos terminados hace más de JOB_RETENTION_SECONDS.
+
+        Parámetros:
+        kind (str): Tipo de trabajo registrado
+        params (dict): Parámetros serializables en JSON
+
+        Retorna:
+        str: Id del trabajo
+        """
+        if kind not in self.handlers:
+            raise KeyError(f"Tipo de trabajo desconocido: {kind}")
+        key = make_key(kind, params)
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated < ?",
+                (*FINISHED_STATES, now - JOB_RETENTION_SECONDS))
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY created LIMIT 1",
+                (key, *ACTIVE_STATES)).fetchone()
+            if row is not None:
+                return row['id']
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, key, params, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, key, json.dumps(params), QUEUED, now, now))
+        self._ensure_workers()
+        self._wakeup.set()
+        return job_id
+
+    def status(self, job_id):
+        """
+        Devuelve el estado de un trabajo.
+
+        Parámetros:
+        job_id (str): Id del trabajo
+
+        Retorna:
+        dict o None: id, kind, status, progress, message y result; None si no existe
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, progress, message, result FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo en cola o en ejecución.
+
+        Un trabajo en ejecución se detiene en su siguiente llamada a ``report``.
+
+        Parámetros:
+        job_id (str): Id del trabajo
+
+        Retorna:
+        bool: True si el trabajo seguía activo
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, "Cancelado.", time.time(), job_id, *ACTIVE_STATES))
+        return cursor.rowcount > 0
+
+    def _ensure_workers(self):
+        # Los hilos no sobreviven a fork(): cada proceso arranca los suyos
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _claim(self):
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            rows = conn.execute(
+                """UPDATE jobs SET status = ?, updated = ?
+                   WHERE id = (SELECT id FROM jobs
+                               WHERE status = ? OR (status = ? AND updated < ?)
+                               ORDER BY created LIMIT 1)
+                   RETURNING id, kind, params""",
+                (RUNNING, now, QUEUED, RUNNING, now - STALE_JOB_SECONDS)).fetchall()
+        return rows[0] if rows else None
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            self._run(job['id'], job['kind'], json.loads(job['params']))
+
+    def _run(self, job_id, kind, params):
+        last_report = [0.0]
+
+        def report(fraction, message=None):
+            now = time.time()
+            if now - last_report[0] < _REPORT_INTERVAL and fraction < 1:
+                return
+            last_report[0] = now
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET progress = ?, message = COALESCE(?, message), updated = ? "
+                    "WHERE id = ? AND status = ?",
+                    (min(max(fraction, 0.0), 1.0), message, now, job_id, RUNNING))
+            if cursor.rowcount == 0:
+                raise JobCancelled(job_id)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job_id, stop), name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handlers[kind](params, report)
+        except JobCancelled:
+            return
+        except Exception as error:
+            self._finish(job_id, FAILED, None, str(error) or type(error).__name__)
+        else:
+            self._finish(job_id, DONE, result, None)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def _heartbeat(self, job_id, stop):
+        # Mantiene ``updated`` al día para que otro proceso no lo tome por abandonado
+        while not stop.wait(HEARTBEAT_SECONDS):
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET updated = ? WHERE id = ? AND status = ?",
+                    (time.time(), job_id, RUNNING))
+            if cursor.rowcount == 0:
+                return
+
+    def _finish(self, job_id, status, result, message):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = CASE WHEN ? = ? THEN 1 ELSE progress END, "
+                "result = ?, message = ?, updated = ? WHERE id = ? AND status = ?",
+                (status, status, DONE, json.dumps(result), message, time.time(), job_id, RUNNING))
+
+
+def create_jobs_blueprint(queue):
+    """
+    Crea el blueprint con las rutas de la cola de trabajos.
+
+    Rutas:
+    POST /jobs                  Encola un trabajo {"kind": ..., "params": {...}}
+    GET  /jobs/<id>             Estado, progreso y resultado del trabajo
+    POST /jobs/<id>/cancel      Cancela el trabajo
+
+    Parámetros:
+    queue (JobQueue): Cola de trabajos
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("jobs", __name__)
+
+    @bp.route("/jobs", methods=["POST"])
+    def submit_job():
+        payload = request.get_json(silent=True) or {}
+        if payload.get('kind') not in queue.handlers:
+            return jsonify({'error': "Tipo de trabajo desconocido."}), 400
+        job_id = queue.submit(payload['kind'], payload.get('params') or {})
+        return jsonify(queue.status(job_id)), 202
+
+    @bp.route("/jobs/<job_id>")
+    def job_status(job_id):
+        job = queue.status(job_id)
+        if job is None:
+            abort(404)
+        return jsonify(job)
+
+    @bp.route("/jobs/<job_id>/cancel", methods=["POST"])
+    def cancel_job(job_id):
+        if queue.status(job_id) is None:
+            abort(404)
+        queue.cancel(job_id)
+        return jsonify(queue.status(job_id))
+
+    return bp
@@ -0,0 +1,134 @@
+"""
+Biblioteca de clips incluidos en el repositorio.
+
+Los clips de ``src/audios`` se decodifican una sola vez a PCM int16 mono a una
+frecuencia fija y se guardan como blobs compactos junto con un índice de sus
+metadatos. El navegador construye el AudioBuffer directamente a partir del
+PCM, sin subir el archivo ni llamar a ``decodeAudioData``. Los blobs se
+nombran por el hash del clip original, así que se sirven con caché de larga
+duración y solo se vuelven a decodificar si el clip cambia.
+"""
+import json
+import os
+import threading
+
+from flask import Blueprint, abort, jsonify, send_file
+
+from src.audio_io import find_clips, load_audio, to_int16
+
+
+class ClipLibrary:
+    """
+    Índice y blobs PCM de los clips incluidos.
+
+    Parámetros:
+    source_dir (str): Directorio con los clips originales
+    output_dir (str): Directorio donde se guardan los blobs .pcm
+    store (src.storage.AudioStore): Almacén donde se registran los originales
+    sample_rate (int): Frecuencia de muestreo de los blobs
+    """
+
+    def __init__(self, source_dir, output_dir, store, sample_rate):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.store = store
+        self.sample_rate = sample_rate
+        self._index = None
+        self._lock = threading.Lock()
+
+    def filenames(self):
+        """Nombres de los clips disponibles, sin necesidad de decodificarlos."""
+        return [os.path.basename(path) for path in find_clips(self.source_dir)]
+
+    def options(self):
+        """Opciones para el dcc.Dropdown de la biblioteca."""
+        return [
+            {'label': os.path.splitext(name)[0].replace('_', ' '), 'value': name}
+            for name in self.filenames()
+        ]
+
+    def index(self):
+        """
+        Devuelve el índice de la biblioteca, construyéndolo la primera vez.
+
+        Retorna:
+        list: Entradas con id, nombre, URL del PCM, frecuencia y duración
+        """
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build()
+        return self._index
+
+    def warm(self):
+        """Construye el índice al arrancar el servidor para que la primera visita no espere."""
+        self.index()
+
+    def entry(self, filename):
+        """Entrada del índice para un nombre de archivo, o None si no existe."""
+        return next((e for e in self.index() if e['filename'] == filename), None)
+
+    def pcm_path(self, clip_id):
+        """Ruta del blob PCM de un clip."""
+        return os.path.join(self.output_dir, f"{clip_id}-{self.sample_rate}.pcm")
+
+    def _build(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        entries = []
+        for path in find_clips(self.source_dir):
+            clip_id = self.store.put_file(path)
+            pcm_path = self.pcm_path(clip_id)
+            if not os.path.exists(pcm_path):
+                samples, _ = load_audio(path, self.sample_rate)
+                tmp_path = pcm_path + '.tmp'
+                to_int16(samples).astype('<i2').tofile(tmp_path)
+                os.replace(tmp_path, pcm_path)
+            frames = os.path.getsize(pcm_path) // 2
+            filename = os.path.basename(path)
+            entries.append({
+                **self.store.reference(clip_id, filename),
+                'name': os.path.splitext(filename)[0].replace('_', ' '),
+                'pcm': {
+                    'url': f"/library/{clip_id}.pcm",
+                    'sample_rate': self.sample_rate,
+                    'channels': 1,
+                    'frames': frames,
+                },
+                'duration': frames / self.sample_rate,
+            })
+        with open(os.path.join(self.output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        return entries
+
+
+def create_library_blueprint(library):
+    """
+    Crea el blueprint con el índice y los blobs PCM de la biblioteca.
+
+    Rutas:
+    GET /library/index.json    Metadatos de todos los clips
+    GET /library/<id>.pcm      PCM int16 little-endian mono, cacheable indefinidamente
+
+    Parámetros:
+    library (ClipLibrary): Biblioteca a servir
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("library", __name__)
+
+    @bp.route("/library/index.json")
+    def library_index():
+        return jsonify(library.index())
+
+    @bp.route("/library/<clip_id>.pcm")
+    def library_pcm(clip_id):
+        if not any(e['id'] == clip_id for e in library.index()):
+            abort(404)
+        response = send_file(library.pcm_path(clip_id), mimetype='application/octet-stream',
+                             conditional=True, etag=f"{clip_id}-{library.sample_rate}",
+                             max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    return bp
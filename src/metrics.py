@@ -0,0 +1,213 @@
+"""
+Métricas de latencia y tamaño de las peticiones, en formato Prometheus.
+
+Se registra el tiempo de respuesta, el tamaño del cuerpo recibido y el del
+cuerpo enviado de cada petición a ``app.server``. Las peticiones de callbacks
+de Dash se etiquetan con el nombre de la función del callback y el resto con
+la regla de la ruta (por ejemplo ``/audio/uploads/<token>``). Los histogramas
+se exportan en ``/metrics``.
+
+Opcionalmente se perfila con cProfile una fracción de las peticiones y se
+guardan en disco los perfiles de las que superan un umbral de latencia.
+Con varios procesos (gunicorn) cada uno exporta sus propios valores,
+identificados por la etiqueta ``pid``.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+
+from flask import Response, g, request
+
+# Límites superiores de los buckets de cada histograma
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+DASH_CALLBACK_PATH = '_dash-update-component'
+
+
+class Histogram:
+    """
+    Histograma acumulativo con una serie por valor de etiqueta.
+
+    Parámetros:
+    name (str): Nombre de la métrica
+    help_text (str): Descripción para la línea HELP
+    buckets (tuple): Límites superiores de los buckets, en orden creciente
+    label (str): Nombre de la etiqueta que distingue las series
+    """
+
+    def __init__(self, name, help_text, buckets, label='handler'):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        """Registra una observación en la serie ``label_value``."""
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self, extra_labels=''):
+        """
+        Devuelve las líneas del histograma en formato de texto de Prometheus.
+
+        Parámetros:
+        extra_labels (str): Etiquetas comunes ya formateadas, p. ej. 'pid="12"'
+
+        Retorna:
+        list: Líneas de texto
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, dict(v, counts=list(v['counts']))) for k, v in self._series.items())
+        for label_value, series in items:
+            escaped = label_value.replace('\\', '\\\\').replace('"', '\\"')
+            labels = f'{self.label}="{escaped}",{extra_labels}'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series["sum"]}')
+            lines.append(f'{self.name}_count{{{labels}}} {series["count"]}')
+        return lines
+
+
+class RequestMetrics:
+    """Histogramas de latencia y tamaños de petición/respuesta por manejador."""
+
+    def __init__(self):
+        self.latency = Histogram(
+            'phantomwords_request_duration_seconds', 'Tiempo de respuesta por manejador.', LATENCY_BUCKETS)
+        self.request_bytes = Histogram(
+            'phantomwords_request_body_bytes', 'Tamaño del cuerpo de la petición por manejador.', SIZE_BUCKETS)
+        self.response_bytes = Histogram(
+            'phantomwords_response_body_bytes', 'Tamaño del cuerpo de la respuesta por manejador.', SIZE_BUCKETS)
+
+    def expose(self):
+        """Texto completo de todas las métricas para ``/metrics``."""
+        extra = f'pid="{os.getpid()}"'
+        lines = []
+        for histogram in (self.latency, self.request_bytes, self.response_bytes):
+            lines.extend(histogram.expose(extra))
+        return "\n".join(lines) + "\n"
+
+
+class SlowRequestProfiler:
+    """
+    Perfila con cProfile una fracción de las peticiones y guarda las lentas.
+
+    Parámetros:
+    output_dir (str): Directorio donde se escriben los archivos .prof
+    sample_rate (float): Fracción de peticiones perfiladas (0 lo desactiva)
+    slow_seconds (float): Latencia a partir de la cual se guarda el perfil
+    """
+
+    def __init__(self, output_dir, sample_rate, slow_seconds):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+
+    def start(self):
+        """Devuelve un perfilador activo, o None si esta petición no se muestrea."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en este hilo
+            return None
+        return profiler
+
+    def finish(self, profiler, handler, elapsed):
+        """Detiene el perfilador y guarda el perfil si la petición fue lenta."""
+        profiler.disable()
+        if elapsed < self.slow_seconds:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_handler = ''.join(c if c.isalnum() else '_' for c in handler).strip('_') or 'request'
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe_handler}-{int(elapsed * 1000)}ms.prof"
+        profiler.dump_stats(os.path.join(self.output_dir, filename))
+
+
+def _handler_name(dash_app):
+    """Etiqueta de la petición actual: nombre del callback de Dash o regla de la ruta."""
+    if request.path.endswith(DASH_CALLBACK_PATH):
+        body = request.get_json(silent=True) or {}
+        output = body.get('output', '')
+        if output not in dash_app.callback_map:
+            # El cliente decide 'output': usarlo tal cual crearía series sin límite
+            return 'callback:unknown'
+        callback = dash_app.callback_map[output].get('callback')
+        name = getattr(callback, '__name__', None)
+        return f"callback:{name or output}"
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def instrument_server(dash_app, metrics=None, profiler=None):
+    """
+    Registra la instrumentación y la ruta ``/metrics`` en el servidor de Dash.
+
+    Parámetros:
+    dash_app (dash.Dash): Aplicación a instrumentar
+    metrics (RequestMetrics o None): Métricas a usar (se crean si es None)
+    profiler (SlowRequestProfiler o None): Perfilador opcional de peticiones lentas
+
+    Retorna:
+    RequestMetrics: Métricas registradas
+    """
+    server = dash_app.server
+    metrics = metrics or RequestMetrics()
+
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_profiler = profiler.start() if profiler else None
+
+    @server.after_request
+    def record_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None or request.path == '/metrics':
+            return response
+        elapsed = time.perf_counter() - start
+        handler = _handler_name(dash_app)
+
+        metrics.latency.observe(handler, elapsed)
+        metrics.request_bytes.observe(handler, request.content_length or 0)
+        response_size = response.content_length
+        if response_size is None and not response.is_streamed:
+            response_size = len(response.get_data())
+        metrics.response_bytes.observe(handler, response_size or 0)
+
+        active_profiler = g.pop('metrics_profiler', None)
+        if active_profiler is not None:
+            profiler.finish(active_profiler, handler, elapsed)
+        return response
+
+    @server.teardown_request
+    def stop_profiler(error=None):
+        # Si la petición terminó sin pasar por after_request, no dejar el perfilador activo
+        active_profiler = g.pop('metrics_profiler', None)
+        if active_profiler is not None:
+            active_profiler.disable()
+
+    @server.route('/metrics')
+    def export_metrics():
+        return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
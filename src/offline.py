@@ -0,0 +1,75 @@
+"""
+Caché sin conexión del panel con un service worker.
+
+El worker (``assets/service-worker.js``) guarda la página, los paquetes de
+componentes de Dash, los recursos de ``assets`` y el tema de Bootstrap para
+que el panel arranque sin red, y guarda el audio direccionado por contenido en
+una caché LRU limitada en tamaño. Se sirve desde la raíz y no como recurso de
+Dash porque el alcance de un service worker es el directorio de su URL.
+
+La versión de la caché del panel se calcula a partir del propio worker, las
+versiones de Dash y de dash-bootstrap-components y la fecha de modificación
+de los recursos, así que un despliegue nuevo descarta la caché anterior sin
+tocar el audio.
+"""
+import hashlib
+import os
+
+import dash
+import dash_bootstrap_components as dbc
+from flask import Blueprint, Response
+
+WORKER_FILENAME = 'service-worker.js'
+
+
+def shell_version(assets_folder):
+    """
+    Calcula la versión de la caché del panel.
+
+    Parámetros:
+    assets_folder (str): Directorio de recursos de la aplicación Dash
+
+    Retorna:
+    str: Huella corta que cambia con el worker, Dash o los recursos
+    """
+    digest = hashlib.sha256(f"{dash.__version__}:{dbc.__version__}".encode())
+    for name in sorted(os.listdir(assets_folder)):
+        path = os.path.join(assets_folder, name)
+        if os.path.isfile(path):
+            digest.update(f"{name}:{os.stat(path).st_mtime_ns}".encode())
+    with open(os.path.join(assets_folder, WORKER_FILENAME), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def create_service_worker_blueprint(dash_app, max_audio_bytes):
+    """
+    Crea el blueprint que sirve el service worker.
+
+    Rutas:
+    GET /service-worker.js    Worker con la versión y el límite de audio ya sustituidos
+
+    Parámetros:
+    dash_app (dash.Dash): Aplicación cuyos recursos contienen el worker
+    max_audio_bytes (int): Tamaño máximo de la caché de audio del navegador
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("offline", __name__)
+    assets_folder = dash_app.config.assets_folder
+
+    @bp.route("/service-worker.js")
+    def service_worker():
+        with open(os.path.join(assets_folder, WORKER_FILENAME), encoding='utf-8') as f:
+            source = f.read()
+        source = (source
+                  .replace('__CACHE_VERSION__', shell_version(assets_folder))
+                  .replace('__AUDIO_CACHE_MAX_BYTES__', str(int(max_audio_bytes))))
+        response = Response(source, mimetype='application/javascript')
+        # El navegador debe comprobar siempre si hay un worker nuevo
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Service-Worker-Allowed'] = '/'
+        return response
+
+    return bp
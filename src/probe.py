@@ -0,0 +1,371 @@
+"""
+Inspección de archivos de audio leyendo solo sus cabeceras.
+
+Identifica el formato (MP3, WAV, OGG, M4A, FLAC) por sus bytes mágicos y extrae la
+duración, la frecuencia de muestreo y el número de canales de las cabeceras
+del contenedor. Nunca se decodifica el audio ni se lee el archivo completo:
+se hacen unas pocas lecturas de tamaño fijo, así que el coste no depende del
+tamaño del archivo.
+
+Las lecturas pasan por una "fuente de bytes" con acceso aleatorio. Hay una
+para archivos en disco y otra para data URIs en base64, que decodifica solo
+los bloques de 4 caracteres que cubren el rango pedido.
+"""
+import base64
+import os
+import struct
+
+# Bytes que se leen del inicio para identificar el formato
+HEAD_BYTES = 8192
+
+# Bytes que se leen del final de un OGG para encontrar la última página
+OGG_TAIL_BYTES = 65536
+
+# Número máximo de cajas MP4 y de bloques RIFF que se recorren antes de desistir
+_MAX_MP4_BOXES = 256
+_MAX_WAV_CHUNKS = 64
+
+
+class ProbeError(ValueError):
+    """El contenido no es un archivo de audio reconocible."""
+
+
+class FileSource:
+    """
+    Fuente de bytes con acceso aleatorio sobre un archivo en disco.
+
+    El archivo se mantiene abierto durante toda la inspección; se usa como
+    gestor de contexto para cerrarlo al terminar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def read(self, offset, length):
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DataURISource:
+    """
+    Fuente de bytes sobre un data URI en base64, sin decodificarlo entero.
+
+    Parámetros:
+    contents (str): Data URI como 'data:audio/mpeg;base64,...'
+    """
+
+    def __init__(self, contents):
+        # Se guarda el texto original y el inicio del base64: copiarlo costaría O(n)
+        self.contents = contents
+        self.start = contents.index(',', 0, 256) + 1
+        padding = 2 if contents.endswith('==') else 1 if contents.endswith('=') else 0
+        self.size = (len(contents) - self.start) // 4 * 3 - padding
+
+    def read(self, offset, length):
+        offset = max(0, offset)
+        end = min(self.size, offset + length)
+        if end <= offset:
+            return b''
+        first_block, last_block = offset // 3, -(-end // 3)
+        chunk = base64.b64decode(self.contents[self.start + first_block * 4:self.start + last_block * 4])
+        skip = offset - first_block * 3
+        return chunk[skip:skip + end - offset]
+
+
+def decoded_size(contents):
+    """
+    Tamaño en bytes del contenido de un data URI en base64, sin decodificarlo.
+
+    Parámetros:
+    contents (str): Data URI en base64
+
+    Retorna:
+    int: Tamaño del archivo decodificado
+    """
+    return DataURISource(contents).size
+
+
+def sniff_format(head):
+    """
+    Identifica el formato de audio a partir de los primeros bytes.
+
+    Parámetros:
+    head (bytes): Inicio del archivo
+
+    Retorna:
+    str o None: 'wav', 'mp3', 'ogg', 'm4a', 'flac', o None si no se reconoce
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    if head[:3] == b'ID3' or _find_mp3_frame(head, 0) is not None:
+        return 'mp3'
+    return None
+
+
+def probe(source):
+    """
+    Extrae el formato y las propiedades básicas de un archivo de audio.
+
+    Parámetros:
+    source (FileSource o DataURISource): Fuente de bytes del archivo
+
+    Retorna:
+    dict: format, size, duration (segundos), sample_rate y channels;
+    duration, sample_rate o channels pueden ser None si la cabecera no los indica
+    """
+    head = source.read(0, HEAD_BYTES)
+    fmt = sniff_format(head)
+    if fmt is None:
+        raise ProbeError("Formato de audio no reconocido.")
+    info = {'format': fmt, 'size': source.size, 'duration': None, 'sample_rate': None, 'channels': None}
+    try:
+        info.update(_PARSERS[fmt](source, head))
+    except (struct.error, IndexError, ValueError) as error:
+        raise ProbeError(f"Cabecera {fmt.upper()} inválida: {error}") from error
+    return info
+
+
+def probe_file(path):
+    """Atajo de probe() para un archivo en disco."""
+    with FileSource(path) as source:
+        return probe(source)
+
+
+def probe_data_uri(contents):
+    """Atajo de probe() para un data URI en base64 como el de dcc.Upload."""
+    return probe(DataURISource(contents))
+
+
+# --- WAV ---
+
+def _parse_wav(source, head):
+    offset = 12
+    fmt = None
+    # Número de bloques acotado: un archivo malicioso no puede alargar el recorrido
+    for _ in range(_MAX_WAV_CHUNKS):
+        if offset + 8 > source.size:
+            break
+        chunk_id, chunk_size = struct.unpack('<4sI', source.read(offset, 8))
+        if chunk_size == 0 and chunk_id != b'data':
+            raise ValueError(f"bloque {chunk_id!r} vacío")
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', source.read(offset + 8, 16))
+        elif chunk_id == b'data':
+            if fmt is None:
+                break
+            _, channels, sample_rate, byte_rate, _, _ = fmt
+            data_size = min(chunk_size, source.size - offset - 8)
+            return {
+                'sample_rate': sample_rate,
+                'channels': channels,
+                'duration': data_size / byte_rate if byte_rate else None,
+            }
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("faltan los bloques 'fmt ' o 'data'")
+
+
+# --- MP3 ---
+
+_MP3_BITRATES = {
+    # (versión MPEG 1, capa III) y (MPEG 2/2.5, capa III), en kbit/s
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _parse_mp3_header(header):
+    """Decodifica la cabecera de 4 bytes de una trama MPEG capa III, o None."""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x3
+    layer_bits = (header[1] >> 1) & 0x3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x3
+    if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = _MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version_bits][rate_index]
+    channels = 1 if (header[3] >> 6) == 3 else 2
+    samples_per_frame = 1152 if mpeg1 else 576
+    padding = (header[2] >> 1) & 0x1
+    frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        'mpeg1': mpeg1, 'bitrate': bitrate, 'sample_rate': sample_rate, 'channels': channels,
+        'samples_per_frame': samples_per_frame, 'frame_length': frame_length,
+    }
+
+
+def _find_mp3_frame(data, start):
+    """Busca una trama válida seguida de otra trama válida (evita falsos positivos)."""
+    index = data.find(b'\xff', start)
+    while index != -1 and index + 4 <= len(data):
+        frame = _parse_mp3_header(data[index:index + 4])
+        if frame is not None:
+            following = index + frame['frame_length']
+            if following + 4 > len(data) or _parse_mp3_header(data[following:following + 4]) is not None:
+                return index, frame
+        index = data.find(b'\xff', index + 1)
+    return None
+
+
+def _parse_mp3(source, head):
+    audio_start = 0
+    if head[:3] == b'ID3':
+        # Tamaño "syncsafe" de la etiqueta ID3v2 (7 bits útiles por byte)
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+        head = source.read(audio_start, HEAD_BYTES)
+    else:
+        head = head[:HEAD_BYTES]
+
+    found = _find_mp3_frame(head, 0)
+    if found is None:
+        raise ValueError("no se encontró ninguna trama MPEG")
+    index, frame = found
+    audio_start += index
+
+    # Las cabeceras Xing/Info y VBRI indican el número total de tramas (VBR)
+    side_info = (32 if frame['channels'] == 2 else 17) if frame['mpeg1'] else (17 if frame['channels'] == 2 else 9)
+    frames = None
+    xing = head[index + 4 + side_info:index + 4 + side_info + 12]
+    if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 0x1:
+        frames = struct.unpack('>I', xing[8:12])[0]
+    vbri = head[index + 36:index + 36 + 18]
+    if frames is None and vbri[:4] == b'VBRI':
+        frames = struct.unpack('>I', vbri[14:18])[0]
+
+    if frames is not None:
+        duration = frames * frame['samples_per_frame'] / frame['sample_rate']
+    else:
+        duration = (source.size - audio_start) * 8 / frame['bitrate']
+    return {'sample_rate': frame['sample_rate'], 'channels': frame['channels'], 'duration': duration}
+
+
+# --- OGG (Vorbis / Opus) ---
+
+def _parse_ogg(source, head):
+    segments = head[26]
+    packet = head[27 + segments:27 + segments + 32]
+    if packet[:7] == b'\x01vorbis':
+        channels = packet[11]
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+        granule_rate, pre_skip = sample_rate, 0
+    elif packet[:8] == b'OpusHead':
+        channels = packet[9]
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        sample_rate = struct.unpack('<I', packet[12:16])[0] or 48000
+        # La posición de las páginas Opus siempre se cuenta a 48 kHz
+        granule_rate = 48000
+    else:
+        raise ValueError("códec OGG no soportado")
+
+    tail_start = max(0, source.size - OGG_TAIL_BYTES)
+    tail = source.read(tail_start, OGG_TAIL_BYTES)
+    last_page = tail.rfind(b'OggS')
+    duration = None
+    if last_page != -1 and last_page + 14 <= len(tail):
+        granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+        if granule > 0:
+            duration = max(granule - pre_skip, 0) / granule_rate
+    return {'sample_rate': sample_rate, 'channels': channels, 'duration': duration}
+
+
+# --- M4A (ISO BMFF) ---
+
+def _iter_boxes(source, start, end):
+    """Recorre las cajas MP4 entre ``start`` y ``end`` leyendo solo sus cabeceras."""
+    offset = start
+    for _ in range(_MAX_MP4_BOXES):
+        if offset + 8 > end:
+            return
+        size, box_type = struct.unpack('>I4s', source.read(offset, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', source.read(offset + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _find_box(source, start, end, path):
+    """Devuelve (inicio, fin) del contenido de la caja indicada por ``path``."""
+    for box_type, body_start, body_end in _iter_boxes(source, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return body_start, body_end
+            found = _find_box(source, body_start, body_end, path[1:])
+            if found is not None:
+                return found
+    return None
+
+
+def _parse_m4a(source, head):
+    moov = _find_box(source, 0, source.size, [b'moov'])
+    if moov is None:
+        raise ValueError("falta la caja 'moov'")
+
+    info = {}
+    mvhd = _find_box(source, moov[0], moov[1], [b'mvhd'])
+    if mvhd is not None:
+        version = source.read(mvhd[0], 1)[0]
+        if version == 1:
+            timescale, duration = struct.unpack('>IQ', source.read(mvhd[0] + 20, 12))
+        else:
+            timescale, duration = struct.unpack('>II', source.read(mvhd[0] + 12, 8))
+        if timescale:
+            info['duration'] = duration / timescale
+
+    for box_type, trak_start, trak_end in _iter_boxes(source, moov[0], moov[1]):
+        if box_type != b'trak':
+            continue
+        stsd = _find_box(source, trak_start, trak_end, [b'mdia', b'minf', b'stbl', b'stsd'])
+        if stsd is None:
+            continue
+        # stsd: versión/flags (4) + número de entradas (4) + primera entrada
+        entry = source.read(stsd[0] + 8, 36)
+        if entry[4:8] in (b'mp4a', b'alac', b'Opus', b'fLaC'):
+            info['channels'] = struct.unpack('>H', entry[24:26])[0]
+            info['sample_rate'] = struct.unpack('>I', entry[32:36])[0] >> 16
+            break
+    return info
+
+
+# --- FLAC ---
+
+def _parse_flac(source, head):
+    # El primer bloque de metadatos es siempre STREAMINFO (34 bytes)
+    if head[4] & 0x7F != 0:
+        raise ValueError("falta el bloque STREAMINFO")
+    info = head[8:42]
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return {'sample_rate': sample_rate, 'channels': channels, 'duration': duration}
+
+
+_PARSERS = {'wav': _parse_wav, 'mp3': _parse_mp3, 'ogg': _parse_ogg, 'm4a': _parse_m4a, 'flac': _parse_flac}
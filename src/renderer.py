@@ -0,0 +1,495 @@
+"""
+Renderizador en el servidor del estímulo de palabras fantasma.
+
+Reproduce con NumPy vectorizado el mismo grafo que ``processAudioWithDelay``
+construye en el navegador (assets/audio_processor.js): cambio de velocidad
+por remuestreo (como ``playbackRate``) o, si se pide conservar el tono, con
+el vocoder de fase de src/timestretch.py, repeticiones por mosaico y retraso
+con precisión de muestra. Los WAV resultantes se guardan en una caché LRU en disco
+indexada por (hash del audio, parámetros).
+
+Todos los modos se mezclan con el mismo motor de N voces: cada voz es una
+pista con su retraso y su posición panorámica, y la mezcla estéreo se hace
+por bloques de tiempo, cada uno un producto matricial (voces × muestras del
+bloque) por las ganancias de panorama. El coste crece linealmente con el
+número de pistas y, aparte de la salida, la memoria no depende de la
+duración del estímulo.
+"""
+import math
+import os
+
+import numpy as np
+from flask import Blueprint, abort, jsonify, request, send_file
+
+from src.audio_io import UndecodableAudio, audio_frames, load_audio, write_wav
+from src.cache import make_key
+from src.config import MAX_STIMULUS_SECONDS
+from src.timestretch import read_variant, stretch_to_cache, time_stretch
+
+# Límites que replican los controles del panel
+MAX_DELAY_MS = 500
+MAX_LOOPS = 100
+MIN_SPEED = 0.5
+MAX_SPEED = 2.0
+MAX_TRACKS = 8
+
+# Muestras de cada bloque de la mezcla: la matriz (voces × bloque) ocupa unos pocos MB
+MIX_BLOCK_SAMPLES = 65536
+
+
+class StimulusTooLong(ValueError):
+    """El estímulo pedido supera la duración máxima que se renderiza."""
+
+
+class InvalidRenderParams(ValueError):
+    """Un parámetro numérico de la consulta no es un número finito."""
+
+
+def apply_speed(samples, speed, preserve_pitch=False):
+    """
+    Cambia la velocidad de reproducción como lo hace ``playbackRate``.
+
+    La señal se lee a ``speed`` muestras por muestra de salida con
+    interpolación lineal, por lo que también cambia el tono, salvo que
+    ``preserve_pitch`` sea True.
+
+    Parámetros:
+    samples (np.ndarray): Señal mono
+    speed (float): Factor de velocidad (1.0 = original)
+    preserve_pitch (bool): Si es True, estira la señal sin cambiar el tono
+
+    Retorna:
+    np.ndarray: Señal de longitud ``len(samples) / speed``
+    """
+    if speed == 1.0:
+        return samples
+    if preserve_pitch:
+        return time_stretch(samples, speed)
+    n_out = int(np.floor(len(samples) / speed))
+    positions = np.arange(n_out, dtype=np.float64) * speed
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def loop_to_length(samples, length):
+    """
+    Repite una señal en bucle hasta cubrir exactamente ``length`` muestras.
+
+    Parámetros:
+    samples (np.ndarray): Señal mono
+    length (int): Longitud deseada
+
+    Retorna:
+    np.ndarray: Señal repetida y recortada
+    """
+    if length <= 0 or len(samples) == 0:
+        return np.zeros(max(length, 0), dtype=np.float32)
+    repeats = -(-length // len(samples))
+    return np.tile(samples, repeats)[:length]
+
+
+def delay_samples(delay_ms, sample_rate):
+    """Convierte un retraso en milisegundos a un número entero de muestras."""
+    return int(round(delay_ms * sample_rate / 1000))
+
+
+def stimulus_length(len1, sample_rate, delay_ms, loops, speed1, len2=None, speed2=1.0):
+    """
+    Calcula la longitud en muestras del estímulo sin renderizarlo.
+
+    Parámetros:
+    len1 (int): Longitud de la pista 1 en muestras
+    sample_rate (int): Frecuencia de muestreo en Hz
+    delay_ms (float): Retraso entre canales en milisegundos
+    loops (int): Número de repeticiones
+    speed1 (float): Velocidad de la pista 1
+    len2 (int o None): Longitud de la pista 2 (None en modo de pista única)
+    speed2 (float): Velocidad de la pista 2
+
+    Retorna:
+    int: Número de muestras por canal
+    """
+    body = int(np.floor(len1 / speed1))
+    if len2 is not None:
+        body = max(body, int(np.floor(len2 / speed2)))
+    return delay_samples(delay_ms, sample_rate) + loops * body
+
+
+def render_stimulus(track1, sample_rate, delay_ms=200, loops=1, speed1=1.0,
+                    track2=None, speed2=1.0, swap_channels=False, preserve_pitch=False):
+    """
+    Renderiza el estímulo estéreo de palabras fantasma.
+
+    En modo de pista única la pista suena sin retraso en el canal izquierdo y
+    retrasada en el derecho. En modo dual cada pista ocupa un canal (la pista 1
+    a la izquierda salvo que ``swap_channels`` sea True) y ambas pasan por un
+    retraso, igual que en el navegador. Las pistas se repiten hasta
+    ``loops`` veces la duración de la más larga.
+
+    Parámetros:
+    track1 (np.ndarray): Señal mono de la pista 1
+    sample_rate (int): Frecuencia de muestreo común de las pistas
+    delay_ms (float): Retraso en milisegundos
+    loops (int): Número de repeticiones
+    speed1 (float): Velocidad de la pista 1
+    track2 (np.ndarray o None): Señal mono de la pista 2 (modo dual)
+    speed2 (float): Velocidad de la pista 2
+    swap_channels (bool): Si es True, la pista 1 va al canal derecho
+    preserve_pitch (bool): Si es True, la velocidad cambia sin cambiar el tono
+
+    Retorna:
+    np.ndarray: Estímulo float32 de forma (muestras, 2)
+    """
+    delay = delay_samples(delay_ms, sample_rate)
+    first = apply_speed(track1, speed1, preserve_pitch)
+    second = apply_speed(track2, speed2, preserve_pitch) if track2 is not None else None
+    return assemble_stimulus(first, delay, loops, second, swap_channels)
+
+
+def assemble_stimulus(first, delay, loops, second=None, swap_channels=False):
+    """
+    Construye el estímulo a partir de pistas a las que ya se aplicó la velocidad.
+
+    Permite reutilizar las pistas remuestreadas cuando se generan muchas
+    variantes con las mismas velocidades (ver src/batch.py).
+
+    Parámetros:
+    first (np.ndarray): Pista 1 ya remuestreada
+    delay (int): Retraso en muestras
+    loops (int): Número de repeticiones
+    second (np.ndarray o None): Pista 2 ya remuestreada (modo dual)
+    swap_channels (bool): Si es True, la pista 1 va al canal derecho
+
+    Retorna:
+    np.ndarray: Estímulo float32 de forma (muestras, 2)
+    """
+    if second is None:
+        # La misma pista sin retraso a la izquierda y retrasada a la derecha
+        return assemble_mix([(first, 0, -1.0), (first, delay, 1.0)], loops)
+
+    pan1, pan2 = (1.0, -1.0) if swap_channels else (-1.0, 1.0)
+    return assemble_mix([(first, delay, pan1), (second, delay, pan2)], loops)
+
+
+def pan_gains(pans):
+    """
+    Ganancias izquierda/derecha de potencia constante para cada posición panorámica.
+
+    Usa la misma ley que ``StereoPannerNode`` en el navegador.
+
+    Parámetros:
+    pans (sequence): Posiciones entre -1 (izquierda) y 1 (derecha)
+
+    Retorna:
+    np.ndarray: Ganancias float32 de forma (voces, 2)
+    """
+    angles = (np.clip(np.asarray(pans, dtype=np.float64), -1.0, 1.0) + 1) * np.pi / 4
+    gains = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    # cos(pi/2) no es exactamente cero: los extremos quedan en un solo canal
+    gains[gains < 1e-7] = 0.0
+    return gains.astype(np.float32)
+
+
+def mix_length(lengths, delays, loops):
+    """
+    Longitud en muestras de la mezcla de varias voces, sin renderizarla.
+
+    Parámetros:
+    lengths (sequence): Longitud de cada voz ya remuestreada
+    delays (sequence): Retraso de cada voz en muestras
+    loops (int): Número de repeticiones
+
+    Retorna:
+    int: Número de muestras por canal
+    """
+    return max(delays) + loops * max(lengths)
+
+
+def _copy_looped(samples, position, dest):
+    # Copia en ``dest`` la señal repetida en bucle a partir de ``position``, por tramos contiguos
+    offset = position % len(samples)
+    filled = 0
+    while filled < len(dest):
+        take = min(len(samples) - offset, len(dest) - filled)
+        dest[filled:filled + take] = samples[offset:offset + take]
+        filled += take
+        offset = 0
+
+
+def assemble_mix(voices, loops):
+    """
+    Mezcla en estéreo varias voces con retraso y panorama propios.
+
+    Cada voz se repite hasta ``loops`` veces la duración de la voz más larga y
+    empieza tras su retraso. La salida se rellena por bloques de
+    MIX_BLOCK_SAMPLES: en cada uno las voces se colocan en una matriz
+    (voces × bloque) y se mezclan con un solo producto matricial, así que no
+    se reserva una matriz (voces × muestras) del estímulo entero.
+
+    Parámetros:
+    voices (list): Tuplas (señal ya remuestreada, retraso en muestras, panorama de -1 a 1)
+    loops (int): Número de repeticiones
+
+    Retorna:
+    np.ndarray: Estímulo float32 de forma (muestras, 2)
+    """
+    body_length = loops * max(len(samples) for samples, _, _ in voices)
+    length = mix_length([len(samples) for samples, _, _ in voices], [delay for _, delay, _ in voices], loops)
+    gains = pan_gains([pan for _, _, pan in voices])
+    out = np.empty((length, 2), dtype=np.float32)
+    block = np.zeros((len(voices), MIX_BLOCK_SAMPLES), dtype=np.float32)
+    for start in range(0, length, MIX_BLOCK_SAMPLES):
+        stop = min(start + MIX_BLOCK_SAMPLES, length)
+        block[:, :stop - start] = 0.0
+        for row, (samples, delay, _) in zip(block, voices):
+            first, last = max(start, delay), min(stop, delay + body_length)
+            if first < last and len(samples):
+                _copy_looped(samples, first - delay, row[first - start:last - start])
+        np.matmul(gains.T, block[:, :stop - start], out=out[start:stop].T)
+    return out
+
+
+def render_mix(tracks, sample_rate, voices, loops=1, preserve_pitch=False):
+    """
+    Renderiza el estímulo de N pistas con retraso, velocidad y panorama por pista.
+
+    Parámetros:
+    tracks (list): Señales mono, todas a ``sample_rate``
+    sample_rate (int): Frecuencia de muestreo común de las pistas
+    voices (list): Diccionarios con 'track' (índice en ``tracks``), 'delay_ms', 'speed' y 'pan'
+    loops (int): Número de repeticiones
+    preserve_pitch (bool): Si es True, la velocidad cambia sin cambiar el tono
+
+    Retorna:
+    np.ndarray: Estímulo float32 de forma (muestras, 2)
+    """
+    # Cada combinación (pista, velocidad) se remuestrea una sola vez
+    resampled = {}
+    for voice in voices:
+        key = (voice['track'], voice['speed'])
+        if key not in resampled:
+            resampled[key] = apply_speed(tracks[voice['track']], voice['speed'], preserve_pitch)
+    return assemble_mix([
+        (resampled[voice['track'], voice['speed']], delay_samples(voice['delay_ms'], sample_rate), voice['pan'])
+        for voice in voices
+    ], loops)
+
+
+def parse_render_params(args, strict=False):
+    """
+    Lee y valida los parámetros de render de una consulta HTTP.
+
+    Con ``mode=multi`` la consulta lleva listas separadas por comas
+    (``tracks``, ``delays``, ``speeds`` y ``pans``) con un valor por pista; si
+    no, los parámetros de los modos de pista única y dual. ``pitch=1`` conserva
+    el tono al cambiar la velocidad.
+
+    Parámetros:
+    args (werkzeug.datastructures.MultiDict): Parámetros de la consulta
+    strict (bool): Si es True, un valor que no es finito (``nan``, ``inf``)
+    lanza InvalidRenderParams; si no, se usa el valor por defecto
+
+    Retorna:
+    dict: Parámetros normalizados (valores fuera de rango se recortan)
+    """
+    def finite(value, default):
+        # min y max dejan pasar NaN sin recortarlo
+        if math.isfinite(value):
+            return value
+        if strict:
+            raise InvalidRenderParams("Los parámetros numéricos deben ser números finitos.")
+        return default
+
+    def clamp(value, low, high, default):
+        return min(max(finite(value, default), low), high)
+
+    loops = clamp(args.get('loops', 1, type=int), 1, MAX_LOOPS, 1)
+    preserve_pitch = args.get('pitch', '0') == '1'
+
+    if args.get('mode') == 'multi':
+        def values(name, cast, default):
+            items = [item for item in args.get(name, '').split(',') if item]
+            parsed = []
+            for item in items[:MAX_TRACKS]:
+                try:
+                    value = cast(item)
+                except ValueError:
+                    value = default
+                if cast is float:
+                    # int(nan) fallaría al convertir el retraso
+                    value = finite(value, default)
+                parsed.append(value)
+            return parsed
+
+        tracks = values('tracks', str, '')
+        delays = values('delays', float, 0)
+        speeds = values('speeds', float, 1.0)
+        pans = values('pans', float, 0.0)
+        return {
+            'mode': 'multi',
+            'tracks': tracks,
+            'voices': [
+                {
+                    'track': i,
+                    'delay_ms': int(clamp(delays[i] if i < len(delays) else 0, 0, MAX_DELAY_MS, 0)),
+                    'speed': round(clamp(speeds[i] if i < len(speeds) else 1.0, MIN_SPEED, MAX_SPEED, 1.0), 2),
+                    'pan': round(clamp(pans[i] if i < len(pans) else 0.0, -1.0, 1.0, 0.0), 2),
+                }
+                for i in range(len(tracks))
+            ],
+            'loops': loops,
+            'preserve_pitch': preserve_pitch,
+        }
+
+    track2 = args.get('track2') or None
+    return {
+        'track1': args.get('track1', ''),
+        'track2': track2,
+        'delay_ms': clamp(args.get('delay', 200, type=int), 0, MAX_DELAY_MS, 200),
+        'loops': loops,
+        'speed1': round(clamp(args.get('speed1', 1.0, type=float), MIN_SPEED, MAX_SPEED, 1.0), 2),
+        'speed2': round(clamp(args.get('speed2', 1.0, type=float), MIN_SPEED, MAX_SPEED, 1.0), 2) if track2 else 1.0,
+        'swap_channels': args.get('swap', '0') == '1' and track2 is not None,
+        'preserve_pitch': preserve_pitch,
+    }
+
+
+def check_length(length, sample_rate, max_seconds):
+    """Lanza StimulusTooLong si ``length`` muestras superan ``max_seconds``."""
+    if length > max_seconds * sample_rate:
+        raise StimulusTooLong(
+            f"El estímulo duraría {length / sample_rate:.0f} s; el máximo es {max_seconds:.0f} s.")
+
+
+def _voice_track(store, stretch_cache, info, speed, sample_rate, preserve_pitch):
+    # Las variantes que conservan el tono se leen de la caché por (hash, velocidad)
+    # en lugar de volver a pasar el vocoder de fase por la pista entera
+    if preserve_pitch and speed != 1.0 and stretch_cache is not None:
+        return read_variant(stretch_to_cache(store, stretch_cache, info['id'], speed, sample_rate))
+    return apply_speed(load_audio(info['path'], sample_rate)[0], speed, preserve_pitch)
+
+
+def render_to_cache(store, cache, params, max_seconds=MAX_STIMULUS_SECONDS, stretch_cache=None):
+    """
+    Devuelve la ruta del WAV para ``params``, renderizándolo solo si no está en caché.
+
+    La duración del estímulo se calcula a partir de las cabeceras de las
+    pistas antes de decodificarlas, así que una petición demasiado larga se
+    rechaza sin reservar memoria.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de donde se leen las pistas
+    cache (src.cache.DiskLRUCache): Caché de estímulos renderizados
+    params (dict): Parámetros devueltos por parse_render_params
+    max_seconds (float): Duración máxima del estímulo
+    stretch_cache (src.cache.DiskLRUCache o None): Caché de variantes que
+    conservan el tono (ver src/timestretch.py); None las calcula cada vez
+
+    Retorna:
+    str o None: Ruta del WAV, o None si alguna pista no existe
+    """
+    if params.get('mode') == 'multi':
+        return _render_mix_to_cache(store, cache, params, max_seconds, stretch_cache)
+
+    info1 = store.info(params['track1'])
+    info2 = store.info(params['track2']) if params['track2'] else None
+    if info1 is None or (params['track2'] and info2 is None):
+        return None
+
+    len1, sample_rate = audio_frames(info1['path'])
+    len2 = audio_frames(info2['path'], sample_rate)[0] if info2 else None
+    check_length(stimulus_length(len1, sample_rate, params['delay_ms'], params['loops'], params['speed1'],
+                                 len2, params['speed2']), sample_rate, max_seconds)
+
+    hashes = [info1['sha256'], info2['sha256'] if info2 else None]
+    key = make_key('stimulus', hashes, {k: v for k, v in params.items() if not k.startswith('track')})
+
+    def write(path):
+        # Mismo resultado que render_stimulus, con las pistas ya a su velocidad
+        first = _voice_track(store, stretch_cache, info1, params['speed1'], sample_rate, params['preserve_pitch'])
+        second = None
+        if info2:
+            second = _voice_track(store, stretch_cache, info2, params['speed2'], sample_rate, params['preserve_pitch'])
+        stimulus = assemble_stimulus(first, delay_samples(params['delay_ms'], sample_rate), params['loops'],
+                                     second, params['swap_channels'])
+        write_wav(path, stimulus, sample_rate)
+
+    return cache.get_or_create(key, write)
+
+
+def _render_mix_to_cache(store, cache, params, max_seconds, stretch_cache):
+    infos = [store.info(track) for track in params['tracks']]
+    if not infos or any(info is None for info in infos):
+        return None
+
+    sample_rate = audio_frames(infos[0]['path'])[1]
+    lengths = [audio_frames(info['path'], sample_rate)[0] for info in infos]
+    voices = params['voices']
+    check_length(mix_length([int(np.floor(lengths[voice['track']] / voice['speed'])) for voice in voices],
+                            [delay_samples(voice['delay_ms'], sample_rate) for voice in voices],
+                            params['loops']), sample_rate, max_seconds)
+
+    key = make_key('mix', [info['sha256'] for info in infos], params['voices'], params['loops'],
+                   params['preserve_pitch'])
+
+    def write(path):
+        # Como render_mix: todas las pistas a la frecuencia de la primera y cada
+        # combinación (pista, velocidad) una sola vez
+        resampled = {}
+        for voice in voices:
+            key = (voice['track'], voice['speed'])
+            if key not in resampled:
+                resampled[key] = _voice_track(store, stretch_cache, infos[voice['track']], voice['speed'],
+                                              sample_rate, params['preserve_pitch'])
+        stimulus = assemble_mix([
+            (resampled[voice['track'], voice['speed']], delay_samples(voice['delay_ms'], sample_rate), voice['pan'])
+            for voice in voices
+        ], params['loops'])
+        write_wav(path, stimulus, sample_rate)
+
+    return cache.get_or_create(key, write)
+
+
+def create_render_blueprint(store, cache, stretch_cache=None):
+    """
+    Crea el blueprint con la ruta de descarga de estímulos renderizados.
+
+    Rutas:
+    GET /render/stimulus.wav?track1=<id>&track2=<id>&delay=..&loops=..&speed1=..&speed2=..&swap=0|1&pitch=0|1
+    GET /render/stimulus.wav?mode=multi&tracks=<id>,<id>,..&delays=..&speeds=..&pans=..&loops=..&pitch=0|1
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de estímulos renderizados
+    stretch_cache (src.cache.DiskLRUCache o None): Caché de variantes que conservan el tono
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("renderer", __name__)
+
+    @bp.errorhandler(UndecodableAudio)
+    def handle_undecodable(error):
+        return jsonify({'error': str(error)}), 415
+
+    @bp.route("/render/stimulus.wav")
+    def download_stimulus():
+        try:
+            params = parse_render_params(request.args, strict=True)
+        except InvalidRenderParams as error:
+            abort(400, description=str(error))
+        try:
+            path = render_to_cache(store, cache, params, stretch_cache=stretch_cache)
+        except StimulusTooLong as error:
+            abort(413, description=str(error))
+        if path is None:
+            abort(404)
+        if params.get('mode') == 'multi':
+            download_name = "estimulo_{}pistas_x{}.wav".format(len(params['tracks']), params['loops'])
+        else:
+            download_name = "estimulo_{delay_ms}ms_x{loops}.wav".format(**params)
+        return send_file(path, mimetype='audio/wav', as_attachment=True,
+                         download_name=download_name, conditional=True,
+                         etag=os.path.splitext(os.path.basename(path))[0])
+
+    return bp
+
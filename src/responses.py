@@ -0,0 +1,327 @@
+"""
+Registro de las respuestas de los participantes.
+
+Cada respuesta guarda la palabra que el participante dice haber oído junto con
+los parámetros del estímulo que sonaba: modo de pista, pistas, retraso,
+repeticiones, velocidades y la asignación de canales elegida al azar en el
+navegador.
+
+Las peticiones no escriben en la base de datos: ``record`` solo encola la
+respuesta y un hilo escritor por proceso la guarda por lotes en SQLite en modo
+WAL, con una sola transacción por lote. Así muchos participantes simultáneos
+no se serializan en un commit por petición. La exportación agrega las
+respuestas con pandas, de forma vectorizada.
+"""
+import atexit
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import Blueprint, Response, jsonify, request
+
+# Respuestas máximas por transacción y espera máxima para completar un lote
+BATCH_SIZE = 500
+FLUSH_SECONDS = 0.2
+
+# Espera máxima al salir del proceso para escribir las respuestas pendientes
+EXIT_FLUSH_SECONDS = 10
+
+# Espera máxima de la exportación a que se escriban las respuestas encoladas
+EXPORT_FLUSH_SECONDS = 10
+
+# Longitud máxima de la palabra y del id de participante
+MAX_WORD_LENGTH = 100
+MAX_PARTICIPANT_LENGTH = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    participant TEXT,
+    word TEXT NOT NULL,
+    track_mode TEXT,
+    tracks TEXT,
+    delay_ms REAL,
+    loops INTEGER,
+    speeds TEXT,
+    swap_channels INTEGER,
+    preserve_pitch INTEGER,
+    voices TEXT,
+    stimulus TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+_COLUMNS = ('created', 'participant', 'word', 'track_mode', 'tracks', 'delay_ms', 'loops',
+            'speeds', 'swap_channels', 'preserve_pitch', 'voices', 'stimulus')
+
+# Columnas que identifican un estímulo al agregar las respuestas
+STIMULUS_COLUMNS = ['track_mode', 'tracks', 'delay_ms', 'loops', 'speeds', 'swap_channels', 'preserve_pitch']
+
+
+def normalize_word(word):
+    """
+    Normaliza la palabra escrita por el participante para poder agregarla.
+
+    Parámetros:
+    word (str): Texto de la respuesta
+
+    Retorna:
+    str: Texto en minúsculas, sin espacios sobrantes y recortado
+    """
+    return " ".join(str(word).split()).lower()[:MAX_WORD_LENGTH]
+
+
+def response_row(word, stimulus, participant=None, created=None):
+    """
+    Convierte una respuesta en la fila que se guarda en la base de datos.
+
+    Parámetros:
+    word (str): Palabra que el participante dice haber oído
+    stimulus (dict): Parámetros del estímulo publicados por el navegador
+    participant (str o None): Id del participante
+    created (float o None): Marca de tiempo; por defecto, la actual
+
+    Retorna:
+    tuple: Valores en el orden de las columnas de la tabla
+    """
+    def number(value, cast):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    swap = stimulus.get('swap_channels')
+    return (
+        time.time() if created is None else created,
+        (str(participant).strip()[:MAX_PARTICIPANT_LENGTH] or None) if participant else None,
+        normalize_word(word),
+        stimulus.get('track_mode'),
+        json.dumps(stimulus.get('tracks') or []),
+        number(stimulus.get('delay_ms'), float),
+        number(stimulus.get('loops'), int),
+        json.dumps(stimulus.get('speeds') or []),
+        None if swap is None else int(bool(swap)),
+        int(bool(stimulus.get('preserve_pitch'))),
+        json.dumps(stimulus.get('voices') or []),
+        json.dumps(stimulus),
+    )
+
+
+class ResponseLog:
+    """
+    Registro de respuestas con escritura por lotes en segundo plano.
+
+    Parámetros:
+    db_path (str): Ruta de la base de datos SQLite
+    batch_size (int): Respuestas máximas por transacción
+    flush_seconds (float): Espera máxima para completar un lote
+    """
+
+    def __init__(self, db_path, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        # En WAL basta con sincronizar en los checkpoints
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, word, stimulus, participant=None):
+        """
+        Encola una respuesta; se escribe en el siguiente lote.
+
+        Parámetros:
+        word (str): Palabra que el participante dice haber oído
+        stimulus (dict): Parámetros del estímulo publicados por el navegador
+        participant (str o None): Id del participante
+        """
+        self._queue.put(response_row(word, stimulus, participant))
+        self._ensure_writer()
+
+    def flush(self, timeout=None):
+        """
+        Espera a que todas las respuestas encoladas en este proceso estén escritas.
+
+        Parámetros:
+        timeout (float o None): Espera máxima en segundos (None = sin límite)
+
+        Retorna:
+        bool: True si ya no quedan respuestas pendientes
+        """
+        if self._pid != os.getpid():
+            return True
+        waiter = threading.Thread(target=self._queue.join, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+    def _ensure_writer(self):
+        # Los hilos no sobreviven a fork(): cada proceso arranca el suyo
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._write_loop, name="response-writer", daemon=True).start()
+            atexit.register(self.flush, timeout=EXIT_FLUSH_SECONDS)
+
+    def _write_loop(self):
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        sql = f"INSERT INTO responses ({', '.join(_COLUMNS)}) VALUES ({placeholders})"
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(sql, batch)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # Se reintenta el lote completo en la siguiente vuelta
+                for row in batch:
+                    self._queue.put(row)
+                time.sleep(self.flush_seconds)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def count(self):
+        """
+        Número de respuestas ya escritas.
+
+        Retorna:
+        int: Filas de la tabla de respuestas
+        """
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        finally:
+            conn.close()
+
+    def dataframe(self, since=None):
+        """
+        Lee las respuestas escritas como un DataFrame.
+
+        Parámetros:
+        since (float o None): Solo respuestas posteriores a esta marca de tiempo
+
+        Retorna:
+        pandas.DataFrame: Una fila por respuesta
+        """
+        import pandas as pd
+
+        conn = self._connect()
+        try:
+            query = f"SELECT id, {', '.join(_COLUMNS)} FROM responses"
+            if since is not None:
+                return pd.read_sql_query(query + " WHERE created >= ? ORDER BY id", conn, params=(since,))
+            return pd.read_sql_query(query + " ORDER BY id", conn)
+        finally:
+            conn.close()
+
+    def aggregate(self, since=None):
+        """
+        Agrega las respuestas por estímulo y palabra.
+
+        Parámetros:
+        since (float o None): Solo respuestas posteriores a esta marca de tiempo
+
+        Retorna:
+        pandas.DataFrame: Columnas del estímulo, palabra, respuestas, participantes
+        distintos, proporción de la palabra entre las respuestas al estímulo y
+        marcas de tiempo de la primera y la última respuesta
+        """
+        return aggregate_responses(self.dataframe(since))
+
+
+def aggregate_responses(frame):
+    """
+    Agrega un DataFrame de respuestas por estímulo y palabra, de forma vectorizada.
+
+    Parámetros:
+    frame (pandas.DataFrame): Respuestas leídas con ResponseLog.dataframe
+
+    Retorna:
+    pandas.DataFrame: Ver ResponseLog.aggregate
+    """
+    keys = STIMULUS_COLUMNS + ['word']
+    # Los nulos también son un valor del estímulo (p. ej. swap_channels en multipista)
+    grouped = frame.groupby(keys, dropna=False, sort=True).agg(
+        responses=('id', 'size'),
+        participants=('participant', 'nunique'),
+        first_response=('created', 'min'),
+        last_response=('created', 'max'),
+    ).reset_index()
+    totals = grouped.groupby(STIMULUS_COLUMNS, dropna=False)['responses'].transform('sum')
+    grouped['share'] = grouped['responses'] / totals
+    return grouped.sort_values(STIMULUS_COLUMNS + ['responses'], ascending=[True] * len(STIMULUS_COLUMNS) + [False],
+                               na_position='first', ignore_index=True)
+
+
+def create_responses_blueprint(log, flush_timeout=EXPORT_FLUSH_SECONDS):
+    """
+    Crea el blueprint para registrar y exportar respuestas.
+
+    Rutas:
+    POST /responses                 Registra {"word": ..., "participant": ..., "stimulus": {...}}
+    GET  /responses/export.csv      Respuestas agregadas por estímulo y palabra
+                                    (``raw=1``: una fila por respuesta; ``since``: marca de tiempo);
+                                    503 si las respuestas encoladas no se pueden escribir a tiempo
+
+    Parámetros:
+    log (ResponseLog): Registro de respuestas
+    flush_timeout (float): Espera máxima de la exportación a las respuestas encoladas
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("responses", __name__)
+
+    @bp.route("/responses", methods=["POST"])
+    def submit_response():
+        payload = request.get_json(silent=True) or {}
+        word = normalize_word(payload.get('word') or '')
+        stimulus = payload.get('stimulus')
+        if not word or not isinstance(stimulus, dict):
+            return jsonify({'error': "Faltan la palabra o los parámetros del estímulo."}), 400
+        log.record(word, stimulus, payload.get('participant'))
+        return jsonify({'status': 'queued'}), 202
+
+    @bp.route("/responses/export.csv")
+    def export_responses():
+        since = request.args.get('since', type=float)
+        # Las respuestas aún encoladas en este proceso se incluyen en la exportación; si el
+        # escritor no avanza (base de datos bloqueada, disco lleno) no se espera indefinidamente
+        if not log.flush(timeout=flush_timeout):
+            return jsonify({'error': "Hay respuestas pendientes de escribir. Inténtelo de nuevo."}), 503
+        frame = log.dataframe(since) if request.args.get('raw') == '1' else log.aggregate(since)
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False)
+        return Response(buffer.getvalue(), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=respuestas.csv'})
+
+    return bp
@@ -0,0 +1,104 @@
+"""
+Modo de producción del servidor.
+
+Ejecuta ``app.server`` bajo un servidor WSGI con varios procesos e hilos
+(gunicorn en Linux/macOS, waitress en Windows), comprime las respuestas de
+texto (JSON de los callbacks, HTML, JS y CSS) con brotli o gzip y marca como
+inmutables los recursos de ``assets`` cuya URL incluye la huella ``?m=`` que
+Dash añade a partir de la fecha de modificación del archivo.
+"""
+import os
+import sys
+
+from flask import request
+from flask_compress import Compress
+
+# Un año: los recursos con huella cambian de URL cuando cambia su contenido
+IMMUTABLE_MAX_AGE = 31536000
+
+# Tipos MIME que se comprimen; el audio ya está comprimido y se sirve por rangos
+COMPRESS_MIMETYPES = [
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'image/svg+xml',
+]
+
+
+def configure_production(dash_app):
+    """
+    Activa la compresión y las cabeceras de caché de producción.
+
+    Parámetros:
+    dash_app (dash.Dash): Aplicación cuyo servidor Flask se configura
+    """
+    server = dash_app.server
+    server.config.update(
+        COMPRESS_ALGORITHM=['br', 'gzip'],
+        COMPRESS_ALGORITHM_STREAMING=['br', 'gzip'],
+        COMPRESS_MIMETYPES=COMPRESS_MIMETYPES,
+        COMPRESS_MIN_SIZE=500,
+    )
+    Compress(server)
+
+    assets_prefix = dash_app.config.requests_pathname_prefix + dash_app.config.assets_url_path.lstrip('/') + '/'
+
+    @server.after_request
+    def cache_assets(response):
+        if request.path.startswith(assets_prefix) and response.status_code in (200, 304):
+            if request.args.get('m'):
+                response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            else:
+                # Sin huella el navegador debe revalidar (responde 304 si no cambió)
+                response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def run_gunicorn(server, host, port, workers, threads):
+    """Sirve la aplicación con gunicorn usando procesos con hilos (gthread)."""
+    from gunicorn.app.base import BaseApplication
+
+    class DashApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            # La aplicación se importa una vez y los procesos la heredan al bifurcarse
+            self.cfg.set('preload_app', True)
+            self.cfg.set('timeout', 120)
+
+        def load(self):
+            return server
+
+    DashApplication().run()
+
+
+def run_waitress(server, host, port, threads):
+    """Sirve la aplicación con waitress (un proceso con varios hilos)."""
+    from waitress import serve
+    serve(server, host=host, port=port, threads=threads)
+
+
+def serve_production(dash_app, host="0.0.0.0", port=8050, workers=None, threads=None):
+    """
+    Sirve la aplicación en modo de producción.
+
+    Parámetros:
+    dash_app (dash.Dash): Aplicación a servir
+    host (str): Dirección de escucha
+    port (int): Puerto de escucha
+    workers (int o None): Procesos (por defecto 2 × núcleos + 1)
+    threads (int o None): Hilos por proceso (por defecto 4)
+    """
+    workers = workers or int(os.environ.get('PHANTOMWORDS_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+    threads = threads or int(os.environ.get('PHANTOMWORDS_THREADS', 4))
+    configure_production(dash_app)
+
+    if sys.platform == 'win32':
+        # gunicorn no funciona en Windows: un proceso con todos los hilos
+        run_waitress(dash_app.server, host, port, workers * threads)
+    else:
+        run_gunicorn(dash_app.server, host, port, workers, threads)
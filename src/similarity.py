@@ -0,0 +1,294 @@
+"""
+Índice de similitud entre clips por su huella en bandas de Bark.
+
+Para diseñar pares de palabras fantasma interesan los clips cuyos espectros se
+solapan en las mismas bandas críticas. Cada clip se reduce a una huella de 24
+valores: la raíz cuadrada de la fracción de su energía media que cae en cada
+banda de ``BARK_BAND_EDGES``. Las huellas tienen norma 1, así que el coseno
+entre dos de ellas es el coeficiente de Bhattacharyya de sus distribuciones de
+energía por banda: 1 si la reparten igual y 0 si no comparten ninguna banda.
+
+Las huellas se guardan en una matriz float32 contigua (``fingerprints.npy``)
+junto con un índice JSON de los clips, y una consulta es un solo producto
+matriz-vector seguido de ``np.argpartition``: decenas de miles de clips se
+recorren en milisegundos. Reconstruir el índice solo vuelve a analizar los
+clips nuevos o modificados, y los procesos que ya lo tenían cargado leen la
+versión nueva en su siguiente consulta.
+
+Uso:
+    poetry run similar-clips build src/audios data/corpus
+    poetry run similar-clips query src/audios/No_lo_es.mp3 -k 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.analysis import analyze_bark_bands
+from src.audio_io import find_clips
+from src.bark import BARK_BAND_CENTERS
+from src.config import BUNDLED_AUDIO_DIR, SIMILARITY_INDEX_DIR
+from src.storage import file_sha256
+
+# Resultados por defecto de una consulta
+DEFAULT_TOP_K = 10
+
+# Incrementar al cambiar la huella para invalidar los índices guardados
+_FINGERPRINT_VERSION = 1
+
+
+def fingerprint_from_energy(energy_db):
+    """
+    Reduce un mapa de energía por bandas a una huella de norma 1.
+
+    Parámetros:
+    energy_db (np.ndarray): Energía en dB de forma (24, columnas), como la de analyze_bark_bands
+
+    Retorna:
+    np.ndarray: Huella float32 de forma (24,); ceros si el audio es silencio
+    """
+    power = np.mean(10 ** (np.asarray(energy_db, dtype=np.float64) / 10), axis=1)
+    total = power.sum()
+    if total <= 0:
+        return np.zeros(len(BARK_BAND_CENTERS), dtype=np.float32)
+    return np.sqrt(power / total).astype(np.float32)
+
+
+def bark_fingerprint(path):
+    """
+    Calcula la huella de un archivo de audio.
+
+    Parámetros:
+    path (str): Ruta del archivo
+
+    Retorna:
+    np.ndarray: Huella float32 de forma (24,)
+    """
+    # Con una sola columna el análisis promedia todas las ventanas del archivo
+    return fingerprint_from_energy(analyze_bark_bands(path, max_columns=1)['energy_db'])
+
+
+def _fingerprint_task(path):
+    # Se ejecuta en el pool de procesos: huella y hash del clip
+    return bark_fingerprint(path), file_sha256(path)
+
+
+def top_k(matrix, queries, k=DEFAULT_TOP_K, exclude=None):
+    """
+    Los ``k`` clips más parecidos a cada huella consultada.
+
+    Parámetros:
+    matrix (np.ndarray): Huellas del índice, de forma (clips, 24)
+    queries (np.ndarray): Una huella (24,) o varias (consultas, 24)
+    k (int): Resultados por consulta
+    exclude (np.ndarray o None): Máscara booleana (consultas, clips) de filas que no pueden devolverse
+
+    Retorna:
+    tuple: (índices, similitudes) de forma (consultas, k), de mayor a menor
+    similitud; con una sola huella, de forma (k,)
+    """
+    single = np.ndim(queries) == 1
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    scores = queries @ matrix.T
+    if exclude is not None:
+        scores[np.broadcast_to(exclude, scores.shape)] = -np.inf
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.zeros((len(queries), 0))
+        return (empty[0].astype(np.int64), empty[0]) if single else (empty.astype(np.int64), empty)
+
+    # Selección parcial de los k mejores y orden solo entre ellos
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    indices = np.take_along_axis(candidates, order, axis=1)
+    similarities = np.take_along_axis(candidate_scores, order, axis=1)
+    return (indices[0], similarities[0]) if single else (indices, similarities)
+
+
+class SimilarityIndex:
+    """
+    Huellas de un conjunto de clips guardadas en disco.
+
+    Parámetros:
+    index_dir (str): Directorio con ``fingerprints.npy`` y ``clips.json``
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.matrix_path = os.path.join(index_dir, 'fingerprints.npy')
+        self.clips_path = os.path.join(index_dir, 'clips.json')
+        self._loaded = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        """True si el índice ya se ha construido."""
+        return os.path.exists(self.matrix_path) and os.path.exists(self.clips_path)
+
+    def _file_stamp(self):
+        # Fecha de modificación y tamaño de los dos archivos, o None si falta alguno
+        try:
+            stats = os.stat(self.matrix_path), os.stat(self.clips_path)
+        except FileNotFoundError:
+            return None
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+    def load(self):
+        """
+        Lee el índice y lo conserva en memoria hasta que cambian sus archivos.
+
+        Si otro proceso (p. ej. el CLI) reconstruye el índice, la siguiente
+        llamada lee la versión nueva.
+
+        Retorna:
+        tuple: (matriz float32 de forma (clips, 24), lista de clips) o None si no existe
+        """
+        stamp = self._file_stamp()
+        if stamp is not None and stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._reload(stamp)
+        return self._loaded
+
+    def _reload(self, stamp):
+        try:
+            with open(self.clips_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            matrix = np.load(self.matrix_path)
+        except (FileNotFoundError, ValueError):
+            # Otro proceso está sustituyendo los archivos: se reintenta en la siguiente llamada
+            return
+        if meta.get('version') != _FINGERPRINT_VERSION:
+            self._loaded, self._stamp = None, stamp
+        elif len(matrix) == len(meta['clips']):
+            # Entre los dos os.replace de _save la matriz y los clips pueden no corresponderse
+            self._loaded, self._stamp = (matrix, meta['clips']), stamp
+
+    def build(self, directories, workers=None):
+        """
+        Construye el índice con los clips de ``directories``.
+
+        Los clips cuyo tamaño y fecha de modificación no han cambiado reutilizan
+        la huella del índice anterior; el resto se analiza en un pool de procesos.
+
+        Parámetros:
+        directories (list): Directorios con clips de audio
+        workers (int o None): Procesos del pool (None = todos los núcleos, 1 = sin pool)
+
+        Retorna:
+        dict: Número de clips indexados y de clips analizados de nuevo
+        """
+        paths = [os.path.abspath(path) for directory in directories for path in find_clips(directory)]
+        previous = self.load()
+        reusable = {}
+        if previous is not None:
+            matrix, clips = previous
+            reusable = {clip['path']: (clip, matrix[row]) for row, clip in enumerate(clips)}
+
+        clips, rows, pending = [], [], []
+        for path in paths:
+            stat = os.stat(path)
+            clip = {
+                'path': path,
+                'name': os.path.splitext(os.path.basename(path))[0].replace('_', ' '),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+            }
+            old = reusable.get(path)
+            if old is not None and old[0]['size'] == clip['size'] and old[0]['mtime_ns'] == clip['mtime_ns']:
+                clip['sha256'] = old[0]['sha256']
+                rows.append(old[1])
+            else:
+                pending.append(len(clips))
+                rows.append(None)
+            clips.append(clip)
+
+        if pending:
+            pending_paths = [clips[i]['path'] for i in pending]
+            if workers == 1:
+                results = [_fingerprint_task(path) for path in pending_paths]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_fingerprint_task, pending_paths, chunksize=16))
+            for i, (fingerprint, sha256) in zip(pending, results):
+                rows[i] = fingerprint
+                clips[i]['sha256'] = sha256
+
+        matrix = np.ascontiguousarray(np.array(rows, dtype=np.float32).reshape(len(rows), len(BARK_BAND_CENTERS)))
+        self._save(matrix, clips)
+        return {'clips': len(clips), 'analyzed': len(pending)}
+
+    def _save(self, matrix, clips):
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Escritura atómica: un lector nunca ve un índice a medio escribir
+        with open(self.matrix_path + '.tmp', 'wb') as f:
+            np.save(f, matrix)
+        with open(self.clips_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'version': _FINGERPRINT_VERSION, 'clips': clips}, f, ensure_ascii=False)
+        os.replace(self.matrix_path + '.tmp', self.matrix_path)
+        os.replace(self.clips_path + '.tmp', self.clips_path)
+        with self._lock:
+            self._loaded, self._stamp = (matrix, clips), self._file_stamp()
+
+    def query(self, fingerprint, k=DEFAULT_TOP_K, exclude_sha256=None):
+        """
+        Busca los clips del índice más parecidos a una huella.
+
+        Parámetros:
+        fingerprint (np.ndarray): Huella de forma (24,)
+        k (int): Número de resultados
+        exclude_sha256 (str o None): Hash del clip consultado, para no devolverlo a sí mismo
+
+        Retorna:
+        list: Clips del índice con su similitud ('similarity'), de mayor a menor
+        """
+        loaded = self.load()
+        if loaded is None:
+            return []
+        matrix, clips = loaded
+        exclude = None
+        if exclude_sha256 is not None:
+            exclude = np.array([clip['sha256'] == exclude_sha256 for clip in clips], dtype=bool)
+        indices, similarities = top_k(matrix, fingerprint, k, exclude)
+        return [
+            {**clips[i], 'similarity': float(similarity)}
+            for i, similarity in zip(indices, similarities) if np.isfinite(similarity)
+        ]
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos (``poetry run similar-clips``)."""
+    parser = argparse.ArgumentParser(description="Índice de similitud de clips por bandas de Bark.")
+    parser.add_argument('--index', default=SIMILARITY_INDEX_DIR, help="Directorio del índice")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Construye o actualiza el índice")
+    build.add_argument('directories', nargs='*', default=[BUNDLED_AUDIO_DIR], help="Directorios con clips")
+    build.add_argument('--workers', type=int, default=None, help="Procesos (por defecto, todos los núcleos)")
+
+    query = commands.add_parser('query', help="Busca los clips más parecidos a uno dado")
+    query.add_argument('clip', help="Archivo de audio de la consulta")
+    query.add_argument('-k', type=int, default=DEFAULT_TOP_K, help="Número de resultados")
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex(args.index)
+    if args.command == 'build':
+        summary = index.build(args.directories, workers=args.workers)
+        print(f"Clips indexados: {summary['clips']}, analizados: {summary['analyzed']}")
+        return 0
+
+    if index.load() is None:
+        parser.error(f"No hay un índice en {args.index}; créelo con el comando build")
+    results = index.query(bark_fingerprint(args.clip), args.k, exclude_sha256=file_sha256(args.clip))
+    for result in results:
+        print(f"{result['similarity']:.4f}  {result['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
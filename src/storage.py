@@ -0,0 +1,440 @@
+"""
+Almacén de audio direccionado por contenido.
+
+Los archivos subidos llegan en fragmentos a una ruta Flask registrada sobre
+``app.server``, se guardan en disco bajo su SHA-256 y se identifican con un
+id corto. El navegador y los callbacks solo manejan la URL del archivo, nunca
+su contenido en base64.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import time
+import uuid
+
+from flask import Blueprint, abort, jsonify, redirect, request, send_file
+
+from src.audio_io import is_decodable
+from src.config import ACCEPTED_EXTENSIONS, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+from src.probe import HEAD_BYTES, ProbeError, probe_file, sniff_format
+
+# Longitud del id corto (prefijo hexadecimal del SHA-256)
+SHORT_ID_LENGTH = 16
+
+# Tamaño de bloque para copiar y calcular hashes sin cargar todo en memoria
+_BLOCK_SIZE = 64 * 1024
+
+# Las cargas incompletas más antiguas que esto se eliminan
+_STALE_UPLOAD_SECONDS = 24 * 60 * 60
+
+
+def file_sha256(path):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadError(Exception):
+    """Error en una carga fragmentada; ``status`` es el código HTTP a devolver."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AudioStore:
+    """
+    Almacén en disco de archivos de audio indexados por su SHA-256.
+
+    Los blobs se guardan como ``<raiz>/<sha[:2]>/<sha><ext>``, las cargas en
+    curso como ``<raiz>/tmp/<token>.part`` y los alias (versión ingerida de
+    cada blob, ver src/transcode.py) como ``<raiz>/aliases/<sha[:2]>/<sha>``.
+    Los blobs registrados con put_file (biblioteca, rejillas) quedan marcados
+    en ``<raiz>/pinned/<sha[:2]>/<sha>`` y nunca se sustituyen por su alias.
+    """
+
+    def __init__(self, root, max_bytes=MAX_UPLOAD_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.alias_dir = os.path.join(root, "aliases")
+        self.pinned_dir = os.path.join(root, "pinned")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    # --- Consulta de blobs ---
+
+    def resolve(self, audio_id):
+        """
+        Devuelve la ruta del blob para un id corto o un SHA-256 completo.
+
+        Un prefijo que coincida con varios blobs no se resuelve.
+
+        Parámetros:
+        audio_id (str): Prefijo hexadecimal del SHA-256
+
+        Retorna:
+        str o None: Ruta del archivo, o None si no existe o es ambiguo
+        """
+        if not audio_id or len(audio_id) < SHORT_ID_LENGTH:
+            return None
+        audio_id = audio_id.lower()
+        if any(c not in "0123456789abcdef" for c in audio_id):
+            return None
+        matches = glob.glob(os.path.join(self.root, audio_id[:2], audio_id + "*"))
+        return matches[0] if len(matches) == 1 else None
+
+    def info(self, audio_id):
+        """
+        Devuelve los metadatos de un blob almacenado.
+
+        Si el blob ya no existe pero tiene un alias (el original se descartó
+        tras transcodificarlo), se devuelven los del blob al que apunta.
+
+        Parámetros:
+        audio_id (str): Id corto del audio
+
+        Retorna:
+        dict o None: id, sha256, tamaño, extensión y ruta del blob
+        """
+        path = self.resolve(audio_id)
+        if path is None:
+            target = self.alias_of(audio_id)
+            path = self.resolve(target) if target else None
+        if path is None:
+            return None
+        sha256, ext = os.path.splitext(os.path.basename(path))
+        return {
+            'id': sha256[:SHORT_ID_LENGTH],
+            'sha256': sha256,
+            'size': os.path.getsize(path),
+            'ext': ext,
+            'path': path,
+        }
+
+    def alias_of(self, audio_id):
+        """
+        Devuelve el SHA-256 al que apunta el alias de un blob.
+
+        Parámetros:
+        audio_id (str): Id corto o SHA-256 completo del blob original
+
+        Retorna:
+        str o None: SHA-256 del destino, o None si no hay alias o el id es ambiguo
+        """
+        if not audio_id or len(audio_id) < SHORT_ID_LENGTH:
+            return None
+        audio_id = audio_id.lower()
+        if any(c not in "0123456789abcdef" for c in audio_id):
+            return None
+        matches = glob.glob(os.path.join(self.alias_dir, audio_id[:2], audio_id + "*"))
+        if len(matches) != 1:
+            return None
+        with open(matches[0]) as f:
+            return f.read().strip() or None
+
+    def set_alias(self, sha256, target_sha256):
+        """
+        Registra que el blob ``sha256`` se sirve como ``target_sha256``.
+
+        Parámetros:
+        sha256 (str): SHA-256 completo del blob original
+        target_sha256 (str): SHA-256 completo del blob que lo sustituye
+        """
+        alias_dir = os.path.join(self.alias_dir, sha256[:2])
+        os.makedirs(alias_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex + ".alias")
+        with open(tmp_path, "w") as f:
+            f.write(target_sha256)
+        os.replace(tmp_path, os.path.join(alias_dir, sha256))
+
+    def is_pinned(self, sha256):
+        """Indica si el blob fue registrado con put_file y debe conservarse."""
+        return os.path.exists(os.path.join(self.pinned_dir, sha256[:2], sha256))
+
+    def remove(self, audio_id):
+        """Elimina un blob del almacén (sin tocar sus alias), salvo que esté marcado."""
+        path = self.resolve(audio_id)
+        if path is not None and not self.is_pinned(os.path.splitext(os.path.basename(path))[0]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def url_for(audio_id):
+        """Devuelve la URL pública de un audio almacenado."""
+        return f"/audio/{audio_id}"
+
+    @staticmethod
+    def is_aliased(audio_id, info):
+        """
+        Indica si ``info`` (devuelto por info()) es el de otro blob, el alias de ``audio_id``.
+
+        Las rutas que sirven contenido inmutable redirigen entonces al id del
+        destino en lugar de servirlo bajo la URL del original.
+        """
+        return not info['sha256'].startswith(audio_id.lower())
+
+    # --- Cargas fragmentadas ---
+
+    def _part_path(self, token):
+        if not token or any(c not in "0123456789abcdef" for c in token):
+            raise UploadError("Token de carga inválido.", 404)
+        return os.path.join(self.tmp_dir, token + ".part")
+
+    def begin_upload(self):
+        """
+        Inicia una carga fragmentada.
+
+        Retorna:
+        str: Token con el que se envían los fragmentos
+        """
+        self._remove_stale_uploads()
+        token = uuid.uuid4().hex
+        open(self._part_path(token), "wb").close()
+        return token
+
+    def append_chunk(self, token, offset, stream):
+        """
+        Escribe un fragmento en la posición indicada de una carga en curso.
+
+        Si ``offset`` es menor que lo ya recibido (reintento del cliente), el
+        archivo se trunca en ese punto antes de escribir. El primer fragmento
+        se rechaza si sus bytes iniciales no corresponden a ningún formato de
+        audio aceptado, sin esperar al resto del archivo.
+
+        Parámetros:
+        token (str): Token devuelto por begin_upload
+        offset (int): Posición en bytes donde empieza el fragmento
+        stream (file-like): Flujo con los bytes del fragmento
+
+        Retorna:
+        int: Bytes recibidos hasta ahora
+        """
+        path = self._part_path(token)
+        if not os.path.exists(path):
+            raise UploadError("La carga no existe o ha expirado.", 404)
+        received = os.path.getsize(path)
+        if offset < 0 or offset > received:
+            raise UploadError(f"Desplazamiento inválido: se esperaba {received}.", 409)
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.truncate()
+            written = offset
+            while True:
+                block = stream.read(_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > self.max_bytes:
+                    f.truncate(0)
+                    raise UploadError("El archivo excede el tamaño máximo permitido.", 413)
+                f.write(block)
+            if offset == 0:
+                f.seek(0)
+                head = f.read(HEAD_BYTES)
+                if len(head) >= 12 and sniff_format(head) is None:
+                    f.truncate(0)
+                    raise UploadError("El archivo no es un audio MP3, WAV, OGG o M4A válido.", 415)
+        return written
+
+    def finish_upload(self, token, filename):
+        """
+        Cierra una carga, la mueve a su ruta definitiva y devuelve su referencia.
+
+        Las cabeceras del archivo se inspeccionan (sin decodificar el audio)
+        para rechazar contenidos que no sean audio. Si ya existía un blob con
+        el mismo SHA-256, el archivo temporal se descarta y se reutiliza el
+        existente.
+
+        Parámetros:
+        token (str): Token de la carga
+        filename (str): Nombre original del archivo
+
+        Retorna:
+        dict: Referencia con id, url, tamaño y nombre del archivo
+        """
+        path = self._part_path(token)
+        if not os.path.exists(path):
+            raise UploadError("La carga no existe o ha expirado.", 404)
+        ext = os.path.splitext(filename or "")[1].lower()
+        if ext not in ACCEPTED_EXTENSIONS:
+            os.remove(path)
+            raise UploadError("Tipo de archivo no soportado.", 415)
+        try:
+            probe_file(path)
+        except ProbeError as error:
+            os.remove(path)
+            raise UploadError(f"El archivo no es un audio válido: {error}", 415) from error
+
+        sha256 = file_sha256(path)
+
+        existing = self.info(sha256)
+        if existing is not None:
+            os.remove(path)
+        else:
+            blob_dir = os.path.join(self.root, sha256[:2])
+            os.makedirs(blob_dir, exist_ok=True)
+            os.replace(path, os.path.join(blob_dir, sha256 + ext))
+            existing = self.info(sha256)
+
+        return self.reference(existing['id'], filename)
+
+    def move_file(self, source_path, ext):
+        """
+        Mueve un archivo temporal al almacén y devuelve su id.
+
+        Parámetros:
+        source_path (str): Ruta del archivo, en el mismo sistema de archivos que el almacén
+        ext (str): Extensión con la que se guarda el blob
+
+        Retorna:
+        str: Id corto del audio almacenado
+        """
+        sha256 = file_sha256(source_path)
+        if self.resolve(sha256) is None:
+            blob_dir = os.path.join(self.root, sha256[:2])
+            os.makedirs(blob_dir, exist_ok=True)
+            os.replace(source_path, os.path.join(blob_dir, sha256 + ext))
+        else:
+            os.remove(source_path)
+        return sha256[:SHORT_ID_LENGTH]
+
+    def put_file(self, source_path):
+        """
+        Copia un archivo local al almacén (si no estaba ya) y devuelve su id.
+
+        El blob queda marcado: otros componentes lo referencian por su hash,
+        así que la ingesta de una subida idéntica no lo elimina.
+
+        Parámetros:
+        source_path (str): Ruta del archivo de audio
+
+        Retorna:
+        str: Id corto del audio almacenado
+        """
+        sha256 = file_sha256(source_path)
+        pinned_dir = os.path.join(self.pinned_dir, sha256[:2])
+        os.makedirs(pinned_dir, exist_ok=True)
+        open(os.path.join(pinned_dir, sha256), "a").close()
+        if self.resolve(sha256) is None:
+            ext = os.path.splitext(source_path)[1].lower()
+            blob_dir = os.path.join(self.root, sha256[:2])
+            os.makedirs(blob_dir, exist_ok=True)
+            tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex + ".part")
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, os.path.join(blob_dir, sha256 + ext))
+        return sha256[:SHORT_ID_LENGTH]
+
+    def reference(self, audio_id, filename):
+        """
+        Construye la referencia ligera que viaja entre navegador y callbacks.
+
+        Incluye el formato, la duración, la frecuencia de muestreo y los
+        canales leídos de las cabeceras del archivo (None si no se reconocen),
+        y si el servidor puede decodificarlo ('decodable'); si no, las vistas
+        que lo decodifican en el servidor se omiten.
+
+        Parámetros:
+        audio_id (str): Id corto del audio
+        filename (str): Nombre original del archivo
+
+        Retorna:
+        dict o None: Referencia del audio, o None si el id no existe
+        """
+        info = self.info(audio_id)
+        if info is None:
+            return None
+        try:
+            audio = probe_file(info['path'])
+        except ProbeError:
+            audio = {}
+        return {
+            'id': info['id'],
+            'url': self.url_for(info['id']),
+            'size': info['size'],
+            'filename': filename,
+            'format': audio.get('format'),
+            'duration': audio.get('duration'),
+            'sample_rate': audio.get('sample_rate'),
+            'channels': audio.get('channels'),
+            'decodable': is_decodable(info['path']),
+        }
+
+    def _remove_stale_uploads(self):
+        limit = time.time() - _STALE_UPLOAD_SECONDS
+        for path in glob.glob(os.path.join(self.tmp_dir, "*.part")):
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def create_audio_blueprint(store, chunk_bytes=UPLOAD_CHUNK_BYTES):
+    """
+    Crea el blueprint de Flask con las rutas de carga y descarga de audio.
+
+    Rutas:
+    POST /audio/uploads                     Inicia una carga y devuelve su token y el tamaño de fragmento
+    PUT  /audio/uploads/<token>?offset=N    Añade un fragmento
+    POST /audio/uploads/<token>/complete    Cierra la carga y devuelve la referencia
+    GET  /audio/by-hash/<sha256>            Referencia de un audio ya almacenado
+    GET  /audio/<id>                        Sirve el audio con soporte de ETag y Range; un id con
+                                            alias redirige al id de su versión ingerida
+
+    Parámetros:
+    store (AudioStore): Almacén donde se guardan los archivos
+    chunk_bytes (int): Tamaño de los fragmentos que debe enviar el navegador
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("audio_store", __name__)
+
+    @bp.errorhandler(UploadError)
+    def handle_upload_error(error):
+        return jsonify({'error': str(error)}), error.status
+
+    @bp.route("/audio/uploads", methods=["POST"])
+    def begin_upload():
+        return jsonify({'token': store.begin_upload(), 'chunk_size': chunk_bytes}), 201
+
+    @bp.route("/audio/uploads/<token>", methods=["PUT"])
+    def append_chunk(token):
+        offset = request.args.get("offset", type=int)
+        if offset is None:
+            raise UploadError("Falta el parámetro offset.")
+        return jsonify({'size': store.append_chunk(token, offset, request.stream)})
+
+    @bp.route("/audio/uploads/<token>/complete", methods=["POST"])
+    def finish_upload(token):
+        payload = request.get_json(silent=True) or {}
+        return jsonify(store.finish_upload(token, payload.get('filename')))
+
+    @bp.route("/audio/by-hash/<sha256>")
+    def lookup_by_hash(sha256):
+        if len(sha256) != 64:
+            abort(404)
+        reference = store.reference(sha256, request.args.get("filename"))
+        if reference is None:
+            abort(404)
+        return jsonify(reference)
+
+    @bp.route("/audio/<audio_id>")
+    def serve_audio(audio_id):
+        info = store.info(audio_id)
+        if info is None:
+            abort(404)
+        if store.is_aliased(audio_id, info):
+            return redirect(store.url_for(info['id']))
+        # El contenido nunca cambia para un mismo hash: se puede cachear indefinidamente
+        response = send_file(info['path'], conditional=True, etag=info['sha256'], max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    return bp
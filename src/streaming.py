@@ -0,0 +1,138 @@
+"""
+Segmentos PCM para la reproducción por streaming de grabaciones largas.
+
+Un audio del almacén se divide en segmentos de duración fija, decodificados
+bajo demanda a PCM int16 mono y guardados en una caché en disco. El navegador
+pide el índice de segmentos y va programando cada segmento justo antes de que
+suene, de modo que la memoria usada depende de la ventana de anticipación y
+no de la duración de la grabación.
+"""
+from flask import Blueprint, abort, jsonify, redirect, send_file
+
+from src.audio_io import UndecodableAudio, audio_frames, read_range, to_int16
+from src.cache import make_key
+
+
+def segment_index(store, audio_id, segment_seconds, sample_rate):
+    """
+    Describe cómo se divide un audio en segmentos, sin decodificarlo.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    audio_id (str): Id corto del audio
+    segment_seconds (int): Duración de cada segmento en segundos
+    sample_rate (int): Frecuencia de muestreo de los segmentos
+
+    Retorna:
+    dict o None: id, frecuencia, canales, muestras totales y por segmento,
+    número de segmentos y plantilla de URL; None si el audio no existe
+    """
+    info = store.info(audio_id)
+    if info is None:
+        return None
+    frames, _ = audio_frames(info['path'], sample_rate)
+    segment_frames = segment_seconds * sample_rate
+    return {
+        'id': info['id'],
+        'sample_rate': sample_rate,
+        'channels': 1,
+        'frames': frames,
+        'duration': frames / sample_rate,
+        'segment_frames': segment_frames,
+        'segments': -(-frames // segment_frames),
+        'url': f"/audio/{info['id']}/segments/{{index}}.pcm",
+    }
+
+
+def segment_to_cache(store, cache, audio_id, index, segment_seconds, sample_rate):
+    """
+    Devuelve la ruta del segmento ``index``, decodificándolo solo si no está en caché.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de segmentos
+    audio_id (str): Id corto del audio
+    index (int): Número de segmento, empezando en 0
+    segment_seconds (int): Duración de cada segmento en segundos
+    sample_rate (int): Frecuencia de muestreo de los segmentos
+
+    Retorna:
+    str o None: Ruta del segmento PCM int16, o None si no existe
+    """
+    info = store.info(audio_id)
+    if info is None or index < 0:
+        return None
+    segment_frames = segment_seconds * sample_rate
+    frames, _ = audio_frames(info['path'], sample_rate)
+    start = index * segment_frames
+    if start >= frames:
+        return None
+
+    key = make_key('segment', info['sha256'], index, segment_frames, sample_rate)
+
+    def write(path):
+        samples = read_range(info['path'], start, min(start + segment_frames, frames), sample_rate)
+        to_int16(samples).astype('<i2').tofile(path)
+
+    return cache.get_or_create(key, write)
+
+
+def create_streaming_blueprint(store, cache, segment_seconds, sample_rate):
+    """
+    Crea el blueprint con el índice y los segmentos PCM de cada audio.
+
+    Rutas:
+    GET /audio/<id>/segments.json         Índice de segmentos
+    GET /audio/<id>/segments/<n>.pcm      Segmento n en PCM int16 mono
+
+    Los audios que el servidor no puede decodificar (M4A) responden 415; el
+    navegador los reproduce entonces decodificando el archivo completo. Un id
+    con alias redirige a las mismas rutas del id de su versión ingerida.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de segmentos
+    segment_seconds (int): Duración de cada segmento en segundos
+    sample_rate (int): Frecuencia de muestreo de los segmentos
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("streaming", __name__)
+
+    @bp.errorhandler(UndecodableAudio)
+    def handle_undecodable(error):
+        return jsonify({'error': str(error)}), 415
+
+    def alias_redirect(audio_id, path):
+        info = store.info(audio_id)
+        if info is not None and store.is_aliased(audio_id, info):
+            return redirect(f"/audio/{info['id']}/{path}")
+        return None
+
+    @bp.route("/audio/<audio_id>/segments.json")
+    def serve_segment_index(audio_id):
+        moved = alias_redirect(audio_id, "segments.json")
+        if moved is not None:
+            return moved
+        index = segment_index(store, audio_id, segment_seconds, sample_rate)
+        if index is None:
+            abort(404)
+        response = jsonify(index)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    @bp.route("/audio/<audio_id>/segments/<int:index>.pcm")
+    def serve_segment(audio_id, index):
+        moved = alias_redirect(audio_id, f"segments/{index}.pcm")
+        if moved is not None:
+            return moved
+        path = segment_to_cache(store, cache, audio_id, index, segment_seconds, sample_rate)
+        if path is None:
+            abort(404)
+        # El segmento depende solo del contenido del audio: se puede cachear indefinidamente
+        response = send_file(path, mimetype='application/octet-stream', conditional=True, max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    return bp
@@ -0,0 +1,211 @@
+"""
+Cambio de velocidad que conserva el tono (vocoder de fase).
+
+``playbackRate`` cambia la velocidad remuestreando, así que también desplaza
+el tono y altera el contenido fonético del estímulo. Aquí la señal se estira
+en el dominio de la frecuencia: se calcula la STFT, se leen las ventanas a
+``speed`` ventanas por ventana de salida interpolando la magnitud, se acumula
+la fase con el avance medido en cada bin y se resintetiza por solapamiento y
+suma.
+
+El cálculo es vectorizado por bloques de ventanas de salida (la fase se
+arrastra de un bloque al siguiente), de modo que la memoria no depende de la
+duración del audio. Cada variante se guarda en una caché en disco por
+(hash del audio, velocidad): mover el control de velocidad adelante y atrás
+sirve audio ya calculado en lugar de repetir el procesamiento.
+"""
+import numpy as np
+from flask import Blueprint, abort, jsonify, redirect, send_file
+
+from src.audio_io import UndecodableAudio, load_audio, to_int16
+from src.cache import make_key
+
+# Parámetros de la STFT (N_FFT debe ser múltiplo de HOP_LENGTH)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Ventanas de salida que se sintetizan en cada bloque
+FRAMES_PER_BLOCK = 256
+
+# Velocidades que admite la ruta de variantes
+MIN_STRETCH_SPEED = 0.25
+MAX_STRETCH_SPEED = 4.0
+
+# Incrementar al cambiar el algoritmo para invalidar la caché
+_STRETCH_VERSION = 1
+
+
+def _stft_frames(padded, first, last, window):
+    # Espectro de las ventanas de entrada first..last (incluidas)
+    segment = padded[first * HOP_LENGTH:last * HOP_LENGTH + N_FFT]
+    frames = np.lib.stride_tricks.sliding_window_view(segment, N_FFT)[::HOP_LENGTH]
+    return np.fft.rfft(frames * window, axis=1)
+
+
+def time_stretch(samples, speed, frames_per_block=FRAMES_PER_BLOCK):
+    """
+    Cambia la velocidad de una señal sin cambiar su tono.
+
+    Parámetros:
+    samples (np.ndarray): Señal mono
+    speed (float): Factor de velocidad (1.0 = original, 2.0 = el doble de rápido)
+    frames_per_block (int): Ventanas de salida sintetizadas en cada bloque
+
+    Retorna:
+    np.ndarray: Señal float32 de longitud ``len(samples) / speed``, como apply_speed
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if speed == 1.0 or len(samples) == 0:
+        return samples
+    n_out = int(np.floor(len(samples) / speed))
+
+    # Ventanas centradas: la ventana t de entrada empieza en t * HOP_LENGTH - N_FFT / 2
+    padded = np.pad(samples, (N_FFT // 2, N_FFT // 2 + HOP_LENGTH))
+    n_in = 1 + (len(padded) - N_FFT) // HOP_LENGTH
+    n_frames = -(-n_out // HOP_LENGTH) + 1
+    window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+    bins = np.arange(N_FFT // 2 + 1)
+    expected = 2 * np.pi * HOP_LENGTH * bins / N_FFT
+
+    out = np.zeros(HOP_LENGTH * (n_frames - 1) + N_FFT, dtype=np.float32)
+    norm = np.zeros_like(out)
+    overlap = N_FFT // HOP_LENGTH
+    phase = None
+
+    for t0 in range(0, n_frames, frames_per_block):
+        t1 = min(t0 + frames_per_block, n_frames)
+        # Posición fraccionaria en la entrada de cada ventana de salida
+        steps = np.arange(t0, t1) * speed
+        index = np.minimum(steps.astype(np.int64), n_in - 2)
+        frac = np.minimum(steps - index, 1.0)[:, None]
+
+        first = index[0]
+        spectrum = _stft_frames(padded, first, index[-1] + 1, window)
+        current = spectrum[index - first]
+        following = spectrum[index - first + 1]
+
+        magnitude = (1 - frac) * np.abs(current) + frac * np.abs(following)
+        # Avance de fase real de cada bin entre dos ventanas de entrada consecutivas
+        deviation = np.angle(following) - np.angle(current) - expected
+        advance = expected + np.mod(deviation + np.pi, 2 * np.pi) - np.pi
+        if phase is None:
+            phase = np.angle(current[0])
+        phases = phase + np.concatenate([np.zeros((1, len(bins))), np.cumsum(advance[:-1], axis=0)])
+        phase = np.mod(phases[-1] + advance[-1], 2 * np.pi)
+
+        frames = np.fft.irfft(magnitude * np.exp(1j * phases), N_FFT, axis=1).astype(np.float32) * window
+        # Solapamiento y suma: cada ventana se reparte en N_FFT / HOP_LENGTH tramos de HOP_LENGTH
+        blocks = frames.reshape(len(frames), overlap, HOP_LENGTH)
+        for j in range(overlap):
+            start, stop = (t0 + j) * HOP_LENGTH, (t1 + j) * HOP_LENGTH
+            out[start:stop] += blocks[:, j].reshape(-1)
+            norm[start:stop] += np.tile(window[j * HOP_LENGTH:(j + 1) * HOP_LENGTH] ** 2, t1 - t0)
+
+    result = out[N_FFT // 2:N_FFT // 2 + n_out]
+    envelope = norm[N_FFT // 2:N_FFT // 2 + n_out]
+    np.divide(result, envelope, out=result, where=envelope > 1e-3)
+    return result
+
+
+def stretch_to_cache(store, cache, audio_id, speed, sample_rate):
+    """
+    Devuelve la ruta de la variante de un audio a ``speed``, calculándola solo si no está en caché.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de variantes (PCM int16 mono)
+    audio_id (str): Id corto del audio
+    speed (float): Factor de velocidad
+    sample_rate (int): Frecuencia de muestreo de la variante
+
+    Retorna:
+    str o None: Ruta del PCM, o None si el audio no existe
+    """
+    info = store.info(audio_id)
+    if info is None:
+        return None
+
+    key = make_key('stretch', info['sha256'], speed, sample_rate, N_FFT, HOP_LENGTH, _STRETCH_VERSION)
+
+    def write(path):
+        samples, _ = load_audio(info['path'], sample_rate)
+        to_int16(time_stretch(samples, speed)).astype('<i2').tofile(path)
+
+    return cache.get_or_create(key, write)
+
+
+def read_variant(path):
+    """
+    Lee una variante guardada por stretch_to_cache.
+
+    Parámetros:
+    path (str): Ruta del PCM int16 mono
+
+    Retorna:
+    np.ndarray: Señal mono float32
+    """
+    return np.fromfile(path, dtype='<i2').astype(np.float32) / 32767
+
+
+def parse_speed(value):
+    """
+    Normaliza la velocidad de una URL a dos decimales.
+
+    Parámetros:
+    value (str): Velocidad tal como aparece en la ruta
+
+    Retorna:
+    float o None: Velocidad redondeada, o None si no es válida o está fuera de rango
+    """
+    try:
+        speed = round(float(value), 2)
+    except ValueError:
+        return None
+    if not MIN_STRETCH_SPEED <= speed <= MAX_STRETCH_SPEED:
+        return None
+    return speed
+
+
+def create_timestretch_blueprint(store, cache, sample_rate):
+    """
+    Crea el blueprint con las variantes de velocidad que conservan el tono.
+
+    Ruta:
+    GET /audio/<id>/stretch/<speed>.pcm   Variante en PCM int16 mono; la
+                                          frecuencia va en la cabecera X-Sample-Rate
+
+    Los audios que el servidor no puede decodificar (M4A) responden 415, y un
+    id con alias redirige a la variante del id de su versión ingerida.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de variantes
+    sample_rate (int): Frecuencia de muestreo de las variantes
+
+    Retorna:
+    flask.Blueprint: Blueprint listo para registrar en ``app.server``
+    """
+    bp = Blueprint("timestretch", __name__)
+
+    @bp.errorhandler(UndecodableAudio)
+    def handle_undecodable(error):
+        return jsonify({'error': str(error)}), 415
+
+    @bp.route("/audio/<audio_id>/stretch/<speed>.pcm")
+    def serve_stretched(audio_id, speed):
+        info = store.info(audio_id)
+        if info is not None and store.is_aliased(audio_id, info):
+            return redirect(f"/audio/{info['id']}/stretch/{speed}.pcm")
+        speed = parse_speed(speed)
+        if speed is None:
+            abort(400)
+        path = stretch_to_cache(store, cache, audio_id, speed, sample_rate)
+        if path is None:
+            abort(404)
+        # La variante depende solo del contenido del audio y de la velocidad
+        response = send_file(path, mimetype='application/octet-stream', conditional=True, max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.headers['X-Sample-Rate'] = str(sample_rate)
+        return response
+
+    return bp
@@ -0,0 +1,258 @@
+"""
+Ingesta de las grabaciones subidas en un formato compacto para voz.
+
+Los estímulos son clips de voz cortos, pero se suben como WAV estéreo a
+44.1 kHz o más. Tras validar la subida, el archivo se recorta (silencio
+inicial y final), se normaliza en sonoridad, se mezcla a mono, se remuestrea
+a una frecuencia de voz y se codifica en FLAC (sin pérdidas) u OGG Vorbis.
+Con eso el almacenamiento, la transferencia y la decodificación en el
+navegador bajan un orden de magnitud en los clips habituales.
+
+El archivo se procesa en dos pasadas por bloques, así que la memoria no
+depende de su duración: la primera mide la energía de ventanas de 10 ms y la
+segunda lee solo el tramo con voz, ya remuestreado, y lo escribe aplicando la
+ganancia. La sonoridad se mide como el RMS de las ventanas con voz, sin
+ponderación K.
+
+El almacén guarda un alias de cada original a su versión ingerida: volver a
+subir el mismo archivo, o pedir el original por su hash, lleva a la versión
+transcodificada aunque el original se haya descartado.
+"""
+import os
+import uuid
+
+import numpy as np
+import soundfile as sf
+
+from src.audio_io import read_range, to_mono
+from src.storage import SHORT_ID_LENGTH
+
+# Duración de las ventanas con que se mide la energía
+FRAME_MS = 10
+
+# Una ventana es silencio si queda a más de SILENCE_DB de la más fuerte o por debajo de SILENCE_FLOOR_DBFS
+SILENCE_DB = -45
+SILENCE_FLOOR_DBFS = -70
+
+# Margen que se conserva antes y después de la voz para no cortar ataques ni colas
+PAD_MS = 50
+
+# RMS de las ventanas con voz tras normalizar, y pico máximo permitido
+TARGET_RMS_DBFS = -20
+PEAK_CEILING_DBFS = -1
+
+# Ventanas que se leen por bloque en la primera pasada, y segundos de salida por bloque en la segunda
+FRAMES_PER_BLOCK = 200
+OUTPUT_BLOCK_SECONDS = 2
+
+# Formato de salida: (formato de soundfile, subtipo, extensión)
+FORMATS = {
+    'flac': ('FLAC', 'PCM_16', '.flac'),
+    'ogg': ('OGG', 'VORBIS', '.ogg'),
+}
+
+
+def frame_levels(path, frame_ms=FRAME_MS):
+    """
+    Mide la energía y el pico de cada ventana de un archivo, leyéndolo por bloques.
+
+    Parámetros:
+    path (str): Ruta del archivo de audio
+    frame_ms (float): Duración de cada ventana en milisegundos
+
+    Retorna:
+    tuple: (energía media por ventana, pico por ventana, muestras por ventana, frecuencia de muestreo)
+    """
+    sample_rate = sf.info(path).samplerate
+    frame = max(int(round(sample_rate * frame_ms / 1000)), 1)
+    energies, peaks = [], []
+    for block in sf.blocks(path, blocksize=frame * FRAMES_PER_BLOCK, dtype='float32', always_2d=True):
+        mono = to_mono(block)
+        mono = np.pad(mono, (0, -len(mono) % frame)).reshape(-1, frame)
+        energies.append(np.einsum('ij,ij->i', mono, mono, dtype=np.float64) / frame)
+        peaks.append(np.abs(mono).max(axis=1))
+    if not energies:
+        return np.zeros(0), np.zeros(0, dtype=np.float32), frame, sample_rate
+    return np.concatenate(energies), np.concatenate(peaks), frame, sample_rate
+
+
+def speech_range(energies, frame, sample_rate, silence_db=SILENCE_DB, pad_ms=PAD_MS):
+    """
+    Localiza el tramo con voz a partir de la energía por ventana.
+
+    Parámetros:
+    energies (np.ndarray): Energía media de cada ventana
+    frame (int): Muestras por ventana
+    sample_rate (int): Frecuencia de muestreo en Hz
+    silence_db (float): Umbral de silencio relativo a la ventana más fuerte
+    pad_ms (float): Margen que se conserva a cada lado
+
+    Retorna:
+    tuple o None: (primera ventana, ventana final excluida, máscara de ventanas con voz),
+    o None si todo el archivo es silencio
+    """
+    if len(energies) == 0:
+        return None
+    threshold = max(energies.max() * 10 ** (silence_db / 10), 10 ** (SILENCE_FLOOR_DBFS / 10))
+    active = energies > threshold
+    if not active.any():
+        return None
+    pad = int(np.ceil(pad_ms / 1000 * sample_rate / frame))
+    indices = np.flatnonzero(active)
+    start = max(indices[0] - pad, 0)
+    stop = min(indices[-1] + 1 + pad, len(energies))
+    return start, stop, active
+
+
+def normalization_gain(energies, peaks, active, target_rms_dbfs=TARGET_RMS_DBFS,
+                       peak_ceiling_dbfs=PEAK_CEILING_DBFS):
+    """
+    Calcula la ganancia que lleva el RMS de la voz al objetivo sin saturar.
+
+    Parámetros:
+    energies (np.ndarray): Energía media de cada ventana
+    peaks (np.ndarray): Pico absoluto de cada ventana (solo las del tramo recortado)
+    active (np.ndarray): Máscara de ventanas con voz
+    target_rms_dbfs (float): RMS deseado de las ventanas con voz
+    peak_ceiling_dbfs (float): Pico máximo tras aplicar la ganancia
+
+    Retorna:
+    float: Ganancia lineal
+    """
+    rms = np.sqrt(energies[active].mean())
+    gain = 10 ** (target_rms_dbfs / 20) / rms
+    peak = float(peaks.max())
+    if peak > 0:
+        gain = min(gain, 10 ** (peak_ceiling_dbfs / 20) / peak)
+    return float(gain)
+
+
+def transcode(source_path, dest_path, sample_rate, fmt='flac'):
+    """
+    Recorta, normaliza, mezcla a mono, remuestrea y codifica un archivo.
+
+    Si el archivo original tiene una frecuencia menor que ``sample_rate``,
+    se conserva la original (nunca se sobremuestrea).
+
+    Parámetros:
+    source_path (str): Ruta del archivo original
+    dest_path (str): Ruta del archivo de salida
+    sample_rate (int): Frecuencia de muestreo de salida en Hz
+    fmt (str): Formato de salida, una clave de FORMATS
+
+    Retorna:
+    dict: Duración de salida, segundos recortados, ganancia en dB y frecuencia de salida
+    """
+    energies, peaks, frame, native_rate = frame_levels(source_path)
+    found = speech_range(energies, frame, native_rate)
+    if found is None:
+        start, stop, gain = 0, len(energies), 1.0
+    else:
+        start, stop, active = found
+        gain = normalization_gain(energies, peaks[start:stop], active)
+
+    total = sf.info(source_path).frames
+    out_rate = min(sample_rate, native_rate)
+    ratio = out_rate / native_rate
+    first = int(round(start * frame * ratio))
+    last = int(round(min(stop * frame, total) * ratio))
+
+    sf_format, subtype, _ = FORMATS[fmt]
+    block = OUTPUT_BLOCK_SECONDS * out_rate
+    with sf.SoundFile(dest_path, 'w', samplerate=out_rate, channels=1, format=sf_format, subtype=subtype) as f:
+        for position in range(first, last, block):
+            segment = read_range(source_path, position, min(position + block, last), out_rate)
+            f.write(np.clip(segment * gain, -1.0, 1.0))
+
+    return {
+        'duration': (last - first) / out_rate,
+        'trimmed': total / native_rate - (last - first) / out_rate,
+        'gain_db': float(20 * np.log10(gain)),
+        'sample_rate': out_rate,
+    }
+
+
+class Transcoder:
+    """
+    Ingesta de los audios subidos al almacén.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de los audios
+    sample_rate (int): Frecuencia de muestreo de salida
+    fmt (str): Formato de salida, una clave de FORMATS
+    keep_originals (bool): Si es False, el original se elimina tras transcodificarlo,
+    salvo que lo haya registrado put_file (p. ej. un clip de la biblioteca)
+    """
+
+    def __init__(self, store, sample_rate, fmt='flac', keep_originals=False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato de transcodificación no soportado: {fmt}")
+        self.store = store
+        self.sample_rate = sample_rate
+        self.fmt = fmt
+        self.keep_originals = keep_originals
+
+    def ingested_id(self, audio_id):
+        """
+        Devuelve el id de la versión ingerida de un audio si ya existe.
+
+        Parámetros:
+        audio_id (str): Id corto del audio subido
+
+        Retorna:
+        str o None: Id del audio que debe usarse, o None si aún no se ha ingerido
+        """
+        info = self.store.info(audio_id)
+        if info is None:
+            return None
+        target = self.store.alias_of(info['sha256'])
+        if target is None or self.store.resolve(target) is None:
+            return None
+        return target[:SHORT_ID_LENGTH]
+
+    def ingest(self, audio_id):
+        """
+        Devuelve el id de la versión ingerida de un audio, creándola si hace falta.
+
+        Si el audio no se puede decodificar en el servidor (p. ej. M4A) o la
+        versión transcodificada no ocupa menos que el original, se conserva
+        el original. La decisión queda registrada como alias, así que cada
+        audio se procesa una sola vez.
+
+        Parámetros:
+        audio_id (str): Id corto del audio subido
+
+        Retorna:
+        str o None: Id del audio que debe usarse, o None si el id no existe
+        """
+        info = self.store.info(audio_id)
+        if info is None:
+            return None
+        ingested = self.ingested_id(info['id'])
+        if ingested is not None:
+            return ingested
+
+        ext = FORMATS[self.fmt][2]
+        tmp_path = os.path.join(self.store.tmp_dir, uuid.uuid4().hex + ext)
+        try:
+            transcode(info['path'], tmp_path, self.sample_rate, self.fmt)
+        except (RuntimeError, ValueError):
+            # soundfile no decodifica este contenedor: se sirve tal cual
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.store.set_alias(info['sha256'], info['sha256'])
+            return info['id']
+
+        if os.path.getsize(tmp_path) >= info['size']:
+            os.remove(tmp_path)
+            self.store.set_alias(info['sha256'], info['sha256'])
+            return info['id']
+
+        new_id = self.store.move_file(tmp_path, ext)
+        new_sha256 = self.store.info(new_id)['sha256']
+        self.store.set_alias(new_sha256, new_sha256)
+        self.store.set_alias(info['sha256'], new_sha256)
+        if not self.keep_originals:
+            # remove() respeta los blobs marcados por put_file, que otros siguen usando
+            self.store.remove(info['sha256'])
+        return new_id
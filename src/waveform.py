@@ -0,0 +1,246 @@
+"""
+Vista general de la forma de onda de cada pista a varias resoluciones.
+
+Dibujar las muestras de un archivo de 30 MB con Plotly enviaría millones de
+puntos al navegador. En su lugar se precalcula una vez por hash del audio una
+pirámide de diezmado: el nivel 0 guarda el mínimo y el máximo de cada bloque
+de ``BASE_BLOCK`` muestras y cada nivel siguiente agrupa ``LEVEL_FACTOR``
+bloques del anterior. Los niveles se guardan como int16 en un .npz.
+
+Cada vista (la pista entera o el rango visible tras un zoom) usa el nivel más
+fino que no supera ``POINT_BUDGET`` puntos, o las muestras originales si el
+rango es tan corto que caben en el presupuesto. Así cada zoom mueve unos
+pocos KB, sea cual sea la duración del audio.
+"""
+import functools
+
+import numpy as np
+import soundfile as sf
+
+from src.audio_io import to_int16, to_mono
+from src.cache import make_key
+
+# Muestras por bloque del nivel 0 y bloques que agrupa cada nivel siguiente
+BASE_BLOCK = 256
+LEVEL_FACTOR = 4
+
+# Puntos máximos de cada vista
+POINT_BUDGET = 1000
+
+# Bloques del nivel 0 que se leen de cada vez al construir la pirámide
+BLOCKS_PER_READ = 1024
+
+# Incrementar al cambiar la pirámide para invalidar la caché
+_WAVEFORM_VERSION = 1
+
+
+def _reduce(mins, maxs, factor):
+    # Agrupa ``factor`` bloques consecutivos; el último se completa repitiendo su borde
+    pad = -len(mins) % factor
+    if pad:
+        mins = np.concatenate([mins, np.repeat(mins[-1:], pad)])
+        maxs = np.concatenate([maxs, np.repeat(maxs[-1:], pad)])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def build_pyramid(path, block=BASE_BLOCK, factor=LEVEL_FACTOR, point_budget=POINT_BUDGET):
+    """
+    Calcula la pirámide de mínimos y máximos de un archivo de audio.
+
+    El archivo se decodifica por bloques, así que la memoria usada no depende
+    de su duración.
+
+    Parámetros:
+    path (str): Ruta del archivo
+    block (int): Muestras por bloque del nivel 0
+    factor (int): Bloques del nivel anterior que agrupa cada nivel
+    point_budget (int): Se añaden niveles hasta que el último cabe en este número de puntos
+
+    Retorna:
+    dict: sample_rate, frames, block, factor y levels (lista de pares
+    (mínimos, máximos) int16, del nivel más fino al más grueso)
+    """
+    info = sf.info(path)
+    mins, maxs = [], []
+    frames = 0
+    for chunk in sf.blocks(path, blocksize=block * BLOCKS_PER_READ, dtype='float32', always_2d=True):
+        mono = to_mono(chunk)
+        frames += len(mono)
+        pad = -len(mono) % block
+        if pad:
+            mono = np.concatenate([mono, np.repeat(mono[-1:], pad)])
+        blocks = mono.reshape(-1, block)
+        mins.append(blocks.min(axis=1))
+        maxs.append(blocks.max(axis=1))
+
+    if not mins:
+        mins, maxs = [np.zeros(1, dtype=np.float32)], [np.zeros(1, dtype=np.float32)]
+    levels = [(to_int16(np.concatenate(mins)), to_int16(np.concatenate(maxs)))]
+    while len(levels[-1][0]) > point_budget:
+        levels.append(_reduce(*levels[-1], factor))
+    return {
+        'sample_rate': info.samplerate,
+        'frames': frames,
+        'block': block,
+        'factor': factor,
+        'levels': levels,
+    }
+
+
+def _waveform_key(info):
+    return make_key('waveform', info['sha256'], BASE_BLOCK, LEVEL_FACTOR, POINT_BUDGET, _WAVEFORM_VERSION)
+
+
+def cached_waveform(store, cache, audio_id):
+    """
+    Devuelve la ruta de la pirámide de un audio solo si ya está en caché.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de pirámides (archivos .npz)
+    audio_id (str): Id corto del audio
+
+    Retorna:
+    str o None: Ruta del .npz, o None si el audio no existe o aún no se ha calculado
+    """
+    info = store.info(audio_id)
+    if info is None:
+        return None
+    return cache.get(_waveform_key(info))
+
+
+def waveform_to_cache(store, cache, audio_id):
+    """
+    Devuelve la ruta de la pirámide de un audio, calculándola solo si no está en caché.
+
+    Parámetros:
+    store (src.storage.AudioStore): Almacén de audio
+    cache (src.cache.DiskLRUCache): Caché de pirámides (archivos .npz)
+    audio_id (str): Id corto del audio
+
+    Retorna:
+    str o None: Ruta del .npz, o None si el audio no existe
+    """
+    info = store.info(audio_id)
+    if info is None:
+        return None
+
+    key = _waveform_key(info)
+
+    def write(path):
+        pyramid = build_pyramid(info['path'])
+        arrays = {
+            'sample_rate': pyramid['sample_rate'],
+            'frames': pyramid['frames'],
+            'block': pyramid['block'],
+            'factor': pyramid['factor'],
+        }
+        for level, (mins, maxs) in enumerate(pyramid['levels']):
+            arrays[f'min_{level}'] = mins
+            arrays[f'max_{level}'] = maxs
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    return cache.get_or_create(key, write)
+
+
+@functools.lru_cache(maxsize=16)
+def load_pyramid(path):
+    """
+    Lee una pirámide guardada por waveform_to_cache.
+
+    Las entradas de la caché no cambian (su nombre es el hash de su
+    contenido), así que las últimas leídas se conservan en memoria.
+
+    Parámetros:
+    path (str): Ruta del .npz
+
+    Retorna:
+    dict: Igual que build_pyramid
+    """
+    with np.load(path) as data:
+        n_levels = sum(1 for name in data.files if name.startswith('min_'))
+        return {
+            'sample_rate': int(data['sample_rate']),
+            'frames': int(data['frames']),
+            'block': int(data['block']),
+            'factor': int(data['factor']),
+            'levels': [(data[f'min_{level}'], data[f'max_{level}']) for level in range(n_levels)],
+        }
+
+
+def waveform_view(pyramid, start=None, end=None, point_budget=POINT_BUDGET, path=None):
+    """
+    Extrae los puntos de la forma de onda visibles entre ``start`` y ``end``.
+
+    Parámetros:
+    pyramid (dict): Pirámide devuelta por build_pyramid o load_pyramid
+    start (float o None): Inicio del rango visible en segundos (None = principio)
+    end (float o None): Fin del rango visible en segundos (None = final)
+    point_budget (int): Puntos máximos de la vista
+    path (str o None): Archivo de audio; si se indica y el rango cabe en el
+    presupuesto, se devuelven las muestras originales
+
+    Retorna:
+    dict: times (s), mins y maxs (iguales si son muestras), level (-1 para
+    muestras originales) y samples_per_point
+    """
+    sample_rate, frames = pyramid['sample_rate'], pyramid['frames']
+    first = 0 if start is None else min(max(int(start * sample_rate), 0), frames)
+    last = frames if end is None else min(max(int(np.ceil(end * sample_rate)), first + 1), frames)
+
+    if path is not None and last - first <= point_budget:
+        samples = to_mono(sf.read(path, start=first, stop=last, dtype='float32', always_2d=True)[0])
+        times = (first + np.arange(len(samples))) / sample_rate
+        return {'times': times, 'mins': samples, 'maxs': samples, 'level': -1, 'samples_per_point': 1}
+
+    # El nivel más fino cuyo número de bloques en el rango cabe en el presupuesto
+    size = pyramid['block']
+    level = 0
+    while level < len(pyramid['levels']) - 1 and (last - first) / size > point_budget:
+        size *= pyramid['factor']
+        level += 1
+    i0, i1 = first // size, -(-last // size)
+    mins, maxs = pyramid['levels'][level]
+    return {
+        'times': (np.arange(i0, i1) * size + size / 2) / sample_rate,
+        'mins': mins[i0:i1] / 32767,
+        'maxs': maxs[i0:i1] / 32767,
+        'level': level,
+        'samples_per_point': size,
+    }
+
+
+def waveform_figure(view, x_range=None, uirevision=None):
+    """
+    Gráfico de la envolvente (o de las muestras) de una vista de la forma de onda.
+
+    Parámetros:
+    view (dict): Resultado de waveform_view
+    x_range (list o None): Rango visible [inicio, fin] en segundos; None muestra todo
+    uirevision (str o None): Conserva el zoom del usuario mientras no cambie
+
+    Retorna:
+    plotly.graph_objs.Figure: Mínimos y máximos con el área entre ellos rellena
+    """
+    import plotly.graph_objs as go
+
+    # Cuatro decimales bastan para dibujar y reducen el tamaño de la respuesta
+    times = np.round(view['times'], 4)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=times, y=np.round(view['maxs'], 4), mode='lines',
+                             line=dict(color='#1f77b4', width=1), hoverinfo='skip'))
+    # Con muestras originales mínimos y máximos coinciden: basta una línea
+    if view['level'] >= 0:
+        fig.add_trace(go.Scatter(x=times, y=np.round(view['mins'], 4), mode='lines', fill='tonexty',
+                                 line=dict(color='#1f77b4', width=1), hoverinfo='skip'))
+    fig.update_xaxes(title_text='Tiempo (s)', range=x_range, autorange=x_range is None)
+    fig.update_yaxes(range=[-1, 1], fixedrange=True, showticklabels=False)
+    fig.update_layout(
+        showlegend=False,
+        plot_bgcolor='white',
+        margin=dict(l=10, r=10, t=10, b=40),
+        height=160,
+        uirevision=uirevision,
+    )
+    return fig
@@ -0,0 +1,249 @@
+"""
+Desfase efectivo y coherencia entre los canales de un estímulo renderizado.
+
+El control de retraso fija un desfase nominal, pero con velocidades distintas
+en cada pista y con las repeticiones el desfase real entre los canales deriva
+a lo largo del estímulo. Aquí se mide con una correlación cruzada por ventanas
+deslizantes: cada ventana del canal izquierdo se correlaciona con el tramo del
+canal derecho que la rodea hasta ``max_lag_ms`` a cada lado, mediante FFT
+(O(n log n) por ventana) y por lotes de ventanas a la vez.
+
+La correlación se normaliza por la energía de los dos tramos comparados, así
+que el pico es la coherencia de la ventana (1 si un canal es una copia
+retrasada del otro) y su posición, afinada con interpolación parabólica, es el
+desfase efectivo. Antes de correlacionar la señal se diezma a unos 8 kHz,
+suficiente para la voz y con un desfase resuelto por debajo del milisegundo.
+
+Si las pistas suenan a velocidades distintas, un canal es una versión
+comprimida en el tiempo del otro y las formas de onda dejan de coincidir en
+cuanto la deriva supera unas décimas de milisegundo. Por eso la misma
+correlación se repite sobre la envolvente de amplitud (a 200 Hz y con
+ventanas más largas), que sigue la deriva a escala de sílaba.
+"""
+import functools
+
+import numpy as np
+import soundfile as sf
+
+# Frecuencia aproximada a la que se diezma el estímulo antes de correlacionar
+ANALYSIS_RATE = 8000
+
+# Longitud y salto de las ventanas y desfase máximo buscado a cada lado
+WINDOW_MS = 200
+HOP_MS = 50
+MAX_LAG_MS = 1000
+
+# Frecuencia y ventana de la envolvente de amplitud (sigue la deriva entre velocidades distintas)
+ENVELOPE_RATE = 200
+ENVELOPE_WINDOW_MS = 750
+
+# Ventanas que se correlacionan en cada lote
+FRAMES_PER_BLOCK = 64
+
+# Ventanas con menos energía que esta (en dB respecto a la más fuerte) no se miden
+SILENCE_DB = -50.0
+
+# Energía mínima del tramo derecho respecto a la ventana izquierda para comparar un desfase
+MIN_ENERGY_RATIO = 1e-3
+
+
+def _decimate(samples, factor):
+    # Promedio por bloques de ``factor`` muestras: paso bajo sencillo antes de diezmar
+    if factor == 1:
+        return samples
+    usable = len(samples) - len(samples) % factor
+    return samples[:usable].reshape(-1, factor, samples.shape[1]).mean(axis=1)
+
+
+def _fft_length(n):
+    # Menor longitud >= n con factores 2, 3 y 5: tan rápida como una potencia de
+    # dos y sin casi duplicar el tamaño al redondear
+    best = 1 << (n - 1).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            candidate = power35 << max((n - 1) // power35, 0).bit_length()
+            best = min(best, candidate)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def _sliding_lag(left, right, rate, window_ms, hop_ms, max_lag_ms, frames_per_block):
+    # Correlación cruzada normalizada (Pearson) por ventanas entre dos señales a ``rate``
+    window = max(int(round(window_ms * rate / 1000)), 2)
+    hop = max(int(round(hop_ms * rate / 1000)), 1)
+    max_lag = int(round(max_lag_ms * rate / 1000))
+    span = window + 2 * max_lag
+    n_lags = 2 * max_lag + 1
+    # Tamaño de FFT sin solapamiento circular entre la ventana y el tramo con todos los desfases
+    n_fft = _fft_length(span)
+
+    n_frames = 1 + max(len(left) - window, 0) // hop
+    left = np.pad(left, (0, max(window - len(left), 0)))
+    # El tramo derecho de la ventana que empieza en s va de s - max_lag a s + window + max_lag
+    padded_right = np.pad(right, (max_lag, max_lag + max(window - len(right), 0)))
+    left_frames = np.lib.stride_tricks.sliding_window_view(left, window)[::hop][:n_frames]
+    right_frames = np.lib.stride_tricks.sliding_window_view(padded_right, span)[::hop][:n_frames]
+
+    lags = np.full(n_frames, np.nan)
+    coherence = np.full(n_frames, np.nan)
+    left_energy = np.einsum('ij,ij->i', left_frames, left_frames, dtype=np.float64)
+    floor = left_energy.max(initial=0.0) * 10 ** (SILENCE_DB / 10)
+
+    for f0 in range(0, n_frames, frames_per_block):
+        f1 = min(f0 + frames_per_block, n_frames)
+        # Con la ventana izquierda centrada, su producto con el tramo derecho ya
+        # es la covarianza: basta centrar la energía del tramo derecho
+        x = left_frames[f0:f1] - left_frames[f0:f1].mean(axis=1, keepdims=True)
+        y = right_frames[f0:f1]
+        spectrum = np.conj(np.fft.rfft(x, n_fft, axis=1)) * np.fft.rfft(y, n_fft, axis=1)
+        corr = np.fft.irfft(spectrum, n_fft, axis=1)[:, :n_lags]
+
+        # Suma y energía del tramo derecho bajo la ventana para cada desfase (sumas acumuladas)
+        sums = np.zeros((f1 - f0, span + 1))
+        squares = np.zeros((f1 - f0, span + 1))
+        np.cumsum(y, axis=1, dtype=np.float64, out=sums[:, 1:])
+        np.cumsum(np.square(y, dtype=np.float64), axis=1, out=squares[:, 1:])
+        right_sum = sums[:, window:window + n_lags] - sums[:, :n_lags]
+        right_energy = squares[:, window:window + n_lags] - squares[:, :n_lags] - right_sum ** 2 / window
+        x_energy = np.einsum('ij,ij->i', x, x, dtype=np.float64)[:, None]
+        # Los desfases en que el tramo derecho es casi silencio no cuentan (evita picos espurios)
+        valid = (right_energy > x_energy * MIN_ENERGY_RATIO) & (x_energy > 0)
+        normalized = np.where(valid, corr / np.sqrt(np.where(valid, x_energy * right_energy, 1.0)), 0.0)
+
+        peak = np.argmax(normalized, axis=1)
+        rows = np.arange(f1 - f0)
+        value = normalized[rows, peak]
+        # Interpolación parabólica del pico entre sus dos vecinos
+        before = normalized[rows, np.maximum(peak - 1, 0)]
+        after = normalized[rows, np.minimum(peak + 1, n_lags - 1)]
+        curvature = before - 2 * value + after
+        offset = np.where(curvature < 0, 0.5 * (before - after) / np.where(curvature < 0, curvature, 1.0), 0.0)
+
+        audible = left_energy[f0:f1] > floor
+        lags[f0:f1] = np.where(audible, (peak - max_lag + offset) * 1000 / rate, np.nan)
+        coherence[f0:f1] = np.where(audible, np.clip(value, 0.0, 1.0), np.nan)
+
+    times = (np.arange(n_frames) * hop + window / 2) / rate
+    return times, lags, coherence
+
+
+def channel_lag(stereo, sample_rate, window_ms=WINDOW_MS, hop_ms=HOP_MS, max_lag_ms=MAX_LAG_MS,
+                analysis_rate=ANALYSIS_RATE, frames_per_block=FRAMES_PER_BLOCK):
+    """
+    Calcula el desfase efectivo y la coherencia entre los canales a lo largo del estímulo.
+
+    Se mide dos veces: sobre la forma de onda, que da el desfase con precisión
+    de fracción de milisegundo cuando un canal es una copia retrasada del otro,
+    y sobre la envolvente de amplitud, que sigue la deriva cuando las pistas
+    suenan a velocidades distintas y las formas de onda ya no coinciden.
+
+    Parámetros:
+    stereo (np.ndarray): Estímulo de forma (muestras, 2)
+    sample_rate (int): Frecuencia de muestreo en Hz
+    window_ms (float): Longitud de cada ventana de la forma de onda
+    hop_ms (float): Salto entre ventanas
+    max_lag_ms (float): Desfase máximo buscado a cada lado
+    analysis_rate (int): Frecuencia aproximada de análisis tras diezmar
+    frames_per_block (int): Ventanas correlacionadas en cada lote
+
+    Retorna:
+    dict: times (centro de cada ventana, s), lag_ms (positivo si el canal
+    derecho va retrasado respecto al izquierdo), coherence (pico de la
+    correlación normalizada), envelope_times, envelope_lag_ms,
+    envelope_coherence y sample_rate de análisis; las ventanas en silencio
+    valen NaN
+    """
+    stereo = np.asarray(stereo, dtype=np.float32)
+    factor = max(int(round(sample_rate / analysis_rate)), 1)
+    signal = _decimate(stereo, factor)
+    rate = sample_rate / factor
+    times, lags, coherence = _sliding_lag(signal[:, 0], signal[:, 1], rate,
+                                          window_ms, hop_ms, max_lag_ms, frames_per_block)
+
+    envelope_factor = max(int(round(rate / ENVELOPE_RATE)), 1)
+    envelope = _decimate(np.abs(signal), envelope_factor)
+    envelope_times, envelope_lags, envelope_coherence = _sliding_lag(
+        envelope[:, 0], envelope[:, 1], rate / envelope_factor,
+        ENVELOPE_WINDOW_MS, hop_ms, max_lag_ms, frames_per_block)
+
+    return {
+        'times': times,
+        'lag_ms': lags,
+        'coherence': coherence,
+        'envelope_times': envelope_times,
+        'envelope_lag_ms': envelope_lags,
+        'envelope_coherence': envelope_coherence,
+        'sample_rate': rate,
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def stimulus_lag(path):
+    """
+    Mide el desfase entre los canales de un WAV renderizado.
+
+    Los WAV de la caché de estímulos no cambian (su nombre es el hash de sus
+    parámetros), así que los últimos resultados se conservan en memoria.
+
+    Parámetros:
+    path (str): Ruta del WAV estéreo
+
+    Retorna:
+    dict: Resultado de channel_lag
+    """
+    stereo, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    if stereo.shape[1] == 1:
+        stereo = np.repeat(stereo, 2, axis=1)
+    return channel_lag(stereo[:, :2], sample_rate)
+
+
+def lag_figure(result, nominal_ms=None):
+    """
+    Gráfico del desfase efectivo y de la coherencia a lo largo del estímulo.
+
+    Parámetros:
+    result (dict): Resultado de channel_lag
+    nominal_ms (float o None): Retraso nominal del control, dibujado como referencia
+
+    Retorna:
+    plotly.graph_objs.Figure: Desfase arriba y coherencia abajo (de la forma de onda
+    y de la envolvente), con el tiempo compartido
+    """
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08, row_heights=[0.6, 0.4])
+    times = np.round(result['times'], 3)
+    fig.add_trace(go.Scatter(
+        x=times, y=np.round(result['lag_ms'], 2), mode='lines', name='Forma de onda',
+        line=dict(color='#1f77b4'), connectgaps=False,
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        x=np.round(result['envelope_times'], 3), y=np.round(result['envelope_lag_ms'], 1), mode='lines',
+        name='Envolvente', line=dict(color='#2ca02c', dash='dot'), connectgaps=False,
+    ), row=1, col=1)
+    if nominal_ms is not None:
+        fig.add_hline(y=nominal_ms, line=dict(color='gray', dash='dash'), row=1, col=1,
+                      annotation_text=f"Nominal: {nominal_ms} ms", annotation_position='top left')
+    fig.add_trace(go.Scatter(
+        x=times, y=np.round(result['coherence'], 3), mode='lines', name='Coherencia (forma de onda)',
+        line=dict(color='#1f77b4'), connectgaps=False, showlegend=False,
+    ), row=2, col=1)
+    fig.add_trace(go.Scatter(
+        x=np.round(result['envelope_times'], 3), y=np.round(result['envelope_coherence'], 3), mode='lines',
+        name='Coherencia (envolvente)', line=dict(color='#2ca02c', dash='dot'), connectgaps=False,
+        showlegend=False,
+    ), row=2, col=1)
+    fig.update_yaxes(title_text='Desfase (ms)', row=1, col=1)
+    fig.update_yaxes(title_text='Coherencia', range=[0, 1.05], row=2, col=1)
+    fig.update_xaxes(title_text='Tiempo (s)', row=2, col=1)
+    fig.update_layout(
+        legend=dict(orientation='h', y=1.08),
+        plot_bgcolor='white',
+        margin=dict(l=60, r=20, t=40, b=50),
+        height=420,
+    )
+    return fig